@@ -0,0 +1,54 @@
+# Benchmark of the Kutil crypto backends.
+
+# Measures key derivations (private key -> address) and signatures per second
+# for each installed secp256k1 backend: btcpy (pure Python, always available)
+# and coincurve (libsecp256k1, optional, pip install coincurve).
+
+# Usage:
+#
+#   python examples/benchmark_crypto.py [seconds per measurement]
+
+
+import sys
+import time
+from hashlib import sha256
+from os import urandom
+
+from pypeerassets.kutil import Kutil, backends
+
+
+network = 'peercoin'
+
+
+def derivations(backend: str, seconds: float) -> float:
+
+    count = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        Kutil(network=network, privkey=bytearray(urandom(32)), backend=backend).address
+        count += 1
+
+    return count / (time.perf_counter() - start)
+
+
+def signatures(backend: str, seconds: float) -> float:
+
+    key = Kutil(network=network, from_string='benchmark', backend=backend)._private_key
+    digests = [sha256(urandom(32)).digest() for i in range(64)]
+
+    count = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        key.sign(digests[count % len(digests)])
+        count += 1
+
+    return count / (time.perf_counter() - start)
+
+
+if __name__ == '__main__':
+
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 2.0
+
+    for backend in backends:
+        print('{:<10} {:>10.0f} derivations/s {:>10.0f} signatures/s'.format(
+            backend, derivations(backend, seconds), signatures(backend, seconds)))
@@ -0,0 +1,116 @@
+# Benchmark of transaction parsing.
+
+# Compares decoding a block with btcpy (TransactionParser building full
+# Transaction objects, then tx_to_rawtx) against BlockView/TxView, which
+# work over a memoryview of the block and decode scripts only when asked for.
+
+# Usage:
+#
+#   python examples/benchmark_parsing.py [number of transactions] [path to blk*.dat]
+#
+# Without a blk*.dat file a synthetic block of PeerAssets card transfers and
+# plain payments is used. With one, its first block records are parsed.
+
+
+import sys
+import time
+import tracemalloc
+from decimal import Decimal
+
+from btcpy.lib.parsing import Parser
+from btcpy.structs.transaction import Locktime, ScriptSig, Sequence, TxIn
+
+import pypeerassets as pa
+from pypeerassets.networks import net_query
+from pypeerassets.transactions import (BlockView, TransactionParser, make_raw_transaction,
+                                       nulldata_script, p2pkh_script, tx_output, tx_to_rawtx)
+
+
+network = 'peercoin'
+
+
+def synthetic_block(count: int) -> bytes:
+    '''a block of <count> transactions, every tenth one a card transfer'''
+
+    alice = pa.Kutil(network=network, from_string='alice').address
+    p2th = pa.Kutil(network=network, from_string='deck').address
+
+    txs = []
+    for i in range(count):
+        ins = [TxIn(txid='{:064x}'.format(i), txout=0, script_sig=ScriptSig.empty(),
+                    sequence=Sequence.max())]
+        if i % 10:
+            outs = [tx_output(network, Decimal(1), n, p2pkh_script(network, alice))
+                    for n in range(2)]
+        else:
+            outs = [tx_output(network, Decimal('0.01'), 0, p2pkh_script(network, p2th)),
+                    tx_output(network, Decimal(0), 1, nulldata_script(b'\x08\x01' * 20)),
+                    tx_output(network, Decimal(0), 2, p2pkh_script(network, alice))]
+        txs.append(make_raw_transaction(network, ins, outs, Locktime(0)).serialize())
+
+    header = bytes(80)
+    return header + Parser.to_varint(len(txs)) + b''.join(txs) + b'\x00'
+
+
+def blk_file_block(path: str, count: int) -> list:
+    '''first <count> block records of a blk*.dat file'''
+
+    magic = net_query(network).netmagic
+    blocks = []
+    with open(path, 'rb') as f:
+        data = f.read()
+
+    pos = data.find(magic)
+    while 0 <= pos and len(blocks) < count:
+        size = int.from_bytes(data[pos + 4:pos + 8], 'little')
+        blocks.append(data[pos + 8:pos + 8 + size])
+        pos = data.find(magic, pos + 8 + size)
+
+    return blocks
+
+
+def btcpy_decode(block: bytes) -> list:
+
+    parser = TransactionParser(block[80:], network=net_query(network))
+    return [tx_to_rawtx(parser.get_next_tx()) for i in range(parser.parse_varint())]
+
+
+def view_decode(block: bytes) -> list:
+
+    return [dict(tx) for tx in BlockView(block, net_query(network)).txs]
+
+
+def view_p2th(block: bytes) -> list:
+
+    return [tx.p2th for tx in BlockView(block, net_query(network)).txs]
+
+
+def measure(name: str, decode, blocks: list) -> None:
+
+    start = time.perf_counter()
+    count = sum(len(decode(block)) for block in blocks)
+    elapsed = time.perf_counter() - start
+
+    # separate run, tracing allocations slows everything down
+    tracemalloc.start()
+    for block in blocks:
+        decode(block)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    print('{:<28} {:>8} txs {:>9.1f} ms {:>9.0f} tx/s {:>9.0f} KiB peak'.format(
+        name, count, elapsed * 1000, count / elapsed, peak / 1024))
+
+
+if __name__ == '__main__':
+
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+
+    if len(sys.argv) > 2:
+        blocks = blk_file_block(sys.argv[2], count)
+    else:
+        blocks = [synthetic_block(count)]
+
+    measure('btcpy + tx_to_rawtx', btcpy_decode, blocks)
+    measure('BlockView, full decode', view_decode, blocks)
+    measure('BlockView, P2TH only', view_p2th, blocks)
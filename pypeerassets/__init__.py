@@ -7,4 +7,6 @@ from pypeerassets.__main__ import (deck_parser,
                                    deck_transfer,
                                    get_card_bundles,
                                    card_transfer)
-from pypeerassets.protocol import Deck, CardTransfer, DeckState
+from pypeerassets.protocol import Deck, CardTransfer, DeckState, deck_p2th_keys
+from pypeerassets.deckindex import DeckIndex
+from pypeerassets.scanner import BlockScanner
@@ -1,7 +1,8 @@
 
 '''contains main protocol logic like assembly of proof-of-timeline and parsing deck info'''
 
-import concurrent.futures
+from concurrent.futures import Executor
+from operator import attrgetter
 from typing import Iterator, Generator, Optional
 
 from pypeerassets.protocol import (Deck,
@@ -11,14 +12,18 @@ from pypeerassets.protocol import (Deck,
                                    )
 
 from pypeerassets.provider import Provider, RpcNode
+from pypeerassets.provider.pipeline import read_ahead
 
 from pypeerassets.pautils import (deck_parser,
                                   find_deck_spawns,
                                   card_bundle_parser,
-                                  tx_serialization_order,
-                                  find_tx_sender
+                                  enrich_transactions,
+                                  find_tx_sender,
+                                  stream_batches
                                   )
 
+from pypeerassets.parallel import parse_card_bundles, parse_deck_spawns
+
 from pypeerassets.exceptions import EmptyP2THDirectory
 
 from pypeerassets.transactions import (nulldata_script, tx_output,
@@ -32,13 +37,39 @@ from pypeerassets.networks import net_query
 from decimal import Decimal
 
 
+def deck_spawn_txs(provider: Provider, prod: bool=True, prefetch: int=100,
+                   executor: Executor=None, ordered: bool=True) -> Iterator[dict]:
+    '''decoded deck spawn transactions, newest first, up to <prefetch> fetched ahead'''
+
+    if isinstance(provider.backend, RpcNode):
+        return read_ahead(lambda txid: provider.getrawtransaction(txid, 1),
+                          find_deck_spawns(provider, prod), prefetch, provider.max_workers,
+                          executor=executor, ordered=ordered)
+
+    pa_params = param_query(provider.network)
+
+    if prod:
+        p2th = pa_params.P2TH_addr
+    else:
+        p2th = pa_params.test_P2TH_addr
+
+    return provider.iter_raw_transactions(p2th, prefetch=prefetch,
+                                          executor=executor, ordered=ordered)
+
+
 def find_all_valid_decks(provider: Provider, deck_version: int,
-                         prod: bool=True) -> Generator:
+                         prod: bool=True, prefetch: int=100,
+                         executor: Executor=None, ordered: bool=True,
+                         parse_pool: Executor=None) -> Generator:
     '''
     Scan the blockchain for PeerAssets decks, returns list of deck objects.
     : provider - provider instance
     : version - deck protocol version (0, 1, 2, ...)
     : test True/False - test or production P2TH
+    : prefetch - number of deck spawn transactions fetched ahead of parsing
+    : executor - long-lived executor to fetch in, instead of a new one per scan
+    : ordered - False to yield decks as soon as they are fetched, newest first otherwise
+    : parse_pool - ProcessPoolExecutor to parse the deck spawns in, across cores
     '''
 
     pa_params = param_query(provider.network)
@@ -48,21 +79,19 @@ def find_all_valid_decks(provider: Provider, deck_version: int,
     else:
         p2th = pa_params.test_P2TH_addr
 
-    if isinstance(provider, RpcNode):
-        deck_spawns = (provider.getrawtransaction(i, 1)
-                       for i in find_deck_spawns(provider))
+    # list -> fetch -> resolve senders and blocks -> parse, each stage bounded
+    deck_spawns = enrich_transactions(provider,
+                                      deck_spawn_txs(provider, prod, prefetch, executor, ordered),
+                                      ordered=ordered)
 
+    if parse_pool is not None:
+        decks = parse_deck_spawns(provider, deck_spawns, deck_version, p2th, parse_pool)
     else:
-        try:
-            deck_spawns = (provider.getrawtransaction(i, 1) for i in
-                           provider.listtransactions(p2th))
-        except TypeError as err:  # it will except if no transactions are found on this P2TH
-            raise EmptyP2THDirectory(err)
+        decks = (deck_parser((provider, rawtx, deck_version, p2th)) for rawtx in deck_spawns)
 
-    with concurrent.futures.ThreadPoolExecutor(max_workers=2) as th:
-        for result in th.map(deck_parser, ((provider, rawtx, deck_version, p2th) for rawtx in deck_spawns)):
-            if result:
-                yield result
+    for deck in decks:
+        if deck:
+            yield deck
 
 
 def find_deck(provider: Provider, key: str, version: int, prod: bool=True) -> Optional[Deck]:
@@ -139,61 +168,90 @@ def card_bundler(provider: Provider, deck: Deck, tx: dict) -> CardBundle:
     '''each blockchain transaction can contain multiple cards,
        wrapped in bundles. This method finds and returns those bundles.'''
 
+    # one block download serves every bundle in it
+    block = provider.blockmeta.get(provider, tx["blockhash"])
+
     return CardBundle(deck=deck,
                       blockhash=tx['blockhash'],
                       txid=tx['txid'],
                       timestamp=tx['time'],
-                      blockseq=tx_serialization_order(provider,
-                                                      tx["blockhash"],
-                                                      tx["txid"]),
-                      blocknum=provider.getblock(tx["blockhash"])["height"],
+                      blockseq=block.index[tx["txid"]],
+                      blocknum=block.height,
                       sender=find_tx_sender(provider, tx),
                       vouts=tx['vout'],
                       tx_confirmations=tx['confirmations']
                       )
 
 
-def find_card_bundles(provider: Provider, deck: Deck) -> Optional[Iterator]:
+def _rpc_card_txns(provider: Provider, batch_data: Iterator, batch_size: int,
+                   max_in_flight: int, executor: Executor, ordered: bool) -> Generator:
+    '''stream raw transactions of chunked JSON-RPC batches'''
+
+    for result in stream_batches(provider, batch_data, batch_size, max_in_flight,
+                                 executor, ordered):
+
+        if result is None:
+            raise EmptyP2THDirectory({'error': 'No cards found on this deck.'})
+
+        raw_txns = [i['result'] for i in result]
+
+        # one batch for the blocks and one for the parents of the chunk,
+        # card_bundler then finds everything it needs in the caches
+        provider.blockmeta.prefetch(provider, (tx["blockhash"] for tx in raw_txns
+                                               if "blockhash" in tx))
+        provider.senders.resolve(provider, [tx for tx in raw_txns if "txid" in tx["vin"][0]])
+
+        yield from raw_txns
+
+
+def find_card_bundles(provider: Provider, deck: Deck, batch_size: int=500,
+                      max_in_flight: int=4, prefetch: int=100,
+                      executor: Executor=None, ordered: bool=True) -> Optional[Iterator]:
     '''each blockchain transaction can contain multiple cards,
-       wrapped in bundles. This method finds and returns those bundles.'''
+       wrapped in bundles. This method finds and returns those bundles.
+    : batch_size - number of transactions per JSON-RPC batch (RpcNode only)
+    : max_in_flight - number of JSON-RPC batches sent at once (RpcNode only)
+    : prefetch - number of transactions fetched ahead of parsing (other providers)
+    : executor - long-lived executor to fetch in, instead of a new one per scan
+    : ordered - False to yield bundles as soon as they are fetched, newest first otherwise
+    '''
 
-    if isinstance(provider, RpcNode):
+    if isinstance(provider.backend, RpcNode):
         if deck.id is None:
             raise Exception("deck.id required to listtransactions")
 
         p2th_account = provider.getaccount(deck.p2th_address)
-        batch_data = [('getrawtransaction', [i["txid"], 1]) for
-                      i in provider.listtransactions(p2th_account)]
-        result = provider.batch(batch_data)
-
-        if result is not None:
-            raw_txns = [i['result'] for i in result if result]
-
-        else:
-            raise EmptyP2THDirectory({'error': 'No cards found on this deck.'})
+        batch_data = (('getrawtransaction', [txid, 1]) for
+                      txid in provider.iter_transactions(p2th_account))
+        raw_txns = _rpc_card_txns(provider, batch_data, batch_size, max_in_flight,
+                                  executor, ordered)
 
     else:
         if deck.p2th_address is None:
             raise Exception("deck.p2th_address required to listtransactions")
 
-        try:
-            raw_txns = (provider.getrawtransaction(i, 1) for i in
-                        provider.listtransactions(deck.p2th_address))
-        except TypeError:
-            raise EmptyP2THDirectory({'error': 'No cards found on this deck.'})
+        raw_txns = enrich_transactions(provider, provider.iter_raw_transactions(
+            deck.p2th_address, prefetch=prefetch, executor=executor, ordered=ordered),
+            ordered=ordered)
 
     return (card_bundler(provider, deck, i) for i in raw_txns)
 
 
-def get_card_bundles(provider: Provider, deck: Deck) -> Generator:
-    '''get all <deck> card bundles, if they match the protocol'''
+def get_card_bundles(provider: Provider, deck: Deck, executor: Executor=None,
+                     ordered: bool=True, parse_pool: Executor=None) -> Generator:
+    '''get all <deck> card bundles, if they match the protocol
+    : parse_pool - ProcessPoolExecutor to parse the bundles in, across cores
+    '''
+
+    bundles = find_card_bundles(provider, deck, executor=executor, ordered=ordered)
 
-    bundles = find_card_bundles(provider, deck)
+    if parse_pool is not None:
+        yield from parse_card_bundles(bundles, parse_pool)
+        return
 
-    with concurrent.futures.ThreadPoolExecutor(max_workers=2) as th:
-        for result in th.map(card_bundle_parser, bundles):
-            if result:
-                yield result
+    # fetching runs ahead in the stages of find_card_bundles, parsing is cheap
+    for bundle in bundles:
+        yield card_bundle_parser(bundle)
 
 
 def get_card_transfer(provider: Provider, deck: Deck,
@@ -208,14 +266,21 @@ def get_card_transfer(provider: Provider, deck: Deck,
     return card_bundle_parser(bundle, debug)
 
 
-def find_all_valid_cards(provider: Provider, deck: Deck) -> Generator:
+def find_all_valid_cards(provider: Provider, deck: Deck, executor: Executor=None,
+                         parse_pool: Executor=None) -> Generator:
     '''find all the valid cards on this deck,
        filtering out cards which don't play nice with deck issue mode'''
 
-    # validate_card_issue_modes must recieve a full list of cards, not batches
-    unfiltered = (card for batch in get_card_bundles(provider, deck) for card in batch)
+    # validate_card_issue_modes must recieve a full list of cards, not batches,
+    # they are sorted below so the fetches do not have to complete in order
+    unfiltered = (card for batch in get_card_bundles(provider, deck, executor, ordered=False,
+                                                     parse_pool=parse_pool)
+                  for card in batch)
+
+    # in the order they were confirmed, whichever order the provider lists them in
+    unfiltered = sorted(unfiltered, key=attrgetter('blocknum', 'blockseq', 'cardseq'))
 
-    for card in validate_card_issue_modes(deck.issue_mode, list(unfiltered)):
+    for card in validate_card_issue_modes(deck.issue_mode, unfiltered):
         yield card
 
 
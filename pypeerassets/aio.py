@@ -0,0 +1,195 @@
+'''asyncio versions of the scanning functions from pypeerassets.__main__,
+used with the asynchronous providers from pypeerassets.provider.aio'''
+
+import asyncio
+from operator import attrgetter
+from typing import AsyncGenerator, Optional
+
+from pypeerassets.exceptions import (EmptyP2THDirectory,
+                                     InvalidDeckMetainfo,
+                                     InvalidDeckSpawn,
+                                     InvalidDeckVersion,
+                                     InvalidNulldataOutput)
+from pypeerassets.pa_constants import param_query
+from pypeerassets.pautils import card_bundle_parser, parse_deckspawn_tx
+from pypeerassets.protocol import (CardBundle,
+                                   Deck,
+                                   validate_card_issue_modes)
+from pypeerassets.provider.aio import AsyncProvider, AsyncRpcNode
+
+
+async def find_tx_sender(provider: AsyncProvider, raw_tx: dict) -> str:
+    '''find transaction sender, vin[0] is used in this case.'''
+
+    txid, n = provider.senders.prevout(raw_tx)
+    sender = provider.senders.cached(txid, n)
+    if sender is None:
+        parent = await provider.getrawtransaction(txid, 1)
+        sender = provider.senders.add_tx(parent)[n]
+
+    return sender
+
+
+async def deck_parser(provider: AsyncProvider, raw_tx: dict, deck_version: int,
+                      p2th: str, prod: bool=True) -> Optional[Deck]:
+    '''deck parser function'''
+
+    try:
+        d = parse_deckspawn_tx(raw_tx, deck_version, p2th)
+    except (InvalidDeckSpawn, InvalidDeckMetainfo, InvalidDeckVersion,
+            InvalidNulldataOutput):
+        return None
+
+    if "blockhash" in raw_tx:
+        block, d["issuer"] = await asyncio.gather(provider.blockmeta.aget(provider,
+                                                                         raw_tx["blockhash"]),
+                                                  find_tx_sender(provider, raw_tx))
+        d["blocknum"] = block.height
+    else:
+        d["issuer"] = await find_tx_sender(provider, raw_tx)
+    d["network"] = provider.network
+    d["production"] = prod
+    return Deck(**d)
+
+
+async def _in_order(tasks: list) -> AsyncGenerator:
+    '''yield results of already scheduled <tasks> in order,
+    cancel the rest if the consumer stops early.'''
+
+    try:
+        for task in tasks:
+            yield await task
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+async def find_all_valid_decks(provider: AsyncProvider, deck_version: int,
+                               prod: bool=True,
+                               max_in_flight: int=100) -> AsyncGenerator:
+    '''
+    Scan the blockchain for PeerAssets decks, yields Deck objects.
+    : provider - AsyncProvider instance
+    : deck_version - deck protocol version (0, 1, 2, ...)
+    : prod True/False - production or test P2TH
+    : max_in_flight - maximum number of deck spawns being fetched at once
+    '''
+
+    pa_params = param_query(provider.network)
+
+    if prod:
+        p2th = pa_params.P2TH_addr
+    else:
+        p2th = pa_params.test_P2TH_addr
+
+    if isinstance(provider, AsyncRpcNode):
+        txids = [i["txid"] for i in
+                 await provider.listtransactions("PAPROD" if prod else "PATEST")]
+    else:
+        txids = await provider.listtransactions(p2th)
+        if txids is None:
+            raise EmptyP2THDirectory({'error': 'No decks found on this P2TH.'})
+
+    limit = asyncio.Semaphore(max_in_flight)
+
+    async def parse(txid: str) -> Optional[Deck]:
+        async with limit:
+            raw_tx = await provider.getrawtransaction(txid, 1)
+            return await deck_parser(provider, raw_tx, deck_version, p2th)
+
+    tasks = [asyncio.ensure_future(parse(txid)) for txid in txids]
+
+    async for deck in _in_order(tasks):
+        if deck:
+            yield deck
+
+
+async def find_deck(provider: AsyncProvider, key: str, version: int,
+                    prod: bool=True) -> Optional[Deck]:
+    '''Find specific deck by deck id.'''
+
+    pa_params = param_query(provider.network)
+    if prod:
+        p2th = pa_params.P2TH_addr
+    else:
+        p2th = pa_params.test_P2TH_addr
+
+    rawtx = await provider.getrawtransaction(key, 1)
+    return await deck_parser(provider, rawtx, version, p2th)
+
+
+async def card_bundler(provider: AsyncProvider, deck: Deck, tx: dict) -> CardBundle:
+    '''each blockchain transaction can contain multiple cards,
+       wrapped in bundles. This method finds and returns those bundles.'''
+
+    block, sender = await asyncio.gather(provider.blockmeta.aget(provider, tx["blockhash"]),
+                                         find_tx_sender(provider, tx))
+
+    return CardBundle(deck=deck,
+                      blockhash=tx['blockhash'],
+                      txid=tx['txid'],
+                      timestamp=tx['time'],
+                      blockseq=block.index[tx["txid"]],
+                      blocknum=block.height,
+                      sender=sender,
+                      vouts=tx['vout'],
+                      tx_confirmations=tx['confirmations']
+                      )
+
+
+async def find_card_bundles(provider: AsyncProvider, deck: Deck,
+                            max_in_flight: int=100) -> AsyncGenerator:
+    '''each blockchain transaction can contain multiple cards,
+       wrapped in bundles. This method finds and yields those bundles.'''
+
+    if isinstance(provider, AsyncRpcNode):
+        if deck.id is None:
+            raise Exception("deck.id required to listtransactions")
+
+        p2th_account = await provider.getaccount(deck.p2th_address)
+        txids = [i["txid"] for i in await provider.listtransactions(p2th_account)]
+
+    else:
+        if deck.p2th_address is None:
+            raise Exception("deck.p2th_address required to listtransactions")
+
+        txids = await provider.listtransactions(deck.p2th_address)
+        if txids is None:
+            raise EmptyP2THDirectory({'error': 'No cards found on this deck.'})
+
+    limit = asyncio.Semaphore(max_in_flight)
+
+    async def bundle(txid: str) -> CardBundle:
+        async with limit:
+            raw_tx = await provider.getrawtransaction(txid, 1)
+            return await card_bundler(provider, deck, raw_tx)
+
+    tasks = [asyncio.ensure_future(bundle(txid)) for txid in txids]
+
+    async for card_bundle in _in_order(tasks):
+        yield card_bundle
+
+
+async def get_card_bundles(provider: AsyncProvider, deck: Deck,
+                           max_in_flight: int=100) -> AsyncGenerator:
+    '''get all <deck> card bundles, if they match the protocol'''
+
+    async for bundle in find_card_bundles(provider, deck, max_in_flight):
+        yield card_bundle_parser(bundle)
+
+
+async def find_all_valid_cards(provider: AsyncProvider, deck: Deck,
+                               max_in_flight: int=100) -> AsyncGenerator:
+    '''find all the valid cards on this deck,
+       filtering out cards which don't play nice with deck issue mode'''
+
+    # validate_card_issue_modes must recieve a full list of cards, not batches
+    unfiltered = []
+    async for batch in get_card_bundles(provider, deck, max_in_flight):
+        unfiltered.extend(batch)
+
+    # in the order they were confirmed, whichever order the provider lists them in
+    unfiltered.sort(key=attrgetter('blocknum', 'blockseq', 'cardseq'))
+
+    for card in validate_card_issue_modes(deck.issue_mode, unfiltered):
+        yield card
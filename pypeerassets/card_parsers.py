@@ -1,6 +1,8 @@
 '''parse cards according to deck issue mode'''
 
-from typing import Callable, Optional
+from functools import lru_cache, reduce
+from operator import or_
+from typing import Callable, Iterable, Optional, Tuple
 
 
 def none_parser(cards: list) -> Optional[list]:
@@ -78,3 +80,80 @@ parsers = {
     'MONO': mono_parser,
     'UNFLUSHABLE': unflushable_parser
 }
+
+
+@lru_cache(maxsize=None)
+def compile_issue_mode_step(issue_mode: int) -> Callable[[str, int, int, bool], Tuple[bool, int, bool]]:
+    '''
+    compile deck <issue_mode> bitmask into a check of a single card,
+    step(card_type, amount, number_of_decimals, issued) -> (valid, amount, issued).
+    <issued> tells if a CardIssue was accepted before (ONCE), the returned amount
+    is the one the card is left with (MONO), even if the card is not valid.
+    '''
+
+    # imported here to avoid a circular import, protocol imports the parsers
+    from pypeerassets.protocol import IssueMode
+
+    # every bit used by the issue modes, a deck with none of them set allows no cards
+    supported = reduce(or_, (mode.value for mode in IssueMode))
+    if not issue_mode & supported:
+        return lambda card_type, amount, decimals, issued: (False, amount, issued)
+
+    once = bool(issue_mode & IssueMode.ONCE.value)
+    mono = bool(issue_mode & IssueMode.MONO.value)
+    unflushable = bool(issue_mode & IssueMode.UNFLUSHABLE.value)
+
+    def issue_mode_step(card_type: str, amount: int, decimals: int,
+                        issued: bool) -> Tuple[bool, int, bool]:
+
+        issue = card_type == "CardIssue"
+
+        if once and issue:
+            if issued:
+                return False, amount, issued
+            issued = True
+
+        if mono:
+            # same float round-trip as amount_to_exponent(exponent_to_amount(...))
+            scale = 10 ** decimals
+            amount = int(amount / scale * scale)
+
+        if unflushable and not issue:
+            return False, amount, issued
+
+        return True, amount, issued
+
+    return issue_mode_step
+
+
+@lru_cache(maxsize=None)
+def compile_issue_mode(issue_mode: int) -> Callable[[Iterable], list]:
+    '''
+    compile deck <issue_mode> bitmask into a single pass filter over the cards.
+    It gives the same cards as running the parsers of all the set bits one after
+    another (CUSTOM, ONCE, MULTI, MONO, UNFLUSHABLE), in linear time.
+    '''
+
+    step = compile_issue_mode_step(issue_mode)
+
+    def issue_mode_filter(cards: Iterable) -> list:
+
+        cards = list(cards)
+        if not cards:
+            return []
+
+        valid = []
+        issued = False
+        # mono_parser takes the decimals of the first card for all of them
+        decimals = cards[0].number_of_decimals
+
+        for card in cards:
+            ok, amount, issued = step(card.type, card.amount[0], decimals, issued)
+            if amount != card.amount[0]:
+                card.amount = [amount]
+            if ok:
+                valid.append(card)
+
+        return valid
+
+    return issue_mode_filter
@@ -0,0 +1,212 @@
+'''Persistent index of parsed decks, updated incrementally from the P2TH directory.'''
+
+from concurrent.futures import Executor
+from itertools import takewhile
+import json
+import sqlite3
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from pypeerassets.__main__ import deck_spawn_txs
+from pypeerassets.kutil import DerivedKey, keycache
+from pypeerassets.pa_constants import param_query
+from pypeerassets.pautils import deck_parser, enrich_transactions, find_tx_blocknum
+from pypeerassets.protocol import Deck, deck_p2th_keys
+from pypeerassets.provider import Provider
+
+
+class DeckIndex:
+
+    '''SQLite backed index of Deck records.
+
+    The newest processed deck spawn (its block height and txid) is kept as a
+    cursor for each network, P2TH (production or test) and deck version.
+    update() walks the P2TH directory newest first and stops at the cursor,
+    so a refresh only fetches deck spawns which were not seen before.
+
+    Unconfirmed deck spawns are not indexed until they make it into a block,
+    tx_confirmations of the stored decks is a snapshot taken at indexing time,
+    ChainTip.confirmations(deck.blocknum) gives the current number.
+
+    P2TH keys of the indexed decks are derived in bulk and stored along with them,
+    decks loaded from the index find them in the shared key cache.'''
+
+    def __init__(self, path: str=':memory:') -> None:
+        '''
+        : path - path to the SQLite database file
+        '''
+
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute('''CREATE TABLE IF NOT EXISTS decks (
+                                network TEXT NOT NULL,
+                                production INTEGER NOT NULL,
+                                version INTEGER NOT NULL,
+                                id TEXT NOT NULL,
+                                blocknum INTEGER NOT NULL,
+                                data TEXT NOT NULL,
+                                asset_specific_data BLOB,
+                                PRIMARY KEY (network, production, version, id))''')
+        self._db.execute('''CREATE TABLE IF NOT EXISTS cursors (
+                                network TEXT NOT NULL,
+                                production INTEGER NOT NULL,
+                                version INTEGER NOT NULL,
+                                height INTEGER NOT NULL,
+                                txid TEXT NOT NULL,
+                                PRIMARY KEY (network, production, version))''')
+        self._db.execute('''CREATE TABLE IF NOT EXISTS p2th (
+                                network TEXT NOT NULL,
+                                id TEXT NOT NULL,
+                                address TEXT NOT NULL,
+                                wif TEXT NOT NULL,
+                                PRIMARY KEY (network, id))''')
+        self._db.commit()
+
+    @staticmethod
+    def _load(data: str, blocknum: int, asset_specific_data: Optional[bytes],
+              address: Optional[str], wif: Optional[str]) -> Deck:
+
+        d = json.loads(data)
+        d["blocknum"] = blocknum
+        d["asset_specific_data"] = asset_specific_data
+        if address is not None:
+            keycache.add(d["network"], bytes.fromhex(d["id"]), DerivedKey(address, wif))
+
+        return Deck(**d)
+
+    def cursor(self, network: str, prod: bool=True,
+               deck_version: int=1) -> Optional[Tuple[int, str]]:
+        '''(height, txid) of the newest indexed deck spawn'''
+
+        with self._lock:
+            row = self._db.execute('''SELECT height, txid FROM cursors
+                                      WHERE network=? AND production=? AND version=?''',
+                                   (network, prod, deck_version)).fetchone()
+
+        return tuple(row) if row else None
+
+    def decks(self, network: str, prod: bool=True, deck_version: int=1) -> List[Deck]:
+        '''all indexed decks, oldest first'''
+
+        with self._lock:
+            rows = self._db.execute('''SELECT data, blocknum, asset_specific_data, address, wif
+                                       FROM decks LEFT JOIN p2th USING (network, id)
+                                       WHERE network=? AND production=? AND version=?
+                                       ORDER BY blocknum, decks.rowid''',
+                                    (network, prod, deck_version)).fetchall()
+
+        return [self._load(*row) for row in rows]
+
+    def get(self, network: str, key: str, prod: bool=True,
+            deck_version: int=1) -> Optional[Deck]:
+        '''find indexed deck by deck id'''
+
+        with self._lock:
+            row = self._db.execute('''SELECT data, blocknum, asset_specific_data, address, wif
+                                      FROM decks LEFT JOIN p2th USING (network, id)
+                                      WHERE network=? AND production=? AND version=? AND id=?''',
+                                   (network, prod, deck_version, key)).fetchone()
+
+        return self._load(*row) if row else None
+
+    def p2th_keys(self, network: str, deck_ids: Iterable[str]=None,
+                  executor: Executor=None) -> Dict[str, DerivedKey]:
+        '''P2TH address and WIF of <deck_ids> as {deck id: DerivedKey},
+        all indexed decks of <network> in the order of decks() by default.
+        Keys which are not stored yet are derived in bulk, in <executor>
+        (a ProcessPoolExecutor) if it is given, and stored.'''
+
+        with self._lock:
+            if deck_ids is None:
+                deck_ids = [row[0] for row in self._db.execute(
+                    'SELECT id FROM decks WHERE network=? ORDER BY blocknum, rowid', (network,))]
+            deck_ids = list(dict.fromkeys(deck_ids))
+
+            keys = {}
+            for i in range(0, len(deck_ids), 500):
+                chunk = deck_ids[i:i + 500]
+                rows = self._db.execute('''SELECT id, address, wif FROM p2th
+                                           WHERE network=? AND id IN ({})'''
+                                        .format(','.join('?' * len(chunk))),
+                                        [network] + chunk)
+                keys.update((deck_id, DerivedKey(address, wif)) for deck_id, address, wif in rows)
+
+        for deck_id, key in keys.items():
+            keycache.add(network, bytes.fromhex(deck_id), key)
+
+        missing = [deck_id for deck_id in deck_ids if deck_id not in keys]
+        if missing:
+            derived = deck_p2th_keys(network, missing, executor)
+            with self._lock:
+                self._db.executemany('INSERT OR REPLACE INTO p2th VALUES (?, ?, ?, ?)',
+                                     [(network, i, k.address, k.wif) for i, k in derived.items()])
+                self._db.commit()
+            keys.update(derived)
+
+        return {deck_id: keys[deck_id] for deck_id in deck_ids}
+
+    def _store(self, network: str, prod: bool, deck_version: int,
+               decks: List[Tuple[int, Deck]], head: Tuple[int, str]) -> None:
+
+        with self._lock:
+            for blocknum, deck in decks:
+                d = dict(deck.__dict__)
+                asset_specific_data = d.pop("asset_specific_data")
+                if isinstance(asset_specific_data, str):
+                    asset_specific_data = asset_specific_data.encode()
+                self._db.execute('''INSERT OR REPLACE INTO decks
+                                    VALUES (?, ?, ?, ?, ?, ?, ?)''',
+                                 (network, prod, deck_version, deck.id, blocknum,
+                                  json.dumps(d), asset_specific_data))
+
+            self._db.execute('INSERT OR REPLACE INTO cursors VALUES (?, ?, ?, ?, ?)',
+                             (network, prod, deck_version) + head)
+            self._db.commit()
+
+    def update(self, provider: Provider, deck_version: int=1, prod: bool=True,
+               executor: Executor=None) -> List[Deck]:
+        '''index deck spawns newer than the cursor, return the new decks oldest first
+        : executor - ProcessPoolExecutor to derive the P2TH keys of the new decks in
+        '''
+
+        network = provider.network
+        cursor = self.cursor(network, prod, deck_version)
+        pa_params = param_query(network)
+        p2th = pa_params.P2TH_addr if prod else pa_params.test_P2TH_addr
+
+        def is_new(raw_tx: dict) -> bool:
+            if cursor is None:
+                return True
+            h = find_tx_blocknum(provider, raw_tx)
+            return raw_tx["txid"] != cursor[1] and (h is None or h >= cursor[0])
+
+        head = None
+        new = []
+
+        # unconfirmed deck spawns are picked up once they make it into a block
+        spawns = (raw_tx for raw_tx in takewhile(is_new, deck_spawn_txs(provider, prod))
+                  if "blockhash" in raw_tx)
+
+        for raw_tx in enrich_transactions(provider, spawns):
+
+            h = find_tx_blocknum(provider, raw_tx)
+            if head is None:
+                head = (h, raw_tx["txid"])
+
+            if self.get(network, raw_tx["txid"], prod, deck_version):
+                continue  # in the same block as the cursor, indexed already
+
+            deck = deck_parser((provider, raw_tx, deck_version, p2th), prod)
+            if deck:
+                new.append((h, deck))
+
+        if head is not None:
+            self._store(network, prod, deck_version, new, head)
+            self.p2th_keys(network, [deck.id for h, deck in new], executor)
+
+        return [deck for h, deck in reversed(new)]
+
+    def close(self) -> None:
+
+        with self._lock:
+            self._db.close()
@@ -1,6 +1,9 @@
 
+from collections import OrderedDict, namedtuple
 from hashlib import sha256
-from typing import Union
+import threading
+from concurrent.futures import Executor
+from typing import Dict, Iterable, List, Optional, Tuple, Type, Union
 from os import urandom
 
 from btcpy.structs.crypto import PublicKey, PrivateKey
@@ -9,11 +12,47 @@ from btcpy.structs.sig import P2pkhSolver
 
 from pypeerassets.networks import net_query
 
+try:
+    import coincurve
+except ImportError:
+    coincurve = None
+
+
+class CoincurvePrivateKey(PrivateKey):
+
+    '''btcpy PrivateKey which derives its public key and signs with libsecp256k1,
+    through the optional coincurve library. Outputs are the same as btcpy's,
+    deterministic (RFC 6979) low-S signatures, so it works with P2pkhSolver as is.'''
+
+    def pub(self, compressed: bool=None) -> PublicKey:
+
+        if compressed is None:
+            compressed = self.public_compressed
+
+        point = coincurve.PublicKey.from_secret(bytes(self.key))
+        return PublicKey(bytearray(point.format(compressed=compressed)))
+
+    def sign(self, data: bytes, deterministic: bool=True) -> bytes:
+
+        if not deterministic:
+            return super().sign(data, deterministic)
+
+        # <data> is the sighash digest already
+        return coincurve.PrivateKey(bytes(self.key)).sign(bytes(data), hasher=None)
+
+
+backends = {"btcpy": PrivateKey}  # type: Dict[str, Type[PrivateKey]]
+if coincurve is not None:
+    backends["coincurve"] = CoincurvePrivateKey
+
+# fastest one available, used when Kutil is not given a backend
+default_backend = "coincurve" if coincurve is not None else "btcpy"
+
 
 class Kutil:
 
     def __init__(self, network: str, privkey: bytearray=None, from_string: str=None,
-                 from_wif: str=None) -> None:
+                 from_wif: str=None, backend: str=None) -> None:
         '''
            High level helper class for handling public key cryptography.
 
@@ -22,26 +61,34 @@ class Kutil:
            : from_bytes - import private key in binary format
            : network - specify network [ppc, tppc, btc]
            : from_string - specify seed (string) to make the privkey from
+           : backend - secp256k1 implementation, one of pypeerassets.kutil.backends
            '''
 
         self.network = network
         self.constants = net_query(self.network)
+        self.backend = backend or default_backend
+
+        try:
+            key_class = backends[self.backend]
+        except KeyError:
+            raise ValueError("Unknown (or not installed) crypto backend: {}".format(self.backend))
 
         if privkey is not None:
-            self._private_key = PrivateKey(privkey)
+            self._private_key = key_class(privkey)
 
         if from_string is not None:
-            self._private_key = PrivateKey(sha256(
-                                           from_string.encode()).digest())
+            self._private_key = key_class(sha256(
+                                          from_string.encode()).digest())
 
         if from_wif is not None:
-            self._private_key = PrivateKey.from_wif(wif=from_wif,
-                                                    network=self.constants,
-                                                    )
+            key = PrivateKey.from_wif(wif=from_wif,
+                                      network=self.constants,
+                                      )
+            self._private_key = key_class(key.key, key.public_compressed)
 
         if not privkey:
             if from_string == from_wif is None:  # generate a new privkey
-                self._private_key = PrivateKey(bytearray(urandom(32)))
+                self._private_key = key_class(bytearray(urandom(32)))
 
         self.privkey = str(self._private_key)
         self._public_key = PublicKey.from_priv(self._private_key)
@@ -67,3 +114,119 @@ class Kutil:
 
         solver = P2pkhSolver(self._private_key)
         return tx.spend(txins, [solver for i in txins])
+
+
+DerivedKey = namedtuple('DerivedKey', ['address', 'wif'])
+
+
+def derive_key(network: str, privkey: Union[bytes, bytearray]) -> DerivedKey:
+    '''address and WIF of <privkey> on <network>'''
+
+    kutil = Kutil(network=network, privkey=bytearray(privkey))
+    return DerivedKey(address=kutil.address, wif=kutil.wif)
+
+
+def _derive_keys(job: Tuple[str, List[bytes]]) -> List[DerivedKey]:
+    '''worker side of KeyCache.get_many'''
+
+    network, privkeys = job
+    return [derive_key(network, privkey) for privkey in privkeys]
+
+
+class KeyCache:
+
+    '''Keeps the address and WIF of recently derived private keys.
+
+    Deterministic keys (deck P2TH, vote tag and vote choice keys) are derived
+    again and again while scanning, each one an EC point multiplication.
+    Keys are keyed by network and private key, so a single cache is safely
+    shared by all decks and networks.'''
+
+    def __init__(self, maxsize: int=4096) -> None:
+        '''
+        : maxsize - number of keys to keep, least recently used ones are dropped first
+        '''
+
+        self.maxsize = maxsize
+
+        self._lock = threading.Lock()
+        self._keys = OrderedDict()  # type: OrderedDict
+        self._stats = {"hits": 0, "misses": 0}
+
+    def add(self, network: str, privkey: Union[bytes, bytearray], derived: DerivedKey) -> None:
+        '''remember keys derived elsewhere, like the ones persisted by DeckIndex'''
+
+        key = (network, bytes(privkey))
+
+        with self._lock:
+            self._keys[key] = derived
+            self._keys.move_to_end(key)
+            while len(self._keys) > self.maxsize:
+                self._keys.popitem(last=False)
+
+    def _lookup(self, network: str, privkey: bytes) -> Optional[DerivedKey]:
+
+        key = (network, privkey)
+        derived = self._keys.get(key)
+        if derived is not None:
+            self._keys.move_to_end(key)
+            self._stats["hits"] += 1
+        else:
+            self._stats["misses"] += 1
+
+        return derived
+
+    def get(self, network: str, privkey: Union[bytes, bytearray]) -> DerivedKey:
+        '''address and WIF of <privkey> on <network>, derived only if not known yet'''
+
+        with self._lock:
+            derived = self._lookup(network, bytes(privkey))
+
+        if derived is None:
+            # concurrent misses of the same key derive it twice, which is harmless
+            derived = derive_key(network, privkey)
+            self.add(network, privkey, derived)
+
+        return derived
+
+    def get_many(self, network: str, privkeys: Iterable[Union[bytes, bytearray]],
+                 executor: Executor=None, chunk: int=256) -> List[DerivedKey]:
+        '''keys of all <privkeys> on <network>, in the same order.
+        The ones not known yet are derived in bulk, spread over <executor>
+        (a ProcessPoolExecutor) in chunks of <chunk> keys if it is given.'''
+
+        privkeys = [bytes(privkey) for privkey in privkeys]
+
+        with self._lock:
+            known = {privkey: self._lookup(network, privkey) for privkey in privkeys}
+
+        missing = [privkey for privkey, derived in known.items() if derived is None]
+
+        if executor is None:
+            derived = _derive_keys((network, missing))
+        else:
+            jobs = [(network, missing[i:i + chunk]) for i in range(0, len(missing), chunk)]
+            derived = [key for keys in executor.map(_derive_keys, jobs) for key in keys]
+
+        for privkey, key in zip(missing, derived):
+            self.add(network, privkey, key)
+            known[privkey] = key
+
+        return [known[privkey] for privkey in privkeys]
+
+    def stats(self) -> dict:
+
+        with self._lock:
+            stats = dict(self._stats)
+            stats["keys"] = len(self._keys)
+
+        return stats
+
+    def clear(self) -> None:
+
+        with self._lock:
+            self._keys.clear()
+
+
+# shared by Deck, CardTransfer and Vote
+keycache = KeyCache()
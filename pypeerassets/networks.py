@@ -34,7 +34,8 @@ Constants = namedtuple('Constants', [
     'min_tx_fee',
     'tx_timestamp',
     'tx_out_cls',
-    'op_return_max_bytes'
+    'op_return_max_bytes',
+    'netmagic'
 ])
 
 
@@ -64,7 +65,8 @@ PeercoinMainnet = Constants(
     min_tx_fee=Decimal(0.001),
     tx_timestamp=True,
     tx_out_cls=PeercoinTxOut,
-    op_return_max_bytes=256
+    op_return_max_bytes=256,
+    netmagic=b'\xe6\xe8\xe9\xe5'
 )
 
 
@@ -90,7 +92,8 @@ PeercoinTestnet = Constants(
     min_tx_fee=Decimal(0.001),
     tx_timestamp=True,
     tx_out_cls=PeercoinTxOut,
-    op_return_max_bytes=256
+    op_return_max_bytes=256,
+    netmagic=b'\xcb\xf2\xc0\xef'
 )
 
 
@@ -0,0 +1,134 @@
+'''Process pool parsing stage, spreads decoding of deck spawns and card bundles over cores.
+
+Parsing (protobuf decoding, card_postprocess, CardTransfer construction and the P2TH
+derivation) is CPU bound, threads run it one at a time because of the GIL.
+Jobs sent to the worker processes carry only the parts of the transactions the
+parsers read, never the provider, results come back as plain dicts and CardTransfer objects.
+Anything which needs the provider (deck issuers) is done in the calling process.'''
+
+from collections import deque
+from concurrent.futures import Executor
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+from pypeerassets.exceptions import (InvalidDeckMetainfo,
+                                     InvalidDeckSpawn,
+                                     InvalidDeckVersion,
+                                     InvalidNulldataOutput)
+from pypeerassets.pautils import (card_bundle_parser,
+                                  find_tx_blocknum,
+                                  find_tx_sender,
+                                  parse_deckspawn_tx)
+from pypeerassets.protocol import CardBundle, CardTransfer, Deck
+from pypeerassets.provider import Provider
+from pypeerassets.provider.pipeline import chunked, read_ahead
+
+
+def compact_vout(vout: dict, n: int) -> dict:
+    '''keep only the parts of <vout> (output <n> of its transaction) the parsers read'''
+
+    script = vout["scriptPubKey"]
+    compact = {}
+
+    if script.get("addresses"):
+        compact["addresses"] = script["addresses"]
+    elif script.get("hex", "").startswith("6a"):
+        compact["hex"] = script["hex"]
+    elif "asm" in script:
+        compact["asm"] = script["asm"]
+
+    # card_postprocess tells outputs paying the same address apart by their position
+    return {"n": n, "scriptPubKey": compact}
+
+
+def compact_tx(raw_tx: dict) -> dict:
+    '''keep only the parts of deck spawn <raw_tx> parse_deckspawn_tx reads'''
+
+    tx = {"txid": raw_tx["txid"],
+          "vout": [compact_vout(v, n) for n, v in enumerate(raw_tx["vout"][:2])]}
+
+    for key in ("blocktime", "confirmations"):
+        if key in raw_tx:
+            tx[key] = raw_tx[key]
+
+    return tx
+
+
+def _parse_deck_spawns(job: Tuple[int, str, List[dict]]) -> List[Optional[dict]]:
+    '''worker side of parse_deck_spawns'''
+
+    deck_version, p2th, raw_txs = job
+    decks = []  # type: List[Optional[dict]]
+
+    for raw_tx in raw_txs:
+        try:
+            decks.append(parse_deckspawn_tx(raw_tx, deck_version, p2th))
+        except (InvalidDeckSpawn, InvalidDeckMetainfo, InvalidDeckVersion,
+                InvalidNulldataOutput):
+            decks.append(None)
+
+    return decks
+
+
+def _parse_card_bundles(job: Tuple[Deck, list]) -> List[List[CardTransfer]]:
+    '''worker side of parse_card_bundles'''
+
+    deck, bundles = job
+
+    return [list(card_bundle_parser(CardBundle(deck=deck, **b))) for b in bundles]
+
+
+def parse_deck_spawns(provider: Provider, raw_txs: Iterable[dict], deck_version: int,
+                      p2th: str, executor: Executor, prod: bool=True,
+                      chunk: int=100, window: int=16) -> Iterator[Optional[Deck]]:
+    '''parse deck spawn <raw_txs> in <executor>, yielding Deck or None
+    for each of them in order, like deck_parser does.
+    Issuers and block heights of the valid ones are resolved here, with <provider>.
+    : executor - a concurrent.futures.ProcessPoolExecutor
+    : chunk - number of deck spawns sent to a worker at once
+    : window - number of chunks being parsed ahead of the consumer
+    '''
+
+    sent = deque()  # type: deque
+
+    def jobs() -> Iterator[Tuple[int, str, List[dict]]]:
+        for txs in chunked(raw_txs, chunk):
+            sent.append(txs)  # results come back in the same order
+            yield (deck_version, p2th, [compact_tx(tx) for tx in txs])
+
+    for decks in read_ahead(_parse_deck_spawns, jobs(), window,
+                            initial=window, executor=executor):
+        for raw_tx, d in zip(sent.popleft(), decks):
+            if d is None:
+                yield None
+                continue
+
+            d["issuer"] = find_tx_sender(provider, raw_tx)
+            d["blocknum"] = find_tx_blocknum(provider, raw_tx)
+            d["network"] = provider.network
+            d["production"] = prod
+            yield Deck(**d)
+
+
+def parse_card_bundles(bundles: Iterable[CardBundle], executor: Executor,
+                       chunk: int=100, window: int=16) -> Iterator[List[CardTransfer]]:
+    '''parse <bundles> (all of the same deck) in <executor>,
+    yielding the list of cards of each bundle in order, like card_bundle_parser does.
+    : executor - a concurrent.futures.ProcessPoolExecutor
+    : chunk - number of bundles sent to a worker at once
+    : window - number of chunks being parsed ahead of the consumer
+    '''
+
+    def job(bundles: List[CardBundle]) -> Tuple[Deck, list]:
+
+        # the deck is sent once per chunk, not once per bundle
+        fields = [{k: v for k, v in b.__dict__.items() if k != 'deck'} for b in bundles]
+        for b, f in zip(bundles, fields):
+            f["vouts"] = [compact_vout(v, n) for n, v in enumerate(b.vouts)]
+
+        return (bundles[0].deck, fields)
+
+    jobs = (job(bundles) for bundles in chunked(bundles, chunk))
+
+    for cards in read_ahead(_parse_card_bundles, jobs, window,
+                            initial=window, executor=executor):
+        yield from cards
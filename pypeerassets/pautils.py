@@ -1,7 +1,8 @@
 
 '''miscellaneous utilities.'''
 
-from pypeerassets.provider import Provider, RpcNode, Cryptoid, Blockbook
+from pypeerassets.provider import Provider, RpcNode
+from pypeerassets.provider.pipeline import chunked, read_ahead
 
 from pypeerassets.exceptions import (InvalidDeckSpawn,
                                      InvalidDeckMetainfo,
@@ -20,11 +21,13 @@ from pypeerassets.exceptions import (InvalidCardTransferP2TH,
 
 from google.protobuf.message import DecodeError
 from pypeerassets.pa_constants import param_query
-from typing import Iterable, Iterator, Optional, Tuple, List
+import concurrent.futures
+from typing import Callable, Iterable, Iterator, Optional, Tuple, List
 
 from pypeerassets.paproto_pb2 import DeckSpawn as DeckSpawnProto
 from pypeerassets.paproto_pb2 import CardTransfer as CardTransferProto
-from pypeerassets.protocol import Deck, CardTransfer, CardBundle
+from pypeerassets.protocol import Deck, CardTransfer, CardBundle, deck_p2th_keys
+from pypeerassets.transactions import read_nulldata
 
 
 def load_p2th_privkey_into_local_node(provider: RpcNode, prod: bool=True) -> None:
@@ -48,10 +51,61 @@ def load_p2th_privkey_into_local_node(provider: RpcNode, prod: bool=True) -> Non
 def find_tx_sender(provider: Provider, raw_tx: dict) -> str:
     '''find transaction sender, vin[0] is used in this case.'''
 
-    vin = raw_tx["vin"][0]
-    txid = vin["txid"]
-    index = vin["vout"]
-    return provider.getrawtransaction(txid, 1)["vout"][index]["scriptPubKey"]["addresses"][0]
+    return provider.senders.sender(provider, raw_tx)
+
+
+def find_tx_blocknum(provider: Provider, raw_tx: dict) -> Optional[int]:
+    '''find height of the block the transaction is in, None if it is unconfirmed.'''
+
+    if "blockhash" not in raw_tx:
+        return None
+
+    return provider.blockmeta.get(provider, raw_tx["blockhash"]).height
+
+
+def enrich_transactions(provider: Provider, raw_txns: Iterable[dict], chunk: int=100,
+                        window: int=2, blocks: bool=True,
+                        ordered: bool=True) -> Iterator[dict]:
+    '''pass <raw_txns> through, resolving the senders (and block metadata if <blocks>)
+    of each <chunk> of them at once, up to <window> chunks ahead of the consumer.
+    find_tx_sender and card_bundler then find what they need in the caches.'''
+
+    def enrich(txs: List[dict]) -> List[dict]:
+
+        if blocks:
+            provider.blockmeta.prefetch(provider, (tx["blockhash"] for tx in txs
+                                                   if "blockhash" in tx))
+        provider.senders.resolve(provider, [tx for tx in txs if "txid" in tx["vin"][0]])
+        return txs
+
+    # enrich only waits on requests made elsewhere (provider.senders executor),
+    # running it in a shared executor could starve that of threads
+    for txs in read_ahead(enrich, chunked(raw_txns, chunk), window, window,
+                          ordered=ordered):
+        yield from txs
+
+
+def prefetch_senders(provider: Provider, raw_txns: Iterable[dict], chunk: int=100,
+                     ordered: bool=True) -> Iterator[dict]:
+    '''pass <raw_txns> through, resolving senders of each <chunk> of them at once
+    so find_tx_sender does not have to fetch the parent transactions one by one.'''
+
+    return enrich_transactions(provider, raw_txns, chunk, blocks=False, ordered=ordered)
+
+
+def stream_batches(provider: Provider, reqs: Iterable[tuple], batch_size: int=500,
+                   max_in_flight: int=4, executor: concurrent.futures.Executor=None,
+                   ordered: bool=True) -> Iterator[list]:
+    '''send <reqs> as JSON-RPC batches of <batch_size> requests, keeping up to
+    <max_in_flight> of them in flight, yield each batch response in order
+    (or as they arrive if not <ordered>).'''
+
+    for response in read_ahead(provider.batch, chunked(reqs, batch_size),
+                               max_in_flight, max_in_flight, initial=max_in_flight,
+                               executor=executor, ordered=ordered):
+        if response is not None:
+            response = sorted(response, key=lambda r: r["id"])
+        yield response
 
 
 def find_deck_spawns(provider: Provider, prod: bool=True) -> Iterable[str]:
@@ -61,23 +115,46 @@ def find_deck_spawns(provider: Provider, prod: bool=True) -> Iterable[str]:
 
     pa_params = param_query(provider.network)
 
-    if isinstance(provider, RpcNode):
+    if isinstance(provider.backend, RpcNode):
 
         if prod:
-            decks = (i["txid"] for i in provider.listtransactions("PAPROD"))
+            decks = provider.iter_transactions("PAPROD")
         else:
-            decks = (i["txid"] for i in provider.listtransactions("PATEST"))
+            decks = provider.iter_transactions("PATEST")
 
-    if isinstance(provider, Cryptoid) or isinstance(provider, Blockbook):
+    else:
 
         if prod:
-            decks = (i for i in provider.listtransactions(pa_params.P2TH_addr))
+            decks = provider.iter_transactions(pa_params.P2TH_addr)
         else:
-            decks = (i for i in provider.listtransactions(pa_params.test_P2TH_addr))
+            decks = provider.iter_transactions(pa_params.test_P2TH_addr)
 
     return decks
 
 
+def parse_deckspawn_tx(raw_tx: dict, deck_version: int, p2th: str) -> dict:
+    '''validate deck spawn transaction and decode it's metainfo,
+    raises InvalidDeckSpawn, InvalidDeckMetainfo... if the deck spawn is not valid.
+    Sender of the transaction (deck issuer) is not resolved.'''
+
+    validate_deckspawn_p2th(None, raw_tx, p2th)
+
+    d = parse_deckspawn_metainfo(read_tx_opreturn(raw_tx['vout'][1]),
+                                 deck_version)
+
+    d["id"] = raw_tx["txid"]
+    try:
+        d["issue_time"] = raw_tx["blocktime"]
+    except KeyError:
+        d["issue_time"] = 0
+    try:
+        d["tx_confirmations"] = raw_tx["confirmations"]
+    except KeyError:
+        d["tx_confirmations"] = 0
+
+    return d
+
+
 def deck_parser(args: Tuple[Provider, dict, int, str],
                 prod: bool=True) -> Optional[Deck]:
     '''deck parser function'''
@@ -88,25 +165,14 @@ def deck_parser(args: Tuple[Provider, dict, int, str],
     p2th = args[3]
 
     try:
-        validate_deckspawn_p2th(provider, raw_tx, p2th)
-
-        d = parse_deckspawn_metainfo(read_tx_opreturn(raw_tx['vout'][1]),
-                                     deck_version)
+        d = parse_deckspawn_tx(raw_tx, deck_version, p2th)
 
         if d:
 
-            d["id"] = raw_tx["txid"]
-            try:
-                d["issue_time"] = raw_tx["blocktime"]
-            except KeyError:
-                d["issue_time"] = 0
             d["issuer"] = find_tx_sender(provider, raw_tx)
+            d["blocknum"] = find_tx_blocknum(provider, raw_tx)
             d["network"] = provider.network
             d["production"] = prod
-            try:
-                d["tx_confirmations"] = raw_tx["confirmations"]
-            except KeyError:
-                d["tx_confirmations"] = 0
             return Deck(**d)
 
     except (InvalidDeckSpawn, InvalidDeckMetainfo, InvalidDeckVersion,
@@ -119,13 +185,21 @@ def deck_parser(args: Tuple[Provider, dict, int, str],
 def tx_serialization_order(provider: Provider, blockhash: str, txid: str) -> int:
     '''find index of this tx in the blockid'''
 
-    return provider.getblock(blockhash)["tx"].index(txid)
+    try:
+        return provider.blockmeta.get(provider, blockhash).index[txid]
+    except KeyError:
+        raise ValueError('{} is not in block {}'.format(txid, blockhash))
 
 
 def read_tx_opreturn(vout: dict) -> bytes:
     '''Decode OP_RETURN message from vout[1]'''
 
-    asm = vout['scriptPubKey']['asm']
+    script = vout['scriptPubKey'].get('hex', '')
+    # script bytes are exact, asm shows short pushes as numbers
+    if script.startswith('6a'):
+        return read_nulldata(bytes.fromhex(script))
+
+    asm = vout['scriptPubKey'].get('asm', '')
     n = asm.find('OP_RETURN')
     if n == -1:
         raise InvalidNulldataOutput({'error': 'OP_RETURN not found.'})
@@ -229,6 +303,85 @@ def load_deck_p2th_into_local_node(provider: RpcNode, deck: Deck) -> None:
         raise DeckP2THImportError(error)
 
 
+def _wallet_batch(provider: RpcNode, method: str, params: List[list]) -> list:
+    '''results of a JSON-RPC batch of <method> calls, in order'''
+
+    results = []
+    for r in sorted(provider.batch([(method, p) for p in params]), key=lambda r: r["id"]):
+        if r.get("error"):
+            raise DeckP2THImportError(r["error"])
+        results.append(r["result"])
+
+    return results
+
+
+def import_deck_p2th_keys(provider: RpcNode, decks: Iterable[Deck], rescan_from: int=None,
+                          batch_size: int=100,
+                          progress: Callable[[str, int, int], None]=None,
+                          executor: concurrent.futures.Executor=None) -> List[Deck]:
+    '''Load P2TH privkeys of many <decks> into the local node at once.
+
+    Keys which are not in the wallet yet are imported in JSON-RPC batches without
+    a rescan, then the wallet is rescanned once, from <rescan_from> or the block
+    of the oldest deck spawn (cards can not be older than their deck), the tip
+    if none of the decks is confirmed yet. A failed rescan raises DeckP2THImportError.
+    Batched validateaddress calls afterwards only confirm the keys are in the wallet.
+    : batch_size - number of keys per JSON-RPC batch
+    : progress - called with (stage, done, total) as the import goes on, stages are
+                 "import", "rescan" (done is the start height, total the best block) and "verify"
+    : executor - ProcessPoolExecutor to derive the P2TH keys in
+    returns the decks which were imported, raises DeckP2THImportError if some were not.
+    '''
+
+    assert isinstance(provider.backend, RpcNode), {"error": "You can load privkeys only into local node."}
+
+    def report(stage: str, done: int, total: int) -> None:
+        if progress is not None:
+            progress(stage, done, total)
+
+    decks = list({deck.id: deck for deck in decks}.values())
+    keys = deck_p2th_keys(provider.network, [deck.id for deck in decks], executor)
+
+    pending = []
+    for chunk in chunked(decks, batch_size):
+        owned = _wallet_batch(provider, 'validateaddress',
+                              [[keys[deck.id].address] for deck in chunk])
+        pending.extend(deck for deck, r in zip(chunk, owned) if not r["ismine"])
+
+    if not pending:
+        return []
+
+    done = 0
+    for chunk in chunked(pending, batch_size):
+        _wallet_batch(provider, 'importprivkey',
+                      [[keys[deck.id].wif, deck.id, False] for deck in chunk])
+        done += len(chunk)
+        report("import", done, len(pending))
+
+    tip = provider.getblockcount()
+    if rescan_from is None:
+        rescan_from = min((deck.blocknum for deck in pending if deck.blocknum is not None),
+                          default=tip)
+
+    report("rescan", rescan_from, tip)
+    # req hands back the error object instead of raising, read the raw reply
+    _wallet_batch(provider, 'rescanblockchain', [[rescan_from]])
+
+    failed = []
+    done = 0
+    for chunk in chunked(pending, batch_size):
+        owned = _wallet_batch(provider, 'validateaddress',
+                              [[keys[deck.id].address] for deck in chunk])
+        failed.extend(deck.id for deck, r in zip(chunk, owned) if not r["ismine"])
+        done += len(chunk)
+        report("verify", done, len(pending))
+
+    if failed:
+        raise DeckP2THImportError({"error": "Deck P2TH import went wrong.", "decks": failed})
+
+    return pending
+
+
 def validate_card_transfer_p2th(deck: Deck, vout: dict) -> None:
     '''validate if card_transfer transaction pays to deck p2th in vout[0]'''
 
@@ -1,10 +1,11 @@
 """all things PeerAssets protocol."""
 
+from concurrent.futures import Executor
 from enum import Enum
 from operator import itemgetter
-from typing import List, Optional, Generator, cast, Callable
+from typing import Any, Dict, Iterable, List, Optional, Generator, Set, cast
 
-from pypeerassets.kutil import Kutil
+from pypeerassets.kutil import DerivedKey, keycache
 from pypeerassets.paproto_pb2 import DeckSpawn as deckspawnproto
 from pypeerassets.paproto_pb2 import CardTransfer as cardtransferproto
 from pypeerassets.exceptions import (
@@ -12,7 +13,7 @@ from pypeerassets.exceptions import (
     OverSizeOPReturn,
     RecieverAmountMismatch,
 )
-from pypeerassets.card_parsers import parsers
+from pypeerassets.card_parsers import compile_issue_mode, compile_issue_mode_step
 from pypeerassets.networks import net_query
 
 
@@ -67,10 +68,14 @@ class Deck:
                  issuer: str="",
                  issue_time: int=None,
                  id: str=None,
-                 tx_confirmations: int=None) -> None:
+                 tx_confirmations: int=None,
+                 blocknum: int=None) -> None:
         '''
         Initialize deck object, load from dictionary Deck(**dict) or initilize
         with kwargs Deck("deck", 3, "ONCE")
+
+        tx_confirmations is a snapshot taken when the deck was parsed,
+        ChainTip.confirmations(blocknum) gives the current number.
         '''
 
         self.version = version  # protocol version
@@ -82,6 +87,7 @@ class Deck:
         self.issuer = issuer
         self.issue_time = issue_time
         self.tx_confirmations = tx_confirmations
+        self.blocknum = blocknum  # block height of the deck spawn, None if unconfirmed
         self.network = network
         self.production = production
 
@@ -90,8 +96,7 @@ class Deck:
         '''P2TH address of this deck'''
 
         if self.id:
-            return Kutil(network=self.network,
-                         privkey=bytearray.fromhex(self.id)).address
+            return keycache.get(self.network, bytes.fromhex(self.id)).address
         else:
             return None
 
@@ -100,8 +105,7 @@ class Deck:
         '''P2TH privkey in WIF format'''
 
         if self.id:
-            return Kutil(network=self.network,
-                         privkey=bytearray.fromhex(self.id)).wif
+            return keycache.get(self.network, bytes.fromhex(self.id)).wif
         else:
             return None
 
@@ -171,6 +175,17 @@ class Deck:
         return ', '.join(r)
 
 
+def deck_p2th_keys(network: str, deck_ids: Iterable[str],
+                   executor: Executor=None) -> Dict[str, DerivedKey]:
+    '''P2TH address and WIF of many decks at once, as {deck id: DerivedKey}.
+    Keys not derived before are spread over <executor> (a ProcessPoolExecutor) if it is given.'''
+
+    deck_ids = list(dict.fromkeys(deck_ids))
+    keys = keycache.get_many(network, [bytes.fromhex(i) for i in deck_ids], executor)
+
+    return dict(zip(deck_ids, keys))
+
+
 class CardBundle:
 
     '''On the low level, cards come in bundles.
@@ -365,33 +380,35 @@ class CardTransfer:
 def validate_card_issue_modes(issue_mode: int, cards: list) -> list:
     """validate cards against deck_issue modes"""
 
-    supported_mask = 63  # sum of all issue_mode values
-
-    if not bool(issue_mode & supported_mask):
-        return []  # return empty list
+    # parsers of all the issue modes fused into a single pass, see card_parsers
+    return compile_issue_mode(issue_mode)(cards)
 
-    for i in [1 << x for x in range(len(IssueMode))]:
-        if bool(i & issue_mode):
 
-            try:
-                parser_fn = cast(
-                    Callable[[list], Optional[list]],
-                    parsers[IssueMode(i).name]
-                )
-            except ValueError:
-                continue
+class DeckState:
 
-            parsed_cards = parser_fn(cards)
-            if not parsed_cards:
-                return []
-            cards = parsed_cards
+    '''Balances of a deck, computed from its cards.
 
-    return cards
+    The state can be saved with to_json and restored with from_json, apply()
+    then folds in only the cards past the last applied (blocknum, blockseq, cardseq)
+    position. With <issue_mode> given, cards are also validated against the deck
+    issue mode one by one, otherwise they are expected to be validated already.
 
+    Every <checkpoint_interval> blocks a snapshot of the state is taken, cards of
+    the last <undo_depth> blocks are kept in an undo log. rollback() uses them to
+    recover from a chain reorganization without replaying the whole deck history.'''
 
-class DeckState:
+    # card fields kept in the undo log
+    undo_fields = ('txid', 'blockhash', 'blocknum', 'blockseq', 'cardseq', 'type',
+                   'sender', 'receiver', 'amount', 'number_of_decimals')
 
-    def __init__(self, cards: Generator) -> None:
+    def __init__(self, cards: Generator, issue_mode: int=None,
+                 checkpoint_interval: int=10, undo_depth: int=100) -> None:
+        '''
+        : cards - CardTransfer objects to compute the state from
+        : issue_mode - deck issue mode to validate the cards against, None if they are valid already
+        : checkpoint_interval - number of blocks between the state snapshots
+        : undo_depth - number of most recent blocks which can be rolled back
+        '''
 
         self.cards = cards
         self.total = 0
@@ -401,6 +418,20 @@ class DeckState:
         self.processed_transfers = set()
         self.processed_burns = set()
 
+        self.issue_mode = issue_mode
+        self.issued = False  # a CardIssue was accepted already, for ONCE decks
+        self.position = None  # type: Optional[tuple]
+        self.blockhash = None  # type: Optional[str]
+
+        self.checkpoint_interval = checkpoint_interval
+        self.undo_depth = undo_depth
+        # (blocknum, blockhash, snapshot) of the state after that block, oldest first,
+        # the oldest snapshot holds all the balances, the others only those changed since
+        # the checkpoint before them
+        self.checkpoints = [(-1, None, self._snapshot(self.balances))]  # type: List[tuple]
+        self.changed = set()  # type: Set[str]
+        self.undo = []  # type: List[dict]
+
         self.calc_state()
         self.checksum = not bool(self.total - sum(self.balances.values()))
 
@@ -415,6 +446,7 @@ class DeckState:
 
             if balance_check:
                 self.balances[sender] -= amount
+                self.changed.add(sender)
 
                 if 'CardBurn' not in ctype:
                     self._append_balance(amount, receiver)
@@ -435,6 +467,7 @@ class DeckState:
                 self.balances[receiver] += amount
             except KeyError:
                 self.balances[receiver] = amount
+            self.changed.add(receiver)
 
     def _sort_cards(self, cards: Generator) -> list:
         '''sort cards by blocknum and blockseq'''
@@ -442,9 +475,38 @@ class DeckState:
         return sorted([card.__dict__ for card in cards],
                             key=itemgetter('blocknum', 'blockseq', 'cardseq'))
 
+    def _validate_issue_mode(self, card: dict) -> bool:
+        '''incremental counterpart of validate_card_issue_modes,
+        check a single <card> given the cards validated before it'''
+
+        step = compile_issue_mode_step(cast(int, self.issue_mode))
+        valid, amount, self.issued = step(card["type"], card["amount"][0],
+                                          card["number_of_decimals"], self.issued)
+        card["amount"] = [amount]
+
+        return valid
+
     def calc_state(self) -> None:
 
-        for card in self._sort_cards(self.cards):
+        self._apply(self._sort_cards(self.cards))
+
+    def _apply(self, cards: List[dict]) -> None:
+
+        for card in cards:
+
+            position = (card["blocknum"], card["blockseq"], card["cardseq"])
+            if self.position is not None and position <= self.position:
+                continue  # applied already
+
+            if self.position is not None and position[0] > self.position[0]:
+                self._checkpoint(position[0])
+
+            self.position = position
+            self.blockhash = card["blockhash"]
+            self.undo.append({k: card[k] for k in self.undo_fields})
+
+            if self.issue_mode is not None and not self._validate_issue_mode(card):
+                continue
 
             # txid + blockseq + cardseq, as unique ID
             cid = str(card["txid"] + str(card["blockseq"]) + str(card["cardseq"]))
@@ -466,3 +528,142 @@ class DeckState:
                 self.total -= amount * validate
                 self.burned += amount * validate
                 self.processed_burns |= {cid}
+
+    def _checkpoint(self, blocknum: int) -> None:
+        '''snapshot the state if it is due, before the cards of block <blocknum> are applied,
+        drop the checkpoints and undo log entries which can no longer be rolled back to'''
+
+        height = self.position[0]
+        if height - self.checkpoints[-1][0] >= self.checkpoint_interval:
+            changed = {k: self.balances[k] for k in self.changed}
+            self.checkpoints.append((height, self.blockhash, self._snapshot(changed)))
+            self.changed = set()
+
+        # keep the newest checkpoint which is deeper than undo_depth as the base
+        final = blocknum - self.undo_depth
+        base = max([i for i, c in enumerate(self.checkpoints) if c[0] <= final], default=0)
+        if base:
+            # fold the changes up to the new base into the base balances
+            balances = self.checkpoints[0][2]["balances"]
+            for checkpoint in self.checkpoints[1:base + 1]:
+                balances.update(checkpoint[2]["balances"])
+            height = self.checkpoints[base][0]
+            self.checkpoints[base][2]["balances"] = balances
+            del self.checkpoints[:base]
+
+            dropped = 0
+            while dropped < len(self.undo) and self.undo[dropped]["blocknum"] <= height:
+                dropped += 1
+            del self.undo[:dropped]
+
+    def rollback(self, provider: Any) -> bool:
+        '''compare applied blocks with the chain of <provider>,
+        if they were reorganized away return to the newest valid checkpoint and
+        replay the cards which are still on the chain. Returns True if anything was undone,
+        cards of the new chain are to be applied with apply() afterwards. Raises if the
+        reorganization goes deeper than the undo log, the state has to be recomputed then.'''
+
+        if self.blockhash is None or provider.getblockhash(self.position[0]) == self.blockhash:
+            return False
+
+        on_chain = {}  # type: dict
+
+        def valid(blocknum: int, blockhash: str) -> bool:
+            if blocknum not in on_chain:
+                on_chain[blocknum] = provider.getblockhash(blocknum)
+            return on_chain[blocknum] == blockhash
+
+        while len(self.checkpoints) > 1 and not valid(*self.checkpoints[-1][:2]):
+            self.checkpoints.pop()
+
+        height, blockhash, snapshot = self.checkpoints[-1]
+        if blockhash is not None and not valid(height, blockhash):
+            raise Exception("Reorganization is deeper than the undo log, recompute the state.")
+
+        replay = [c for c in self.undo if c["blocknum"] > height]
+        self.undo = [c for c in self.undo if c["blocknum"] <= height]
+        balances = dict(self.checkpoints[0][2]["balances"])
+        for checkpoint in self.checkpoints[1:]:
+            balances.update(checkpoint[2]["balances"])
+        self._restore(dict(snapshot, balances=balances))
+
+        # cards past the checkpoint are processed again
+        self.changed = set()
+        for card in replay:
+            cid = str(card["txid"] + str(card["blockseq"]) + str(card["cardseq"]))
+            self.processed_issues.discard(cid)
+            self.processed_transfers.discard(cid)
+            self.processed_burns.discard(cid)
+
+        tail = []
+        for card in replay:
+            if not valid(card["blocknum"], card["blockhash"]):
+                break
+            tail.append(dict(card))
+
+        self._apply(tail)
+        self.checksum = not bool(self.total - sum(self.balances.values()))
+
+        return True
+
+    def apply(self, cards: Generator) -> None:
+        '''fold in <cards> past the last applied position,
+        cards at or before it are considered processed already.'''
+
+        self._apply(self._sort_cards(cards))
+        self.checksum = not bool(self.total - sum(self.balances.values()))
+
+    def _snapshot(self, balances: dict) -> dict:
+
+        return {
+            "total": self.total,
+            "burned": self.burned,
+            "balances": dict(balances),
+            "issued": self.issued,
+            "position": self.position,
+            "blockhash": self.blockhash
+        }
+
+    def _restore(self, snapshot: dict) -> None:
+
+        self.total = snapshot["total"]
+        self.burned = snapshot["burned"]
+        self.balances = dict(snapshot["balances"])
+        self.issued = snapshot["issued"]
+        self.position = tuple(snapshot["position"]) if snapshot["position"] else None
+        self.blockhash = snapshot["blockhash"]
+        self.checksum = not bool(self.total - sum(self.balances.values()))
+
+    def to_json(self) -> dict:
+        '''export the DeckState to json-ready format, cards are not included'''
+
+        d = self._snapshot(self.balances)
+        d.update({
+            "processed_issues": sorted(self.processed_issues),
+            "processed_transfers": sorted(self.processed_transfers),
+            "processed_burns": sorted(self.processed_burns),
+            "issue_mode": self.issue_mode,
+            "checkpoint_interval": self.checkpoint_interval,
+            "undo_depth": self.undo_depth,
+            "checkpoints": [list(c) for c in self.checkpoints],
+            "changed": sorted(self.changed),
+            "undo": self.undo
+        })
+
+        return d
+
+    @classmethod
+    def from_json(cls, json: dict) -> 'DeckState':
+        '''load the DeckState saved by to_json'''
+
+        state = cls([], json["issue_mode"], json["checkpoint_interval"], json["undo_depth"])
+
+        state._restore(json)
+        state.processed_issues = set(json["processed_issues"])
+        state.processed_transfers = set(json["processed_transfers"])
+        state.processed_burns = set(json["processed_burns"])
+        state.checkpoints = [tuple(c) for c in json["checkpoints"]]
+        state.changed = set(json["changed"])
+        state.undo = [dict(c) for c in json["undo"]]
+
+        return state
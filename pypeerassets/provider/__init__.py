@@ -1,4 +1,10 @@
 from .rpcnode import RpcNode
 from .common import Provider
 from .cryptoid import Cryptoid
-from.blockbook import Blockbook
+from .explorer import Explorer
+from .blockbook import Blockbook
+from .session import HTTPSession
+from .blockmeta import BlockMetaCache
+from .senders import SenderResolver
+from .chaintip import ChainTip
+from .cache import CachingProvider
@@ -0,0 +1,367 @@
+'''asyncio counterparts of the providers, for keeping many requests in flight.'''
+
+from abc import ABC, abstractmethod
+from base64 import b64encode
+import json
+from typing import Union, cast
+
+from pypeerassets.exceptions import UnsupportedNetwork
+from pypeerassets.provider.blockbook import Blockbook
+from pypeerassets.provider.common import Provider
+from pypeerassets.provider.cryptoid import Cryptoid
+from pypeerassets.provider.explorer import Explorer
+from pypeerassets.provider.rpcnode import Client
+from pypeerassets.provider.session import AsyncHTTPSession
+
+
+class AsyncProvider(ABC):
+
+    '''Common asynchronous provider class,
+    network related helpers are shared with the Provider.'''
+
+    net = ""
+
+    headers = Provider.headers
+
+    session = None  # type: AsyncHTTPSession
+
+    blockmeta = Provider.blockmeta
+    senders = Provider.senders
+
+    _netname = staticmethod(Provider._netname)
+    network = Provider.network
+    pa_parameters = Provider.pa_parameters
+    network_properties = Provider.network_properties
+    is_testnet = Provider.is_testnet
+    validateaddress = Provider.validateaddress
+
+    def _init_session(self, session: AsyncHTTPSession=None) -> None:
+
+        self.session = session or AsyncHTTPSession()
+
+    async def http_get(self, url: str) -> bytes:
+        '''GET <url> using a pooled keep-alive connection, return the response body.'''
+
+        response = await self.session.get(url, headers=self.headers)
+        if response.status != 200:
+            raise Exception(response.reason)
+
+        return response.body
+
+    async def close(self) -> None:
+        '''close idle connections'''
+
+        await self.session.close()
+
+    @abstractmethod
+    async def getblockhash(self, blocknum: int) -> str:
+        '''get blockhash using blocknum query'''
+        raise NotImplementedError
+
+    @abstractmethod
+    async def getblockcount(self) -> int:
+        '''get block count'''
+        raise NotImplementedError
+
+    @abstractmethod
+    async def getblock(self, hash: str) -> dict:
+        '''query block using <blockhash> as key.'''
+        raise NotImplementedError
+
+    @abstractmethod
+    async def getrawtransaction(self, txid: str, decrypt: int=1) -> dict:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def listtransactions(self, address: str) -> list:
+        raise NotImplementedError
+
+
+class AsyncRpcNode(AsyncProvider):
+
+    '''Asynchronous JSON-RPC connection to local Peercoin node'''
+
+    def __init__(self, testnet: bool=False, username: str=None,
+                 password: str=None, ip: str=None, port: int=None,
+                 directory: str=None, session: AsyncHTTPSession=None) -> None:
+
+        # let peercoin_rpc resolve the url and credentials, as RpcNode does
+        conf = Client(testnet=testnet, username=username, password=password,
+                      ip=ip, port=port, directory=directory)
+
+        self.testnet = conf.testnet
+        self.url = conf.url
+
+        auth = b64encode('{0}:{1}'.format(conf.username, conf.password).encode()).decode()
+        self.rpc_headers = dict(self.headers)
+        self.rpc_headers.update({"Authorization": "Basic " + auth,
+                                 "Content-Type": "application/json"})
+        self._init_session(session)
+
+    @property
+    def is_testnet(self) -> bool:
+        '''check if node is configured to use testnet or mainnet'''
+
+        return self.testnet
+
+    @property
+    def network(self) -> str:
+        '''return which network is the node operating on.'''
+
+        if self.is_testnet:
+            return "tppc"
+        else:
+            return "ppc"
+
+    async def _post(self, data: Union[dict, list]) -> Union[dict, list]:
+
+        response = await self.session.request('POST', self.url,
+                                              body=json.dumps(data).encode(),
+                                              headers=self.rpc_headers)
+        return json.loads(response.body.decode())
+
+    async def req(self, method: str, params: list=[]) -> Union[dict, list, str, int]:
+        '''send request to peercoind'''
+
+        response = cast(dict, await self._post({"method": method,
+                                                "params": params,
+                                                "jsonrpc": "1.1"}))
+
+        if response["error"] is not None:
+            return response["error"]
+        else:
+            return response["result"]
+
+    async def batch(self, reqs: list) -> list:
+        '''send batch request using jsonrpc 2.0'''
+
+        batch_data = [{"method": req[0], "params": req[1], "jsonrpc": "2.0", "id": req_id}
+                      for req_id, req in enumerate(reqs)]
+
+        return cast(list, await self._post(batch_data))
+
+    async def getblockhash(self, blocknum: int) -> str:
+
+        return cast(str, await self.req("getblockhash", [blocknum]))
+
+    async def getblockcount(self) -> int:
+
+        return cast(int, await self.req("getblockcount"))
+
+    async def getblock(self, hash: str) -> dict:
+
+        return cast(dict, await self.req("getblock", [hash]))
+
+    async def getrawtransaction(self, txid: str, decrypt: int=1) -> dict:
+
+        return cast(dict, await self.req("getrawtransaction", [txid, decrypt]))
+
+    async def getaccount(self, address: str) -> str:
+
+        return cast(str, await self.req("getaccount", [address]))
+
+    async def listtransactions(self, account: str="", many: int=999,
+                               since: int=0) -> list:
+
+        return cast(list, await self.req("listtransactions", [account, many, since]))
+
+
+class AsyncCryptoid(AsyncProvider):
+
+    '''Asynchronous API wrapper for http://chainz.cryptoid.info blockexplorer.'''
+
+    api_key = Cryptoid.api_key
+    api_url_fmt = Cryptoid.api_url_fmt
+    explorer_url = Cryptoid.explorer_url
+
+    format_name = staticmethod(Cryptoid.format_name)
+
+    def __init__(self, network: str, session: AsyncHTTPSession=None) -> None:
+
+        self.net = self._netname(network)['short']
+        self.api_url = self.api_url_fmt.format(net=self.format_name(self.net))
+        self._init_session(session)
+
+    async def get_url(self, url: str) -> Union[dict, int, float, str]:
+
+        return json.loads((await self.http_get(url)).decode())
+
+    async def api_req(self, query: str) -> dict:
+
+        query = "?q=" + query + "&key=" + self.api_key
+        return cast(dict, await self.get_url(self.api_url + query))
+
+    async def getblockcount(self) -> int:
+
+        return cast(int, await self.api_req('getblockcount'))
+
+    async def getblock(self, blockhash: str) -> dict:
+
+        query = 'block.raw.dws?coin={net}&hash={blockhash}'.format(
+            net=self.format_name(self.net),
+            blockhash=blockhash,
+        )
+        return cast(dict, await self.get_url(self.explorer_url + query))
+
+    async def getblockhash(self, blocknum: int) -> str:
+
+        query = 'getblockhash' + '&height=' + str(blocknum)
+        return cast(str, await self.api_req(query))
+
+    async def getrawtransaction(self, txid: str, decrypt: int=0) -> dict:
+
+        query = 'tx.raw.dws?coin={net}&id={txid}'.format(
+            net=self.format_name(self.net),
+            txid=txid,
+        )
+        if not decrypt:
+            query += '&hex'
+            return cast(dict, await self.get_url(self.explorer_url + query))['hex']
+
+        return cast(dict, await self.get_url(self.explorer_url + query))
+
+    async def listtransactions(self, address: str) -> list:
+
+        query = 'address.summary.dws?coin={net}&id={addr}'.format(
+            net=self.format_name(self.net),
+            addr=address,
+        )
+        response = cast(dict, await self.get_url(self.explorer_url + query))
+        return [tx[1].lower() for tx in response["tx"]]
+
+
+class AsyncExplorer(AsyncProvider):
+
+    '''Asynchronous API wrapper for https://explorer.peercoin.net blockexplorer.'''
+
+    api_url = Explorer.api_url
+    ext_url = Explorer.ext_url
+    testnet_api_url = Explorer.testnet_api_url
+    testnet_ext_url = Explorer.testnet_ext_url
+
+    def __init__(self, network: str, session: AsyncHTTPSession=None) -> None:
+
+        self.net = self._netname(network)['short']
+        if 'ppc' not in self.net:
+            raise UnsupportedNetwork('This API only supports Peercoin.')
+        self._init_session(session)
+
+    async def _fetch(self, url: str) -> Union[dict, int, float, str]:
+
+        r = await self.http_get(url)
+
+        try:
+            return json.loads(r.decode())
+        except json.decoder.JSONDecodeError:
+            return r.decode()
+
+    async def api_fetch(self, command: str) -> Union[dict, int, float, str]:
+
+        if self.is_testnet:
+            return await self._fetch(self.testnet_api_url + command)
+
+        return await self._fetch(self.api_url + command)
+
+    async def ext_fetch(self, command: str) -> Union[dict, int, float, str]:
+
+        if self.is_testnet:
+            return await self._fetch(self.testnet_ext_url + command)
+
+        return await self._fetch(self.ext_url + command)
+
+    async def getblockcount(self) -> int:
+        '''Returns the current block index.'''
+
+        return cast(int, await self.api_fetch('getblockcount'))
+
+    async def getblockhash(self, index: int) -> str:
+        '''Returns the hash of the block at ; index 0 is the genesis block.'''
+
+        return cast(str, await self.api_fetch('getblockhash?index=' + str(index)))
+
+    async def getblock(self, hash: str) -> dict:
+        '''Returns information about the block with the given hash.'''
+
+        return cast(dict, await self.api_fetch('getblock?hash=' + hash))
+
+    async def getrawtransaction(self, txid: str, decrypt: int=0) -> dict:
+        '''Returns raw transaction representation for given transaction id.
+        decrypt can be set to 0(false) or 1(true).'''
+
+        q = 'getrawtransaction?txid={txid}&decrypt={decrypt}'.format(txid=txid, decrypt=decrypt)
+
+        return cast(dict, await self.api_fetch(q))
+
+    async def getaddress(self, address: str) -> dict:
+        '''Returns information for given address.'''
+
+        return cast(dict, await self.ext_fetch('getaddress/' + address))
+
+    async def listtransactions(self, address: str) -> list:
+
+        try:
+            r = (await self.getaddress(address))['last_txs']
+            return [i['addresses'] for i in r]
+        except KeyError:
+            return None
+
+
+class AsyncBlockbook(AsyncProvider):
+
+    '''Asynchronous API wrapper for https://blockbook.peercoin.net blockexplorer.'''
+
+    api_url = Blockbook.api_url
+    testnet_api_url = Blockbook.testnet_api_url
+
+    def __init__(self, network: str, session: AsyncHTTPSession=None) -> None:
+
+        self.net = self._netname(network)['short']
+        if 'ppc' not in self.net:
+            raise UnsupportedNetwork('This API only supports Peercoin.')
+        self._init_session(session)
+
+    async def api_fetch(self, command: str) -> Union[dict, int, float, str]:
+
+        apiurl = self.api_url
+        if self.is_testnet:
+            apiurl = self.testnet_api_url
+
+        r = await self.http_get(apiurl + command)
+
+        try:
+            return json.loads(r.decode())
+        except json.decoder.JSONDecodeError:
+            return r.decode()
+
+    async def getblockcount(self) -> int:
+        '''Returns the current block index.'''
+
+        return cast(dict, await self.api_fetch(''))['backend']['blocks']
+
+    async def getblockhash(self, index: int) -> str:
+        '''Returns the hash of the block at ; index 0 is the genesis block.'''
+
+        return cast(dict, await self.api_fetch('block-index/' + str(index)))['blockHash']
+
+    async def getblock(self, hash: str) -> dict:
+        '''Returns information about the block with the given hash.'''
+
+        return cast(dict, await self.api_fetch('block/' + hash))
+
+    async def getrawtransaction(self, txid: str, decrypt: int=0) -> dict:
+        '''Returns raw transaction representation for given transaction id.'''
+
+        return cast(dict, await self.api_fetch('/tx-specific/{txid}'.format(txid=txid)))
+
+    async def getaddress(self, address: str) -> dict:
+        '''Returns information for given address.'''
+
+        return cast(dict, await self.api_fetch('address/' + address))
+
+    async def listtransactions(self, address: str) -> list:
+
+        try:
+            r = (await self.getaddress(address))['transactions']
+            return [i for i in r]
+        except KeyError:
+            return None
@@ -1,13 +1,13 @@
+from concurrent.futures import Executor
 from decimal import Decimal
-from http.client import HTTPResponse
 import json
-from typing import Union, cast
-from urllib.request import urlopen
+from typing import Iterator, Tuple, Union, cast
 
 from btcpy.structs.transaction import ScriptSig, Sequence, TxIn
 
-from pypeerassets.exceptions import InsufficientFunds, UnsupportedNetwork
+from pypeerassets.exceptions import EmptyP2THDirectory, InsufficientFunds, UnsupportedNetwork
 from pypeerassets.provider.common import Provider
+from pypeerassets.provider.session import HTTPSession
 
 '''
 TODO:
@@ -17,27 +17,28 @@ Add multi-functionality for the endpoints that support it (ex: getblock, getaddr
 class Blockbook(Provider):
     '''API wrapper for https://blockbook.peercoin.net blockexplorer.'''
 
+    api_url = 'https://blockbook.peercoin.net/api/'
+    testnet_api_url = 'https://tblockbook.peercoin.net/api/'
 
-    def __init__(self, network: str) -> None:
+    def __init__(self, network: str, session: HTTPSession=None) -> None:
         """
         : network = peercoin [ppc], peercoin-testnet [tppc] ...
+        : session = HTTPSession to use instead of the shared default one
         """
 
         self.net = self._netname(network)['short']
         if 'ppc' not in self.net:
             raise UnsupportedNetwork('This API only supports Peercoin.')
+        if session is not None:
+            self.http = session
 
     def api_fetch(self, command: str) -> Union[dict, int, float, str]:
 
-        apiurl = 'https://blockbook.peercoin.net/api/'
+        apiurl = self.api_url
         if self.is_testnet:
-            apiurl = 'https://tblockbook.peercoin.net/api/'
+            apiurl = self.testnet_api_url
 
-        response = cast(HTTPResponse, urlopen(apiurl + command))
-        if response.status != 200:
-            raise Exception(response.reason)
-
-        r = response.read()
+        r = self.http_get(apiurl + command)
 
         try:
             return json.loads(r.decode())
@@ -126,3 +127,58 @@ class Blockbook(Provider):
             return [i for i in r]
         except KeyError:
             return None
+
+    def _decode_tx(self, tx: dict) -> dict:
+        '''map blockbook v2 transaction details to the getrawtransaction shape'''
+
+        # imported here to avoid a circular import, transactions imports the providers
+        from pypeerassets.transactions import decode_raw_transaction
+
+        raw = decode_raw_transaction(tx['hex'], self.network_properties)
+        raw['hex'] = tx['hex']
+
+        if tx.get('blockHash'):
+            raw['blockhash'] = tx['blockHash']
+            raw['blocktime'] = tx['blockTime']
+        raw['confirmations'] = tx.get('confirmations', 0)
+
+        # blockbook tells the address spent by each input, sender is known without the parent
+        vin = tx['vin'][0]
+        if vin.get('addresses') and vin.get('isAddress', True):
+            self.senders.add(vin['txid'], vin.get('vout', 0), vin['addresses'][0])
+
+        return raw
+
+    def _raw_transactions_page(self, address: str, page: int, page_size: int) -> Tuple[list, bool]:
+
+        # transaction details are served by the v2 api only, the legacy one lists txids
+        r = cast(dict, self.api_fetch('v2/address/{0}?page={1}&pageSize={2}&details=txs'.format(
+            address, page + 1, page_size)))
+
+        # v2 counts the transactions in txs and leaves out an empty transactions list
+        if 'txs' not in r or (r['txs'] and 'transactions' not in r):
+            raise Exception('Unexpected blockbook response, transaction details are missing.')
+        if not r['txs'] and page == 0:
+            raise EmptyP2THDirectory({'error': 'No transactions found on this address.'})
+
+        return ([self._decode_tx(tx) for tx in r.get('transactions', [])],
+                r.get('totalPages', 1) > page + 1)
+
+    def iter_raw_transactions(self, address: str, page_size: int=1000, prefetch: int=100,
+                              executor: Executor=None, ordered: bool=True) -> Iterator[dict]:
+        '''iterate over decoded transactions of <address>, newest first,
+        pulled with their details in bulk, <page_size> at a time.
+        The next page is fetched ahead, <prefetch>, <executor> and <ordered> are not used.'''
+
+        return self._iter_pages(self._raw_transactions_page, address, page_size)
+
+    def _transactions_page(self, address: str, page: int, page_size: int) -> Tuple[list, bool]:
+
+        # blockbook pages are numbered from 1
+        r = cast(dict, self.api_fetch('address/{0}?page={1}&pageSize={2}&details=txids'.format(
+            address, page + 1, page_size)))
+        txids = r.get('txids', r.get('transactions', []))
+        if not txids and page == 0:
+            raise EmptyP2THDirectory({'error': 'No transactions found on this address.'})
+
+        return txids, r.get('totalPages', 1) > page + 1
@@ -0,0 +1,147 @@
+'''Shared cache of block metadata: block height and position of each transaction.'''
+
+import asyncio
+from collections import OrderedDict, namedtuple
+import threading
+from typing import Any, Dict, Iterable, Optional
+
+
+BlockMeta = namedtuple('BlockMeta', ['hash', 'height', 'index'])
+
+
+class BlockMetaCache:
+
+    '''Keeps height and a txid -> position index of recently used blocks.
+
+    Blocks are keyed by their hash, so a single cache is safely shared by all
+    providers and networks. Concurrent lookups of the same block wait for one
+    getblock call instead of downloading the block each.'''
+
+    def __init__(self, maxsize: int=4096) -> None:
+        '''
+        : maxsize - number of blocks to keep, least recently used ones are dropped first
+        '''
+
+        self.maxsize = maxsize
+
+        self._lock = threading.Lock()
+        self._blocks = OrderedDict()  # type: OrderedDict
+        self._pending = {}  # type: Dict[str, threading.Event]
+        self._tasks = {}  # type: Dict[str, asyncio.Future]
+        self._stats = {"hits": 0, "misses": 0}
+
+    def add(self, blockhash: str, block: dict) -> BlockMeta:
+        '''index getblock response <block>'''
+
+        meta = BlockMeta(hash=blockhash,
+                         height=block["height"],
+                         index={txid: n for n, txid in enumerate(block["tx"])})
+
+        with self._lock:
+            self._blocks[blockhash] = meta
+            self._blocks.move_to_end(blockhash)
+            while len(self._blocks) > self.maxsize:
+                self._blocks.popitem(last=False)
+
+        return meta
+
+    def cached(self, blockhash: str) -> Optional[BlockMeta]:
+        '''return metadata of <blockhash> if it is known, None otherwise'''
+
+        with self._lock:
+            meta = self._blocks.get(blockhash)
+            if meta is not None:
+                self._blocks.move_to_end(blockhash)
+                self._stats["hits"] += 1
+            return meta
+
+    def get(self, provider: Any, blockhash: str) -> BlockMeta:
+        '''return metadata of <blockhash>, fetching the block from <provider> if needed'''
+
+        while True:
+            with self._lock:
+                meta = self._blocks.get(blockhash)
+                if meta is not None:
+                    self._blocks.move_to_end(blockhash)
+                    self._stats["hits"] += 1
+                    return meta
+
+                event = self._pending.get(blockhash)
+                if event is None:
+                    event = self._pending[blockhash] = threading.Event()
+                    self._stats["misses"] += 1
+                    break
+
+            # some other thread is fetching it already
+            event.wait()
+
+        try:
+            return self.add(blockhash, provider.getblock(blockhash))
+        finally:
+            with self._lock:
+                del self._pending[blockhash]
+            event.set()
+
+    def prefetch(self, provider: Any, blockhashes: Iterable[str]) -> None:
+        '''fetch all unknown <blockhashes> at once, using a JSON-RPC batch with the RpcNode'''
+
+        # imported here, rpcnode -> common -> blockmeta would be a circular import
+        from pypeerassets.provider.rpcnode import RpcNode
+
+        with self._lock:
+            missing = [h for h in OrderedDict.fromkeys(blockhashes)
+                       if h not in self._blocks and h not in self._pending]
+
+        if not missing:
+            return
+
+        if not isinstance(provider.backend, RpcNode):
+            for blockhash in missing:
+                self.get(provider, blockhash)
+            return
+
+        with self._lock:
+            self._stats["misses"] += len(missing)
+
+        response = provider.batch([('getblock', [blockhash]) for blockhash in missing])
+        for blockhash, r in zip(missing, sorted(response, key=lambda r: r["id"])):
+            if r.get("error"):
+                raise Exception(r["error"])
+            self.add(blockhash, r["result"])
+
+    async def aget(self, provider: Any, blockhash: str) -> BlockMeta:
+        '''asyncio version of get, for use with the AsyncProvider'''
+
+        meta = self.cached(blockhash)
+        if meta is not None:
+            return meta
+
+        task = self._tasks.get(blockhash)
+        if task is None:
+
+            async def fetch() -> BlockMeta:
+                return self.add(blockhash, await provider.getblock(blockhash))
+
+            with self._lock:
+                self._stats["misses"] += 1
+            task = self._tasks[blockhash] = asyncio.ensure_future(fetch())
+            task.add_done_callback(lambda t: self._tasks.pop(blockhash, None))
+
+        # one cancelled consumer must not cancel the fetch for the others
+        return await asyncio.shield(task)
+
+    def stats(self) -> dict:
+
+        with self._lock:
+            stats = dict(self._stats)
+            stats["blocks"] = len(self._blocks)
+
+        return stats
+
+    def clear(self) -> None:
+
+        with self._lock:
+            self._blocks.clear()
+
+
+default_blockmeta = BlockMetaCache()
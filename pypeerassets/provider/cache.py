@@ -0,0 +1,324 @@
+'''Persistent cache of final transactions and blocks, wrapping any Provider.'''
+
+from decimal import Decimal
+import json
+import sqlite3
+import threading
+from typing import Any, Dict, Iterator, List, Optional
+import zlib
+
+from pypeerassets.provider.chaintip import ChainTip
+from pypeerassets.provider.common import Provider
+
+
+class CachingProvider(Provider):
+
+    '''Provider decorator which keeps transactions and blocks in a SQLite database.
+
+    Only data which is buried at least <min_confirmations> deep is cached, as it
+    is considered final. Entries are zlib compressed and the least recently used
+    ones are evicted once the cache grows over <max_size> bytes.
+
+    Cached payloads do not include confirmations, those are derived from the block
+    height and the shared ChainTip tracker whenever an entry is read.
+
+    Reads do not write to the database, access times of the entries are kept in
+    memory and written along with the next store, or once <flush_every> are pending.
+    A file database is read through a connection of each thread, in parallel.'''
+
+    def __init__(self, provider: Provider, path: str=':memory:',
+                 min_confirmations: int=6, max_size: int=256 * 1024**2,
+                 compression: int=6, chaintip: ChainTip=None,
+                 flush_every: int=1000) -> None:
+        '''
+        : provider - Provider instance to wrap
+        : path - path to the SQLite database file
+        : min_confirmations - depth at which transactions and blocks are considered final
+        : max_size - maximum size of the cached (compressed) payloads in bytes
+        : compression - zlib compression level
+        : chaintip - ChainTip used to derive confirmations, a new one is made if not given
+        : flush_every - number of pending access times which are written without waiting for a store
+        '''
+
+        self.provider = provider
+        self.chaintip = chaintip or ChainTip(provider)
+        self.min_confirmations = min_confirmations
+        self.max_size = max_size
+        self.compression = compression
+        self.flush_every = flush_every
+
+        self._path = path
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._readers = []  # type: List[sqlite3.Connection]
+        self._accessed = {}  # type: Dict[tuple, int]
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        if path != ':memory:':
+            # readers do not block the writer, nor each other
+            self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('''CREATE TABLE IF NOT EXISTS objects (
+                                network TEXT NOT NULL,
+                                kind TEXT NOT NULL,
+                                key TEXT NOT NULL,
+                                data BLOB NOT NULL,
+                                size INTEGER NOT NULL,
+                                height INTEGER,
+                                accessed INTEGER NOT NULL,
+                                PRIMARY KEY (network, kind, key))''')
+        self._db.execute('''CREATE INDEX IF NOT EXISTS objects_accessed
+                            ON objects (accessed)''')
+        self._db.commit()
+
+        self._size, self._clock = self._db.execute(
+            'SELECT COALESCE(SUM(size), 0), COALESCE(MAX(accessed), 0) FROM objects'
+            ).fetchone()
+        self._network = None  # type: Optional[str]
+        self._stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+
+    def __getattr__(self, name: str) -> Any:
+        '''anything which is not cached is served by the wrapped provider'''
+
+        if name == 'provider':
+            raise AttributeError(name)
+        return getattr(self.provider, name)
+
+    @property
+    def backend(self) -> Provider:
+
+        return self.provider.backend
+
+    @property
+    def network(self) -> str:
+        '''network of the wrapped provider, queried only once'''
+
+        if self._network is None:
+            self._network = self.provider.network
+        return self._network
+
+    def _reader(self) -> sqlite3.Connection:
+        '''connection of the calling thread to the file database'''
+
+        db = getattr(self._local, 'db', None)
+        if db is None:
+            db = self._local.db = sqlite3.connect(self._path, check_same_thread=False)
+            with self._lock:
+                self._readers.append(db)
+
+        return db
+
+    def _flush(self) -> None:
+        '''write the pending access times, with the lock held'''
+
+        if self._accessed:
+            self._db.executemany('''UPDATE objects SET accessed=?
+                                    WHERE network=? AND kind=? AND key=?''',
+                                 [(clock,) + k for k, clock in self._accessed.items()])
+            self._accessed = {}
+
+    def _get(self, kind: str, key: str) -> Optional[Any]:
+
+        query = '''SELECT data, height FROM objects WHERE network=? AND kind=? AND key=?'''
+        params = (self.network, kind, key)
+
+        if self._path == ':memory:':
+            with self._lock:
+                row = self._db.execute(query, params).fetchone()
+        else:
+            row = self._reader().execute(query, params).fetchone()
+
+        with self._lock:
+            if row is None:
+                self._stats["misses"] += 1
+                return None
+
+            self._clock += 1
+            self._accessed[params] = self._clock
+            self._stats["hits"] += 1
+
+            if len(self._accessed) >= self.flush_every:
+                self._flush()
+                self._db.commit()
+
+        value = json.loads(zlib.decompress(row[0]).decode())
+        if row[1] is not None:
+            value["confirmations"] = self.chaintip.confirmations(row[1])
+
+        return value
+
+    def _put(self, kind: str, key: str, value: Any, height: int=None) -> None:
+
+        if height is not None:
+            value = {k: v for k, v in value.items() if k != "confirmations"}
+
+        data = zlib.compress(json.dumps(value, default=str).encode(), self.compression)
+
+        with self._lock:
+            self._flush()
+            self._clock += 1
+            old = self._db.execute('''SELECT size FROM objects
+                                      WHERE network=? AND kind=? AND key=?''',
+                                   (self.network, kind, key)).fetchone()
+            self._db.execute('''INSERT OR REPLACE INTO objects
+                                VALUES (?, ?, ?, ?, ?, ?, ?)''',
+                             (self.network, kind, key, data, len(data), height, self._clock))
+            self._size += len(data) - (old[0] if old else 0)
+            self._stats["stores"] += 1
+
+            if self._size > self.max_size:
+                self._evict()
+
+            self._db.commit()
+
+    def _evict(self) -> None:
+        '''drop least recently used entries until the cache is 10% under max_size'''
+
+        target = self.max_size * 0.9
+        rows = self._db.execute('''SELECT network, kind, key, size FROM objects
+                                   ORDER BY accessed''')
+
+        evicted = []
+        for network, kind, key, size in rows:
+            if self._size <= target:
+                break
+            evicted.append((network, kind, key))
+            self._size -= size
+
+        self._db.executemany('DELETE FROM objects WHERE network=? AND kind=? AND key=?',
+                             evicted)
+        self._stats["evictions"] += len(evicted)
+
+    def _is_final(self, value: Any) -> bool:
+
+        return (isinstance(value, dict) and
+                value.get("confirmations", 0) >= self.min_confirmations)
+
+    def _store(self, kind: str, key: str, value: Any) -> None:
+        '''cache <value> if it will not change anymore'''
+
+        # some explorers answer decrypt=0 with the verbose transaction, which may change
+        if kind == 'txhex' and isinstance(value, str):
+            self._put(kind, key, value)
+
+        elif self._is_final(value):
+            if kind == 'block':
+                height = value["height"]
+            else:
+                height = self.blockmeta.get(self, value["blockhash"]).height
+            self._put(kind, key, value, height)
+
+    def stats(self) -> dict:
+        '''cache statistics'''
+
+        with self._lock:
+            stats = dict(self._stats)
+            stats["size"] = self._size
+            stats["entries"] = self._db.execute('SELECT COUNT(*) FROM objects').fetchone()[0]
+
+        return stats
+
+    def clear(self) -> None:
+        '''drop all cached entries'''
+
+        with self._lock:
+            self._accessed = {}
+            self._db.execute('DELETE FROM objects')
+            self._db.commit()
+            self._size = 0
+
+    def close(self) -> None:
+
+        with self._lock:
+            self._flush()
+            self._db.commit()
+            self._db.close()
+            for db in self._readers:
+                db.close()
+
+    def getrawtransaction(self, txid: str, decrypt: int=1) -> dict:
+
+        # serialized transaction never changes, as txid commits to it
+        kind = 'tx' if decrypt else 'txhex'
+
+        cached = self._get(kind, txid)
+        if cached is not None:
+            return cached
+
+        tx = self.provider.getrawtransaction(txid, decrypt)
+        self._store(kind, txid, tx)
+
+        return tx
+
+    def getblock(self, hash: str) -> dict:
+
+        cached = self._get('block', hash)
+        if cached is not None:
+            return cached
+
+        block = self.provider.getblock(hash)
+        self._store('block', hash, block)
+
+        return block
+
+    def batch(self, reqs: list) -> list:
+        '''JSON-RPC batch, getrawtransaction and getblock calls are served from
+        the cache where possible, the rest is forwarded in a single batch.'''
+
+        kinds = {'getrawtransaction': 'tx', 'getblock': 'block'}
+        results = {}  # type: dict
+        forward = []
+
+        for req_id, (method, params) in enumerate(reqs):
+            kind = kinds.get(method)
+            if kind == 'tx' and not (len(params) > 1 and params[1]):
+                kind = 'txhex'
+
+            cached = self._get(kind, params[0]) if kind else None
+            if cached is not None:
+                results[req_id] = {"result": cached, "error": None, "id": req_id}
+            else:
+                forward.append((req_id, kind, method, params))
+
+        if forward:
+            response = self.provider.batch([(method, params) for _, _, method, params in forward])
+            for (req_id, kind, _, params), r in zip(forward, sorted(response, key=lambda r: r["id"])):
+                r["id"] = req_id
+                results[req_id] = r
+                if kind and r.get("error") is None:
+                    self._store(kind, params[0], r["result"])
+
+        return [results[i] for i in range(len(reqs))]
+
+    def getblockhash(self, blocknum: int) -> str:
+        return self.provider.getblockhash(blocknum)
+
+    def getblockcount(self) -> int:
+        return self.provider.getblockcount()
+
+    def getdifficulty(self) -> dict:
+        return self.provider.getdifficulty()
+
+    def getbalance(self, address: str) -> Decimal:
+        return self.provider.getbalance(address)
+
+    def getreceivedbyaddress(self, address: str) -> Decimal:
+        return self.provider.getreceivedbyaddress(address)
+
+    def listunspent(self, address: str) -> list:
+        return self.provider.listunspent(address)
+
+    def select_inputs(self, address: str, amount: int) -> dict:
+        return self.provider.select_inputs(address, amount)
+
+    def listtransactions(self, *args, **kwargs) -> list:
+        return self.provider.listtransactions(*args, **kwargs)
+
+    def iter_transactions(self, *args, **kwargs) -> Iterator[str]:
+        return self.provider.iter_transactions(*args, **kwargs)
+
+    def iter_raw_transactions(self, *args, **kwargs) -> Iterator[dict]:
+
+        # bulk mode of the wrapped provider beats fetching transactions one by one
+        if type(self.provider).iter_raw_transactions is not Provider.iter_raw_transactions:
+            return self.provider.iter_raw_transactions(*args, **kwargs)
+
+        return super().iter_raw_transactions(*args, **kwargs)
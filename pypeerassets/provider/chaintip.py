@@ -0,0 +1,75 @@
+'''Shared chain tip tracker, derives confirmations from block heights.'''
+
+import threading
+import time
+from typing import Optional
+
+from pypeerassets.provider.common import Provider
+
+
+class ChainTip:
+
+    '''Tracks the height of the best block of <provider>.
+
+    getblockcount is polled at most once per <interval> seconds no matter how
+    many threads ask, so confirmations can be computed from the block height
+    of a transaction instead of being fetched along with it.'''
+
+    def __init__(self, provider: Provider, interval: float=60.0) -> None:
+
+        self.provider = provider
+        self.interval = interval
+
+        self._lock = threading.Lock()
+        self._poll_lock = threading.Lock()  # held across the poll, one at a time
+        self._height = None  # type: Optional[int]
+        self._polled = 0.0
+
+    def _fresh(self) -> Optional[int]:
+
+        with self._lock:
+            if self._height is not None and time.monotonic() - self._polled < self.interval:
+                return self._height
+
+        return None
+
+    def _poll(self) -> int:
+
+        height = self.provider.getblockcount()
+
+        with self._lock:
+            self._height = height
+            self._polled = time.monotonic()
+
+        return height
+
+    def refresh(self) -> int:
+        '''poll the provider for the current block count'''
+
+        with self._poll_lock:
+            return self._poll()
+
+    @property
+    def height(self) -> int:
+        '''height of the best block, at most <interval> seconds old'''
+
+        height = self._fresh()
+        if height is not None:
+            return height
+
+        with self._poll_lock:
+            # threads which waited for the lock use the height polled meanwhile
+            height = self._fresh()
+            if height is not None:
+                return height
+
+            return self._poll()
+
+    def confirmations(self, blocknum: Optional[int]) -> int:
+        '''number of confirmations of a block (or transaction in that block) at height <blocknum>,
+        use this with Deck.blocknum and CardTransfer.blocknum instead of their tx_confirmations snapshots.'''
+
+        if blocknum is None:
+            return 0
+
+        return max(self.height - blocknum + 1, 0)
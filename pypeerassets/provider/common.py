@@ -1,14 +1,20 @@
 '''Common provider class with basic features.'''
 
 from abc import ABC, abstractmethod
+import concurrent.futures
 from decimal import Decimal
+from typing import Callable, Iterator, Tuple
 import urllib.request
 
 from btcpy.structs.address import Address, InvalidAddress
 
-from pypeerassets.exceptions import UnsupportedNetwork
+from pypeerassets.exceptions import EmptyP2THDirectory, UnsupportedNetwork
 from pypeerassets.pa_constants import PAParams, param_query
 from pypeerassets.networks import Constants, net_query
+from pypeerassets.provider.blockmeta import BlockMetaCache, default_blockmeta
+from pypeerassets.provider.pipeline import read_ahead
+from pypeerassets.provider.senders import SenderResolver, default_senders
+from pypeerassets.provider.session import HTTPSession, default_session
 
 
 class Provider(ABC):
@@ -17,6 +23,14 @@ class Provider(ABC):
 
     headers = {"User-Agent": "pypeerassets"}
 
+    http = default_session  # type: HTTPSession
+
+    blockmeta = default_blockmeta  # type: BlockMetaCache
+
+    senders = default_senders  # type: SenderResolver
+
+    max_workers = 8  # concurrent requests made by the scans, set per instance to adjust
+
     @staticmethod
     def _netname(name: str) -> dict:
         '''resolute network name,
@@ -37,6 +51,13 @@ class Provider(ABC):
 
         return self._netname(self.net)['long']
 
+    @property
+    def backend(self) -> 'Provider':
+        '''provider which actually talks to the blockchain,
+        wrappers such as the CachingProvider return the provider they wrap.'''
+
+        return self
+
     @property
     def pa_parameters(self) -> PAParams:
         '''load network PeerAssets parameters.'''
@@ -70,6 +91,15 @@ class Provider(ABC):
         resp = urllib.request.urlopen(url)
         return resp.read().decode('utf-8')
 
+    def http_get(self, url: str) -> bytes:
+        '''GET <url> using a pooled keep-alive connection, return the response body.'''
+
+        response = self.http.get(url, headers=self.headers)
+        if response.status != 200:
+            raise Exception(response.reason)
+
+        return response.body
+
     @abstractmethod
     def getblockhash(self, blocknum: int) -> str:
         '''get blockhash using blocknum query'''
@@ -113,6 +143,48 @@ class Provider(ABC):
     def listtransactions(self, address: str) -> list:
         raise NotImplementedError
 
+    def _transactions_page(self, address: str, page: int, page_size: int) -> Tuple[list, bool]:
+        '''txids on <page> of <address> transactions and whether more pages follow,
+        providers which can not paginate return all of them on the first page.'''
+
+        txids = self.listtransactions(address)
+        if txids is None:
+            raise EmptyP2THDirectory({'error': 'No transactions found on this address.'})
+
+        return txids, False
+
+    @staticmethod
+    def _iter_pages(fetch_page: Callable, address: str, page_size: int) -> Iterator:
+        '''iterate over items of all <fetch_page> pages,
+        next page is fetched while the current one is being consumed.'''
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=1) as th:
+            page = th.submit(fetch_page, address, 0, page_size)
+            n = 0
+
+            while page is not None:
+                items, more = page.result()
+                n += 1
+                page = th.submit(fetch_page, address, n, page_size) if more else None
+                yield from items
+
+    def iter_transactions(self, address: str, page_size: int=1000) -> Iterator[str]:
+        '''iterate over txids of <address> (account with the RpcNode), newest first'''
+
+        return self._iter_pages(self._transactions_page, address, page_size)
+
+    def iter_raw_transactions(self, address: str, page_size: int=1000, prefetch: int=100,
+                              executor: concurrent.futures.Executor=None,
+                              ordered: bool=True) -> Iterator[dict]:
+        '''iterate over decoded transactions of <address>, newest first, fetching up to
+        <prefetch> of them ahead (in <executor> if given). With <ordered> False they come
+        as soon as they are fetched. Providers which can return transaction details in
+        bulk override this.'''
+
+        return read_ahead(lambda txid: self.getrawtransaction(txid, 1),
+                          self.iter_transactions(address, page_size), prefetch,
+                          self.max_workers, executor=executor, ordered=ordered)
+
     def validateaddress(self, address: str) -> bool:
         "Returns True if the passed address is valid, False otherwise."
 
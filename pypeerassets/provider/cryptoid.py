@@ -1,14 +1,13 @@
 from decimal import Decimal, getcontext
-from http.client import HTTPResponse
 import json
 from operator import itemgetter
 from typing import Union, cast
-from urllib.request import Request, urlopen
 
 from btcpy.structs.transaction import TxIn, Sequence, ScriptSig
 
 from pypeerassets.exceptions import InsufficientFunds
 from pypeerassets.provider.common import Provider
+from pypeerassets.provider.session import HTTPSession
 
 
 class Cryptoid(Provider):
@@ -19,15 +18,18 @@ class Cryptoid(Provider):
     api_url_fmt = 'https://chainz.cryptoid.info/{net}/api.dws'
     explorer_url = 'https://chainz.cryptoid.info/explorer/'
 
-    def __init__(self, network: str) -> None:
+    def __init__(self, network: str, session: HTTPSession=None) -> None:
         """
         : network = peercoin [ppc], peercoin-testnet [tppc] ...
+        : session = HTTPSession to use instead of the shared default one
         """
 
         self.net = self._netname(network)['short']
         self.api_url = self.api_url_fmt.format(net=self.format_name(self.net))
         if 'ppc' in self.net:
             getcontext().prec = 6  # set to six decimals if it's Peercoin
+        if session is not None:
+            self.http = session
 
     @staticmethod
     def format_name(net: str) -> str:
@@ -40,16 +42,11 @@ class Cryptoid(Provider):
 
         return net
 
-    @staticmethod
-    def get_url(url: str) -> Union[dict, int, float, str]:
+    def get_url(self, url: str) -> Union[dict, int, float, str]:
         '''Perform a GET request for the url and return a dictionary parsed from
         the JSON response.'''
 
-        request = Request(url, headers={"User-Agent": "pypeerassets"})
-        response = cast(HTTPResponse, urlopen(request))
-        if response.status != 200:
-            raise Exception(response.reason)
-        return json.loads(response.read().decode())
+        return json.loads(self.http_get(url).decode())
 
     def api_req(self, query: str) -> dict:
 
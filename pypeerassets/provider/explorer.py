@@ -1,39 +1,42 @@
 from decimal import Decimal
-from http.client import HTTPResponse
 import json
-from typing import Union, cast
-from urllib.request import urlopen
+from typing import Tuple, Union, cast
 
 from btcpy.structs.transaction import ScriptSig, Sequence, TxIn
 
-from pypeerassets.exceptions import InsufficientFunds, UnsupportedNetwork
+from pypeerassets.exceptions import EmptyP2THDirectory, InsufficientFunds, UnsupportedNetwork
 from pypeerassets.provider.common import Provider
+from pypeerassets.provider.session import HTTPSession
 
 
 class Explorer(Provider):
 
     '''API wrapper for https://explorer.peercoin.net blockexplorer.'''
 
-    def __init__(self, network: str) -> None:
+    api_url = 'https://explorer.peercoin.net/api/'
+    ext_url = 'https://explorer.peercoin.net/ext/'
+    testnet_api_url = 'https://testnet-explorer.peercoin.net/api/'
+    testnet_ext_url = 'https://testnet-explorer.peercoin.net/ext/'
+
+    def __init__(self, network: str, session: HTTPSession=None) -> None:
         """
         : network = peercoin [ppc], peercoin-testnet [tppc] ...
+        : session = HTTPSession to use instead of the shared default one
         """
 
         self.net = self._netname(network)['short']
         if 'ppc' not in self.net:
             raise UnsupportedNetwork('This API only supports Peercoin.')
+        if session is not None:
+            self.http = session
 
     def api_fetch(self, command: str) -> Union[dict, int, float, str]:
 
-        apiurl = 'https://explorer.peercoin.net/api/'
+        apiurl = self.api_url
         if self.is_testnet:
-            apiurl = 'https://testnet-explorer.peercoin.net/api/'
-
-        response = cast(HTTPResponse, urlopen(apiurl + command))
-        if response.status != 200:
-            raise Exception(response.reason)
+            apiurl = self.testnet_api_url
 
-        r = response.read()
+        r = self.http_get(apiurl + command)
 
         try:
             return json.loads(r.decode())
@@ -42,18 +45,16 @@ class Explorer(Provider):
 
     def ext_fetch(self, command: str) -> Union[dict, int, float, str]:
 
-        extapiurl = 'https://explorer.peercoin.net/ext/'
+        extapiurl = self.ext_url
         if self.is_testnet:
-            extapiurl = 'https://testnet-explorer.peercoin.net/ext/'
+            extapiurl = self.testnet_ext_url
 
-        response = cast(HTTPResponse, urlopen(extapiurl + command))
-        if response.status != 200:
-            raise Exception(response.reason)
+        r = self.http_get(extapiurl + command)
 
         try:
-            return json.loads(response.read().decode())
+            return json.loads(r.decode())
         except json.decoder.JSONDecodeError:
-            return response.read().decode()
+            return r.decode()
 
     def getdifficulty(self) -> dict:
         '''Returns the current difficulty.'''
@@ -162,3 +163,16 @@ class Explorer(Provider):
             return [i['addresses'] for i in r]
         except KeyError:
             return None
+
+    def getaddresstxs(self, address: str, start: int, length: int) -> list:
+        '''Returns <length> transactions of given address, newest first, skipping <start>.'''
+
+        return cast(list, self.ext_fetch('getaddresstxs/{0}/{1}/{2}'.format(address, start, length)))
+
+    def _transactions_page(self, address: str, page: int, page_size: int) -> Tuple[list, bool]:
+
+        txs = self.getaddresstxs(address, page * page_size, page_size)
+        if not txs and page == 0:
+            raise EmptyP2THDirectory({'error': 'No transactions found on this address.'})
+
+        return [i['txid'] for i in txs], len(txs) == page_size
@@ -0,0 +1,91 @@
+'''Bounded read-ahead stages, for pipelines like list -> fetch -> enrich -> parse.'''
+
+from collections import deque
+import concurrent.futures
+from itertools import islice
+from typing import Callable, Iterable, Iterator, List, Optional
+
+
+def chunked(items: Iterable, size: int) -> Iterator[List]:
+    '''split <items> into lists of <size> items, the last one may be shorter'''
+
+    items = iter(items)
+    while True:
+        chunk = list(islice(items, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def read_ahead(func: Callable, items: Iterable, window: int=100,
+               max_workers: int=8, initial: Optional[int]=None,
+               executor: Optional[concurrent.futures.Executor]=None,
+               ordered: bool=True) -> Iterator:
+    '''yield func(item) for each of <items>, running the calls in a
+    thread pool while the results are being consumed.
+
+    At most <window> calls are pending (running, or done but not consumed yet),
+    <items> are pulled only when there is room, so a slow consumer holds the
+    whole pipeline back instead of piling up results. Past <initial> the window
+    opens up gradually, half as many calls are kept ahead as results were consumed
+    so far, so a consumer which stops early does not leave many calls wasted.
+    : func - stage function, called with a single item
+    : items - iterable, possibly the output of another stage
+    : window - number of calls to keep ahead of the consumer
+    : max_workers - number of threads running the calls
+    : initial - size of the window before any result is consumed, by default
+                one call per worker so I/O stages keep all of them busy from the start
+    : executor - long-lived executor to run the calls in, instead of a new one with <max_workers> threads
+    : ordered - yield results in the order of <items>, otherwise as soon as they are ready
+    '''
+
+    if initial is None:
+        initial = min(window, max_workers)
+
+    if executor is not None:
+        return _read_ahead(func, items, window, initial, executor, ordered)
+
+    return _own_executor(func, items, window, max_workers, initial, ordered)
+
+
+def _own_executor(func: Callable, items: Iterable, window: int, max_workers: int,
+                  initial: int, ordered: bool) -> Iterator:
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, min(window, max_workers))) as th:
+        yield from _read_ahead(func, items, window, initial, th, ordered)
+
+
+def _read_ahead(func: Callable, items: Iterable, window: int, initial: int,
+                executor: concurrent.futures.Executor, ordered: bool) -> Iterator:
+
+    items = iter(items)
+    pending = deque()  # type: deque
+    consumed = 0
+
+    try:
+        while True:
+            while len(pending) < min(window, max(initial, consumed // 2)):
+                try:
+                    item = next(items)
+                except StopIteration:
+                    break
+                pending.append(executor.submit(func, item))
+
+            if not pending:
+                return
+
+            if ordered:
+                future = pending.popleft()
+            else:
+                # oldest of the finished calls, one slow call does not hold up the rest
+                done = concurrent.futures.wait(pending,
+                                               return_when=concurrent.futures.FIRST_COMPLETED).done
+                future = next(f for f in pending if f in done)
+                pending.remove(future)
+
+            yield future.result()
+            consumed += 1
+
+    finally:
+        for future in pending:
+            future.cancel()
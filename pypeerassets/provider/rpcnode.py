@@ -2,6 +2,7 @@
 '''Communicate with local or remote peercoin-daemon via JSON-RPC'''
 
 from operator import itemgetter
+from typing import Tuple
 from .common import Provider
 from pypeerassets.exceptions import InsufficientFunds
 from btcpy.structs.transaction import MutableTxIn, Sequence, ScriptSig
@@ -77,3 +78,9 @@ class RpcNode(Client, Provider):
             return self.req("listunspent", [minconf, maxconf, [address]])
 
         return self.req("listunspent", [minconf, maxconf])
+
+    def _transactions_page(self, account: str, page: int, page_size: int) -> Tuple[list, bool]:
+        '''page through listtransactions of <account> with count/skip'''
+
+        entries = self.listtransactions(account, page_size, page * page_size)
+        return [i["txid"] for i in reversed(entries)], len(entries) == page_size
@@ -0,0 +1,157 @@
+'''Resolution of transaction senders, with a cache of previous output addresses.'''
+
+from collections import OrderedDict
+import concurrent.futures
+import threading
+from typing import Any, Iterable, List, Optional, Tuple
+
+
+class SenderResolver:
+
+    '''Finds the sender (address spent by vin[0]) of transactions.
+
+    Parent transactions of a whole batch are fetched together, using a JSON-RPC
+    batch with the RpcNode and concurrent requests with the http providers.
+    Addresses of all outputs of fetched parents are kept, so parents which come
+    up again (like the issuer sending many card bundles) are not fetched again.'''
+
+    def __init__(self, maxsize: int=2**16, max_workers: int=8, raw: bool=False,
+                 executor: concurrent.futures.Executor=None) -> None:
+        '''
+        : maxsize - number of previous outputs to keep, least recently used ones are dropped first
+        : max_workers - number of concurrent requests to the http providers
+        : raw - fetch parents as raw hex and decode them locally, instead of as verbose JSON
+        : executor - long-lived executor for the http requests, instead of a new one per batch
+        '''
+
+        self.maxsize = maxsize
+        self.max_workers = max_workers
+        self.raw = raw
+        self.executor = executor
+
+        self._lock = threading.Lock()
+        self._prevouts = OrderedDict()  # type: OrderedDict
+        self._stats = {"hits": 0, "misses": 0, "fetched": 0}
+
+    @staticmethod
+    def prevout(raw_tx: dict) -> Tuple[str, int]:
+        '''outpoint spent by vin[0] of <raw_tx>'''
+
+        vin = raw_tx["vin"][0]
+        return (vin["txid"], vin["vout"])
+
+    def add(self, txid: str, n: int, address: str) -> None:
+        '''remember that output <n> of <txid> pays to <address>'''
+
+        with self._lock:
+            self._prevouts[(txid, n)] = address
+            self._prevouts.move_to_end((txid, n))
+            while len(self._prevouts) > self.maxsize:
+                self._prevouts.popitem(last=False)
+
+    def add_tx(self, raw_tx: dict) -> dict:
+        '''remember the addresses of all outputs of <raw_tx>, return them as {n: address}'''
+
+        addresses = {}
+        for n, vout in enumerate(raw_tx["vout"]):
+            if vout["scriptPubKey"].get("addresses"):
+                addresses[n] = vout["scriptPubKey"]["addresses"][0]
+                self.add(raw_tx["txid"], n, addresses[n])
+
+        return addresses
+
+    def cached(self, txid: str, n: int) -> Optional[str]:
+
+        with self._lock:
+            address = self._prevouts.get((txid, n))
+            if address is not None:
+                self._prevouts.move_to_end((txid, n))
+                self._stats["hits"] += 1
+            return address
+
+    def _fetch(self, provider: Any, txids: List[str]) -> List[dict]:
+
+        # local import, rpcnode imports common, which imports this module at load time
+        from pypeerassets.provider.rpcnode import RpcNode
+
+        verbose = 0 if self.raw else 1
+
+        if isinstance(provider.backend, RpcNode):
+            response = provider.batch([('getrawtransaction', [txid, verbose]) for txid in txids])
+            parents = []
+            for r in sorted(response, key=lambda r: r["id"]):
+                if r.get("error"):
+                    raise Exception(r["error"])
+                parents.append(r["result"])
+
+        elif len(txids) == 1:
+            parents = [provider.getrawtransaction(txids[0], verbose)]
+
+        elif self.executor is not None:
+            parents = list(self.executor.map(lambda txid: provider.getrawtransaction(txid, verbose),
+                                             txids))
+
+        else:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers) as th:
+                parents = list(th.map(lambda txid: provider.getrawtransaction(txid, verbose),
+                                      txids))
+
+        if self.raw:
+            parents = [self._decode(provider, p) for p in parents]
+
+        return parents
+
+    @staticmethod
+    def _decode(provider: Any, parent: Any) -> dict:
+
+        # imported here, transactions depends on the provider package
+        from pypeerassets.networks import net_query
+        from pypeerassets.transactions import decode_raw_transaction
+
+        # some apis (blockbook) return JSON no matter what is asked for
+        if isinstance(parent, dict):
+            return parent
+
+        return decode_raw_transaction(parent, net_query(provider.network))
+
+    def resolve(self, provider: Any, raw_txs: Iterable[dict]) -> List[str]:
+        '''return senders of <raw_txs>, fetching all unknown parents at once'''
+
+        prevouts = [self.prevout(tx) for tx in raw_txs]
+        senders = [self.cached(*p) for p in prevouts]
+
+        missing = list(OrderedDict.fromkeys(p[0] for p, s in zip(prevouts, senders)
+                                            if s is None))
+        if missing:
+            with self._lock:
+                self._stats["misses"] += senders.count(None)
+                self._stats["fetched"] += len(missing)
+
+            found = {txid: self.add_tx(parent)
+                     for txid, parent in zip(missing, self._fetch(provider, missing))}
+
+            senders = [s if s is not None else found[p[0]][p[1]]
+                       for p, s in zip(prevouts, senders)]
+
+        return senders
+
+    def sender(self, provider: Any, raw_tx: dict) -> str:
+        '''return sender of a single <raw_tx>'''
+
+        return self.resolve(provider, [raw_tx])[0]
+
+    def stats(self) -> dict:
+
+        with self._lock:
+            stats = dict(self._stats)
+            stats["prevouts"] = len(self._prevouts)
+
+        return stats
+
+    def clear(self) -> None:
+
+        with self._lock:
+            self._prevouts.clear()
+
+
+default_senders = SenderResolver()
@@ -0,0 +1,405 @@
+'''Shared keep-alive HTTP connection pool used by the http API providers.'''
+
+import asyncio
+from base64 import b64encode
+from collections import namedtuple
+from http.client import HTTPConnection, HTTPException, HTTPSConnection
+from queue import Empty, Full, LifoQueue
+from socket import timeout as SocketTimeout
+import threading
+from typing import Optional, Tuple
+from urllib.parse import unquote, urljoin, urlsplit
+from urllib.request import getproxies, proxy_bypass_environment
+
+
+Response = namedtuple('Response', ['status', 'reason', 'body'])
+
+
+class HTTPSession:
+
+    '''Thread-safe pool of persistent HTTP(S) connections.
+
+    Connections are kept alive and handed out per host, so a scan which issues
+    thousands of requests against the same API only pays for a handful of
+    TCP+TLS handshakes. Redirects are followed and proxies are honoured like
+    urllib does, HTTPS through a proxy goes over a CONNECT tunnel.'''
+
+    def __init__(self, maxsize: int=16, timeout: float=30.0,
+                 connect_timeout: Optional[float]=None, proxies: dict=None,
+                 max_redirects: int=10) -> None:
+        '''
+        : maxsize - maximum number of idle connections kept per host, scans keep
+                    Provider.max_workers requests in flight plus a page fetched ahead
+        : timeout - socket read timeout in seconds
+        : connect_timeout - timeout for establishing new connections, defaults to <timeout>
+        : proxies - {scheme: proxy url}, defaults to the HTTP(S)_PROXY and NO_PROXY environment
+        : max_redirects - number of redirects followed for a single request
+        '''
+
+        self.maxsize = maxsize
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout or timeout
+        self.proxies = getproxies() if proxies is None else proxies
+        self.max_redirects = max_redirects
+
+        self._pools = {}  # type: dict
+        self._lock = threading.Lock()
+        self._stats = {"requests": 0,
+                       "connections": 0,
+                       "reused": 0,
+                       "retries": 0,
+                       "discarded": 0}
+
+    def _count(self, key: str) -> None:
+
+        with self._lock:
+            self._stats[key] += 1
+
+    def _pool(self, host: Tuple[str, str, int]) -> LifoQueue:
+        '''get idle connection queue for this host'''
+
+        with self._lock:
+            try:
+                return self._pools[host]
+            except KeyError:
+                self._pools[host] = LifoQueue(maxsize=self.maxsize)
+                return self._pools[host]
+
+    def _proxy(self, host: Tuple[str, str, int]) -> Optional[Tuple[str, int, dict]]:
+        '''proxy hostname, port and headers to reach <host> through, None to connect directly'''
+
+        scheme, hostname, port = host
+        proxy = self.proxies.get(scheme)
+        if not proxy or proxy_bypass_environment(hostname, self.proxies):
+            return None
+
+        if '://' not in proxy:
+            proxy = 'http://' + proxy
+        parts = urlsplit(proxy)
+
+        headers = {}
+        if parts.username is not None:
+            credentials = '{0}:{1}'.format(unquote(parts.username), unquote(parts.password or ''))
+            headers['Proxy-Authorization'] = 'Basic ' + b64encode(credentials.encode()).decode()
+
+        return parts.hostname, parts.port or 80, headers
+
+    def _new_connection(self, host: Tuple[str, str, int]) -> HTTPConnection:
+
+        scheme, hostname, port = host
+        proxy = self._proxy(host)
+
+        if proxy is not None and scheme == 'https':
+            conn = HTTPSConnection(proxy[0], proxy[1], timeout=self.connect_timeout)  # type: HTTPConnection
+            conn.set_tunnel(hostname, port, headers=proxy[2])
+        elif proxy is not None:
+            conn = HTTPConnection(proxy[0], proxy[1], timeout=self.connect_timeout)
+        elif scheme == 'https':
+            conn = HTTPSConnection(hostname, port, timeout=self.connect_timeout)
+        else:
+            conn = HTTPConnection(hostname, port, timeout=self.connect_timeout)
+
+        conn.connect()
+        conn.sock.settimeout(self.timeout)
+        self._count("connections")
+
+        return conn
+
+    def _release(self, host: Tuple[str, str, int], conn: HTTPConnection) -> None:
+        '''return connection to the pool, or close it if the pool is full'''
+
+        try:
+            self._pool(host).put_nowait(conn)
+        except Full:
+            conn.close()
+            self._count("discarded")
+
+    def request(self, method: str, url: str, body: bytes=None,
+                headers: dict=None) -> Response:
+        '''perform a request over a pooled connection and read the whole response,
+        following redirects.'''
+
+        for redirect in range(self.max_redirects + 1):
+
+            response, location = self._request(method, url, body, headers)
+            if location is None:
+                return response
+
+            url = urljoin(url, location)
+            # like browsers and urllib, see other and POST redirects continue as GET
+            if response.status == 303 or (response.status in (301, 302) and method == 'POST'):
+                method, body = 'GET', None
+
+        raise ConnectionError('Too many redirects, last to {0}'.format(url))
+
+    def _request(self, method: str, url: str, body: Optional[bytes],
+                 headers: Optional[dict]) -> Tuple[Response, Optional[str]]:
+        '''single request and the location it redirects to, if any'''
+
+        parts = urlsplit(url)
+        default_port = 443 if parts.scheme == 'https' else 80
+        host = (parts.scheme, parts.hostname, parts.port or default_port)
+        path = parts.path or '/'
+        if parts.query:
+            path += '?' + parts.query
+
+        headers = dict(headers or {})
+        if parts.scheme == 'http':
+            proxy = self._proxy(host)
+            if proxy is not None:
+                # plain http proxies take the absolute url
+                path = '{0}://{1}{2}'.format(parts.scheme, parts.netloc, path)
+                headers.update(proxy[2])
+
+        self._count("requests")
+
+        # a pooled connection may have been closed by the server in the meantime,
+        # in which case it is safe to retry once on a fresh connection.
+        for attempt in range(2):
+
+            conn = None
+            if not attempt:
+                try:
+                    conn = self._pool(host).get_nowait()
+                except Empty:
+                    pass
+
+            reused = conn is not None
+            if conn is None:
+                conn = self._new_connection(host)
+
+            try:
+                conn.request(method, path, body=body, headers=headers)
+                response = conn.getresponse()
+                data = response.read()
+            except SocketTimeout:
+                conn.close()
+                raise
+            except (HTTPException, OSError):
+                conn.close()
+                if reused:
+                    self._count("retries")
+                    continue
+                raise
+            except Exception:
+                conn.close()
+                raise
+
+            if reused:
+                self._count("reused")
+
+            if response.will_close:
+                conn.close()
+            else:
+                self._release(host, conn)
+
+            location = None
+            if response.status in (301, 302, 303, 307, 308):
+                location = response.getheader('Location')
+
+            return Response(response.status, response.reason, data), location
+
+        raise ConnectionError('Unable to reach {0}'.format(parts.hostname))
+
+    def get(self, url: str, headers: dict=None) -> Response:
+
+        return self.request('GET', url, headers=headers)
+
+    def stats(self) -> dict:
+        '''pool statistics, including the number of idle connections per host'''
+
+        with self._lock:
+            stats = dict(self._stats)
+            stats["idle"] = {'{0}://{1}:{2}'.format(*host): pool.qsize()
+                             for host, pool in self._pools.items()}
+
+        return stats
+
+    def close(self) -> None:
+        '''close all idle connections'''
+
+        with self._lock:
+            pools = list(self._pools.values())
+            self._pools = {}
+
+        for pool in pools:
+            while True:
+                try:
+                    pool.get_nowait().close()
+                except Empty:
+                    break
+
+
+class AsyncHTTPSession:
+
+    '''asyncio counterpart of HTTPSession.
+
+    Keeps a pool of idle keep-alive connections per host and allows up to
+    <limit> concurrent requests per host, each on it's own connection.'''
+
+    def __init__(self, maxsize: int=100, limit: int=100, timeout: float=30.0,
+                 connect_timeout: Optional[float]=None) -> None:
+        '''
+        : maxsize - maximum number of idle connections kept per host
+        : limit - maximum number of requests in flight per host
+        : timeout - timeout for a single request in seconds
+        : connect_timeout - timeout for establishing new connections, defaults to <timeout>
+        '''
+
+        self.maxsize = maxsize
+        self.limit = limit
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout or timeout
+
+        self._pools = {}  # type: dict
+        self._limits = {}  # type: dict
+        self._stats = {"requests": 0,
+                       "connections": 0,
+                       "reused": 0,
+                       "retries": 0,
+                       "discarded": 0}
+
+    async def _connect(self, host: Tuple[str, str, int]) -> tuple:
+
+        scheme, hostname, port = host
+        conn = await asyncio.wait_for(
+            asyncio.open_connection(hostname, port, ssl=(scheme == 'https') or None),
+            self.connect_timeout)
+        self._stats["connections"] += 1
+
+        return conn
+
+    def _release(self, host: Tuple[str, str, int], conn: tuple) -> None:
+
+        pool = self._pools.setdefault(host, [])
+        if len(pool) < self.maxsize:
+            pool.append(conn)
+        else:
+            conn[1].close()
+            self._stats["discarded"] += 1
+
+    @staticmethod
+    async def _read_response(reader: asyncio.StreamReader) -> tuple:
+        '''read status line, headers and body of a HTTP/1.1 response'''
+
+        status_line = await reader.readline()
+        if not status_line:
+            raise ConnectionResetError('Connection closed by the remote host.')
+
+        version, status, reason = (status_line.decode('latin-1').rstrip('\r\n') + ' ').split(' ', 2)
+
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            key, value = line.decode('latin-1').split(':', 1)
+            headers[key.strip().lower()] = value.strip()
+
+        will_close = (headers.get('connection', '').lower() == 'close' or
+                      version == 'HTTP/1.0')
+
+        if headers.get('transfer-encoding', '').lower() == 'chunked':
+            body = bytearray()
+            while True:
+                size = int((await reader.readline()).split(b';')[0].strip(), 16)
+                if not size:
+                    while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                        pass  # skip trailers
+                    break
+                body += await reader.readexactly(size)
+                await reader.readline()
+        elif 'content-length' in headers:
+            body = await reader.readexactly(int(headers['content-length']))
+        else:
+            body = await reader.read()
+            will_close = True
+
+        return int(status), reason.strip(), bytes(body), will_close
+
+    async def _request(self, conn: tuple, payload: bytes) -> tuple:
+
+        reader, writer = conn
+        writer.write(payload)
+        await writer.drain()
+
+        return await asyncio.wait_for(self._read_response(reader), self.timeout)
+
+    async def request(self, method: str, url: str, body: bytes=None,
+                      headers: dict=None) -> Response:
+        '''perform a request over a pooled connection and read the whole response.'''
+
+        parts = urlsplit(url)
+        default_port = 443 if parts.scheme == 'https' else 80
+        host = (parts.scheme, parts.hostname, parts.port or default_port)
+        path = parts.path or '/'
+        if parts.query:
+            path += '?' + parts.query
+
+        head = ['{0} {1} HTTP/1.1'.format(method, path),
+                'Host: {0}'.format(parts.netloc),
+                'Content-Length: {0}'.format(len(body or b''))]
+        head += ['{0}: {1}'.format(k, v) for k, v in (headers or {}).items()]
+        payload = ('\r\n'.join(head) + '\r\n\r\n').encode('latin-1') + (body or b'')
+
+        if host not in self._limits:
+            self._limits[host] = asyncio.Semaphore(self.limit)
+
+        self._stats["requests"] += 1
+
+        async with self._limits[host]:
+
+            # a pooled connection may have been closed by the server in the meantime,
+            # in which case it is safe to retry once on a fresh connection.
+            for attempt in range(2):
+
+                pool = self._pools.get(host)
+                reused = bool(pool) and not attempt
+                conn = pool.pop() if reused else await self._connect(host)
+
+                try:
+                    status, reason, data, will_close = await self._request(conn, payload)
+                except asyncio.TimeoutError:
+                    conn[1].close()
+                    raise
+                except (asyncio.IncompleteReadError, OSError, ValueError):
+                    conn[1].close()
+                    if reused:
+                        self._stats["retries"] += 1
+                        continue
+                    raise
+
+                if reused:
+                    self._stats["reused"] += 1
+
+                if will_close:
+                    conn[1].close()
+                else:
+                    self._release(host, conn)
+
+                return Response(status, reason, data)
+
+        raise ConnectionError('Unable to reach {0}'.format(parts.hostname))
+
+    async def get(self, url: str, headers: dict=None) -> Response:
+
+        return await self.request('GET', url, headers=headers)
+
+    def stats(self) -> dict:
+        '''pool statistics, including the number of idle connections per host'''
+
+        stats = dict(self._stats)
+        stats["idle"] = {'{0}://{1}:{2}'.format(*host): len(pool)
+                         for host, pool in self._pools.items()}
+        return stats
+
+    async def close(self) -> None:
+        '''close all idle connections'''
+
+        pools, self._pools = self._pools, {}
+        for pool in pools.values():
+            for reader, writer in pool:
+                writer.close()
+
+
+default_session = HTTPSession()
@@ -0,0 +1,307 @@
+'''Single pass block scanner, finds deck spawns and card bundles of all decks at once.'''
+
+import concurrent.futures
+from glob import glob
+from hashlib import sha256
+import mmap
+from operator import itemgetter
+import os
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from pypeerassets.networks import net_query
+from pypeerassets.pa_constants import param_query
+from pypeerassets.pautils import deck_parser, stream_batches
+from pypeerassets.protocol import CardBundle, Deck
+from pypeerassets.provider import Provider, RpcNode
+from pypeerassets.transactions import BlockView, TxView, decode_raw_transaction
+
+
+class ProviderBlockSource:
+
+    '''Reads blocks and their decoded transactions from a Provider.'''
+
+    def __init__(self, provider: Provider, max_workers: int=None, raw: bool=False,
+                 executor: concurrent.futures.Executor=None) -> None:
+        '''
+        : provider - Provider instance
+        : max_workers - number of concurrent requests to the http providers, provider.max_workers by default
+        : raw - fetch transactions as raw hex and decode them locally, instead of as verbose JSON
+        : executor - long-lived executor for the http requests, instead of a new one per block
+        '''
+
+        self.provider = provider
+        self.max_workers = max_workers or provider.max_workers
+        self.raw = raw
+        self.executor = executor
+
+    def _transactions(self, txids: List[str]) -> List[dict]:
+
+        provider = self.provider
+        verbose = 0 if self.raw else 1
+
+        if isinstance(provider.backend, RpcNode):
+            txs = [r["result"] for batch in
+                   stream_batches(provider, (('getrawtransaction', [txid, verbose])
+                                             for txid in txids), executor=self.executor)
+                   for r in batch]
+        elif self.executor is not None:
+            txs = list(self.executor.map(lambda txid: provider.getrawtransaction(txid, verbose),
+                                         txids))
+        else:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers) as th:
+                txs = list(th.map(lambda txid: provider.getrawtransaction(txid, verbose), txids))
+
+        if self.raw:
+            network = net_query(provider.network)
+            txs = [tx if isinstance(tx, dict) else decode_raw_transaction(tx, network)
+                   for tx in txs]
+
+        return txs
+
+    @property
+    def height(self) -> int:
+        '''height of the best block'''
+
+        return self.provider.getblockcount()
+
+    def blocks(self, start: int, end: int) -> Iterator[Tuple[int, str, List[dict]]]:
+        '''yield (height, blockhash, transactions) of blocks <start> to <end>'''
+
+        for height in range(start, end + 1):
+            blockhash = self.provider.getblockhash(height)
+            block = self.provider.getblock(blockhash)
+            self.provider.blockmeta.add(blockhash, block)
+
+            txs = self._transactions(block["tx"])
+            if self.raw:
+                for tx in txs:
+                    tx.update(blockhash=blockhash, blocktime=block["time"],
+                              confirmations=block["confirmations"])
+
+            yield height, blockhash, txs
+
+
+class BlockFileSource:
+
+    '''Reads blocks straight from the blk*.dat files of a local peercoind,
+    instead of having the node serialize every one of them to JSON.
+
+    Files are memory-mapped and indexed by block header on first use, the best
+    chain is the longest one linked back to the genesis block. Transactions are
+    TxViews into the block bytes, decoded only as far as they are used. Stop the node,
+    or use a copy of its blocks directory, while reading.'''
+
+    def __init__(self, path: str, network: str='peercoin') -> None:
+        '''
+        : path - blocks directory of the node, or the data directory holding it
+        : network - network the files belong to
+        '''
+
+        if os.path.isdir(os.path.join(path, 'blocks')):
+            path = os.path.join(path, 'blocks')
+
+        self.path = path
+        self.network = net_query(network)
+
+        self._maps = []  # type: List[mmap.mmap]
+        self._files = []  # type: list
+        self._chain = None  # type: Optional[List[str]]
+        self._records = {}  # type: Dict[str, Tuple[int, int, int]]
+
+    @staticmethod
+    def _hash(data: bytes) -> str:
+
+        return sha256(sha256(data).digest()).digest()[::-1].hex()
+
+    def _records_of(self, n: int) -> Iterator[Tuple[int, int]]:
+        '''yield (offset, size) of the blocks in file <n>, skipping
+        over the zero padding the node preallocates files with.'''
+
+        mm = self._maps[n]
+        magic = self.network.netmagic
+
+        pos = mm.find(magic)
+        while 0 <= pos and pos + 8 <= len(mm):
+            size = int.from_bytes(mm[pos + 4:pos + 8], 'little')
+            if pos + 8 + size > len(mm):
+                return  # block is still being written
+            yield pos + 8, size
+            pos = mm.find(magic, pos + 8 + size)
+
+    def index(self) -> int:
+        '''map the blk*.dat files and find the best chain, returns its height'''
+
+        self.close()
+
+        prevs = {}  # type: Dict[str, str]
+        for n, name in enumerate(sorted(glob(os.path.join(self.path, 'blk*.dat')))):
+            f = open(name, 'rb')
+            self._files.append(f)
+            self._maps.append(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+
+            for offset, size in self._records_of(n):
+                header = self._maps[n][offset:offset + 80]
+                blockhash = self._hash(header)
+                self._records[blockhash] = (n, offset, size)
+                prevs[blockhash] = header[4:36][::-1].hex()
+
+        # blocks are stored in the order they arrived, derive heights from the links
+        children = {}  # type: Dict[str, List[str]]
+        for blockhash, prev in prevs.items():
+            children.setdefault(prev, []).append(blockhash)
+
+        heights = {}
+        todo = list(children.get('00' * 32, []))
+        for blockhash in todo:
+            heights[blockhash] = heights.get(prevs[blockhash], -1) + 1
+            todo.extend(children.get(blockhash, []))
+
+        chain = []  # type: List[str]
+        if heights:
+            tip = max(heights, key=heights.get)  # first seen wins a tie
+            chain = [tip]
+            while prevs[chain[-1]] in heights:
+                chain.append(prevs[chain[-1]])
+            chain.reverse()
+
+        self._chain = chain
+        return self.height
+
+    @property
+    def height(self) -> int:
+        '''height of the best block in the files'''
+
+        if self._chain is None:
+            self.index()
+
+        return len(self._chain) - 1
+
+    def block(self, height: int) -> Tuple[str, List[dict]]:
+        '''return (blockhash, transactions) of the block at <height>'''
+
+        if self._chain is None:
+            self.index()
+
+        blockhash = self._chain[height]
+        n, offset, size = self._records[blockhash]
+
+        # one copy of the block out of the file, transactions are views into it
+        block = BlockView(self._maps[n][offset:offset + size], self.network,
+                          meta={"confirmations": len(self._chain) - height})
+
+        return blockhash, block.txs
+
+    def blocks(self, start: int, end: int) -> Iterator[Tuple[int, str, List[dict]]]:
+        '''yield (height, blockhash, transactions) of blocks <start> to <end>'''
+
+        for height in range(start, min(end, self.height) + 1):
+            yield (height,) + self.block(height)
+
+    def close(self) -> None:
+
+        for mm in self._maps:
+            mm.close()
+        for f in self._files:
+            f.close()
+
+        self._maps, self._files = [], []
+        self._chain, self._records = None, {}
+
+
+class BlockScanner:
+
+    '''Walks the chain block by block, matching vout[0] of every transaction
+    against the P2TH addresses of all known decks and the deck spawn P2TH.
+
+    Deck spawns found on the way are watched from then on, so a single pass
+    indexes every deck, instead of listing the P2TH directory of each one.'''
+
+    def __init__(self, provider: Provider, decks: Iterable[Deck]=(),
+                 prod: bool=True, deck_version: int=1, source: object=None) -> None:
+        '''
+        : provider - Provider instance, used to resolve senders
+        : decks - decks which are known already
+        : prod - production or test deck spawn P2TH
+        : deck_version - deck protocol version
+        : source - block source, ProviderBlockSource of <provider> if not given
+        '''
+
+        self.provider = provider
+        self.prod = prod
+        self.deck_version = deck_version
+        self.source = source or ProviderBlockSource(provider)
+
+        pa_params = param_query(provider.network)
+        self.p2th = pa_params.P2TH_addr if prod else pa_params.test_P2TH_addr
+
+        self.decks = {}  # type: dict
+        for deck in decks:
+            self.add_deck(deck)
+
+    def add_deck(self, deck: Deck) -> None:
+        '''watch <deck> for card bundles'''
+
+        self.decks[deck.p2th_address] = deck
+
+    @staticmethod
+    def _p2th(raw_tx: dict) -> Optional[str]:
+
+        if isinstance(raw_tx, TxView):
+            return raw_tx.p2th  # other outputs stay undecoded
+
+        try:
+            return raw_tx["vout"][0]["scriptPubKey"]["addresses"][0]
+        except (IndexError, KeyError):
+            return None
+
+    def scan(self, start: int, end: int=None) -> Iterator[Union[Deck, CardBundle]]:
+        '''yield deck spawns (Deck) and card bundles (CardBundle) of blocks <start> to <end>,
+        in the order they are in the chain. <end> defaults to the height of the source.'''
+
+        if end is None:
+            end = self.source.height
+
+        for height, blockhash, txs in self.source.blocks(start, end):
+
+            outputs = [(n, self._p2th(tx), tx) for n, tx in enumerate(txs)]
+
+            # register the decks spawned in this block first, cards of the block may belong to them
+            spawned = {}  # type: Dict[int, Deck]
+            spawns = [(n, tx) for n, p2th, tx in outputs if p2th == self.p2th]
+            if spawns:
+                if self.provider.blockmeta.cached(blockhash) is None:
+                    # blocks read from files are not known to the provider, deck_parser
+                    # finds the block height of the deck spawns here
+                    self.provider.blockmeta.add(blockhash, {"height": height,
+                                                            "tx": [tx["txid"] for tx in txs]})
+                self.provider.senders.resolve(self.provider, [tx for n, tx in spawns
+                                                              if "txid" in tx["vin"][0]])
+                for blockseq, tx in spawns:
+                    deck = deck_parser((self.provider, tx, self.deck_version, self.p2th),
+                                       self.prod)
+                    if deck:
+                        self.add_deck(deck)
+                        spawned[blockseq] = deck
+
+            matched = [(n, p2th, tx) for n, p2th, tx in outputs if p2th in self.decks]
+            if matched:
+                self.provider.senders.resolve(self.provider, [tx for n, p2th, tx in matched
+                                                              if "txid" in tx["vin"][0]])
+
+            found = [(n, self._bundle(height, blockhash, n, p2th, tx)) for n, p2th, tx in matched]
+            for blockseq, item in sorted(found + list(spawned.items()), key=itemgetter(0)):
+                yield item
+
+    def _bundle(self, height: int, blockhash: str, blockseq: int, p2th: str,
+                tx: dict) -> CardBundle:
+
+        return CardBundle(deck=self.decks[p2th],
+                          blockhash=blockhash,
+                          txid=tx['txid'],
+                          timestamp=tx['time'],
+                          blockseq=blockseq,
+                          blocknum=height,
+                          sender=self.provider.senders.sender(self.provider, tx),
+                          vouts=tx['vout'],
+                          tx_confirmations=tx.get('confirmations', 0)
+                          )
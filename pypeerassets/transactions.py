@@ -1,9 +1,14 @@
 '''transaction assembly/dissasembly'''
 
+from collections.abc import Mapping
 from decimal import Decimal
+from functools import lru_cache
+from hashlib import new as hashlib_new, sha256
 from math import ceil
 from time import time
+from typing import Any, Iterator, List, Optional, Tuple, Union
 
+from btcpy.lib.base58 import b58encode_check
 from btcpy.lib.parsing import Parser, TransactionParser as BtcPyTxParser
 from btcpy.lib.types import Mutable, cached
 from btcpy.structs.address import Address
@@ -29,7 +34,7 @@ from btcpy.structs.transaction import (
 )
 
 from pypeerassets.kutil import Kutil
-from pypeerassets.networks import PeercoinMainnet, net_query
+from pypeerassets.networks import Constants, PeercoinMainnet, net_query
 from pypeerassets.provider import Provider
 
 
@@ -211,6 +216,303 @@ class TransactionParser(BtcPyTxParser):
         return result.to_mutable() if mutable else result
 
 
+# btcpy script type names as peercoind reports them
+script_types = {
+    'p2pkh': 'pubkeyhash',
+    'p2sh': 'scripthash',
+    'p2pk': 'pubkey',
+    'p2ms': 'multisig',
+    'nulldata': 'nulldata',
+    'p2wpkh': 'witness_v0_keyhash',
+    'p2wsh': 'witness_v0_scripthash',
+}
+
+
+def tx_to_rawtx(tx: Transaction) -> dict:
+    '''decoded <tx> in the shape of peercoind getrawtransaction(txid, 1),
+    without the block related keys (blockhash, blocktime, confirmations)'''
+
+    raw = tx.to_json()
+    raw["time"] = raw.pop("timestamp")
+
+    for vout in raw["vout"]:
+        vout["value"] = float(vout["value"])
+        spk = vout["scriptPubKey"]
+        spk["type"] = script_types.get(spk["type"], spk["type"])
+        if "address" in spk:
+            spk["addresses"] = [spk.pop("address")]
+            spk["reqSigs"] = 1
+
+    return raw
+
+
+def read_varint(buf: memoryview, pos: int) -> Tuple[int, int]:
+    '''read varint at <pos> of <buf>, return (value, position after it)'''
+
+    header = buf[pos]
+    if header < 0xfd:
+        return header, pos + 1
+
+    size = {0xfd: 2, 0xfe: 4, 0xff: 8}[header]
+    return int.from_bytes(buf[pos + 1:pos + 1 + size], 'little'), pos + 1 + size
+
+
+def read_nulldata(script: bytes) -> bytes:
+    '''return the data pushed right after OP_RETURN in <script>'''
+
+    data = script[1:2 + 4]
+    if not data:
+        return b''
+
+    op = data[0]
+    if op <= 0x4b:
+        start, size = 1, op
+    elif op == 0x4c:
+        start, size = 2, int.from_bytes(data[1:2], 'little')
+    elif op == 0x4d:
+        start, size = 3, int.from_bytes(data[1:3], 'little')
+    elif op == 0x4e:
+        start, size = 5, int.from_bytes(data[1:5], 'little')
+    else:
+        return b''
+
+    return bytes(script[1 + start:1 + start + size])
+
+
+@lru_cache(maxsize=4096)
+def _address(prefix: bytes, h160: bytes) -> str:
+
+    # P2TH and frequent receivers come up over and over, base58 is slow
+    return b58encode_check(prefix + h160)
+
+
+def script_address(script: bytes, network: Constants) -> Optional[str]:
+    '''address <script> pays to, for p2pkh, p2sh and p2pk scripts.
+    peercoind lists pay-to-pubkey outputs under the address of the key.'''
+
+    size = len(script)
+    prefixes = network.base58_raw_prefixes
+
+    if size == 25 and script[:3] == b'\x76\xa9\x14' and script[23:] == b'\x88\xac':
+        return _address(bytes(prefixes['p2pkh']), bytes(script[3:23]))
+
+    if size == 23 and script[:2] == b'\xa9\x14' and script[22] == 0x87:
+        return _address(bytes(prefixes['p2sh']), bytes(script[2:22]))
+
+    if size in (35, 67) and script[0] == size - 2 and script[-1] == 0xac:
+        h160 = hashlib_new('ripemd160', sha256(script[1:-1]).digest()).digest()
+        return _address(bytes(prefixes['p2pkh']), h160)
+
+    return None
+
+
+def script_pubkey(script: bytes, network: Constants) -> dict:
+    '''decode <script> into the scriptPubKey structure of getrawtransaction(txid, 1)'''
+
+    spk = {"hex": script.hex()}  # type: dict
+    address = script_address(script, network)
+
+    if address is not None:
+        spk["type"] = {25: "pubkeyhash", 23: "scripthash"}.get(len(script), "pubkey")
+        spk["reqSigs"] = 1
+        spk["addresses"] = [address]
+
+    elif len(script) and script[0] == 0x6a:
+        spk["type"] = "nulldata"
+        spk["asm"] = "OP_RETURN " + read_nulldata(script).hex()
+
+    else:
+        spk["type"] = "nonstandard"
+
+    return spk
+
+
+class TxView(Mapping):
+
+    '''Read-only view of a serialized transaction, without copying it out of <buf>.
+
+    Only the framing (where inputs and outputs start and end) is parsed up front,
+    scripts are decoded when they are first accessed. The view is a mapping in the
+    shape of peercoind getrawtransaction(txid, 1), with only the keys used by
+    pypeerassets; block related keys (blockhash, blocktime, confirmations) are
+    taken from <meta>.'''
+
+    fields = ('txid', 'size', 'version', 'time', 'locktime', 'vin', 'vout')
+
+    def __init__(self, buf: Union[bytes, memoryview], network: Constants=PeercoinMainnet,
+                 offset: int=0, meta: dict=None) -> None:
+        '''
+        : buf - serialized transaction, or a block or a file holding it
+        : network - network parameters, used to make addresses
+        : offset - position of the transaction in <buf>
+        : meta - additional keys
+        '''
+
+        buf = memoryview(buf)
+        pos = offset
+
+        self.network = network
+        self.meta = meta or {}
+
+        self.version = int.from_bytes(buf[pos:pos + 4], 'little')
+        pos += 4
+        self.time = 0
+        if network.tx_timestamp:
+            self.time = int.from_bytes(buf[pos:pos + 4], 'little')
+            pos += 4
+
+        count, pos = read_varint(buf, pos)
+        if not count:
+            raise Exception('Peercoin does not currently support SegWit.')
+
+        self._ins = []  # (outpoint, script start, script end)
+        for i in range(count):
+            outpoint = pos
+            size, pos = read_varint(buf, pos + 36)
+            pos += size + 4
+            self._ins.append((outpoint, pos - size - 4, pos - 4))
+
+        count, pos = read_varint(buf, pos)
+        self._outs = []  # (value, script start, script end)
+        for i in range(count):
+            value = int.from_bytes(buf[pos:pos + 8], 'little')
+            size, pos = read_varint(buf, pos + 8)
+            pos += size
+            self._outs.append((value, pos - size, pos))
+
+        self.locktime = int.from_bytes(buf[pos:pos + 4], 'little')
+        pos += 4
+
+        self.size = pos - offset
+        self._buf = buf
+        self._offset = offset
+        self._txid = None  # type: Optional[str]
+        self._vin = None  # type: Optional[list]
+        self._vout = None  # type: Optional[list]
+
+    @property
+    def txid(self) -> str:
+
+        if self._txid is None:
+            data = self._buf[self._offset:self._offset + self.size]
+            self._txid = sha256(sha256(data).digest()).digest()[::-1].hex()
+        return self._txid
+
+    def script(self, n: int) -> memoryview:
+        '''scriptPubKey of output <n>'''
+
+        value, start, end = self._outs[n]
+        return self._buf[start:end]
+
+    @property
+    def p2th(self) -> Optional[str]:
+        '''address vout[0] pays to, without decoding the other outputs'''
+
+        if not self._outs:
+            return None
+        return script_address(self.script(0), self.network)
+
+    @property
+    def vin(self) -> list:
+
+        if self._vin is None:
+            buf, vin = self._buf, []
+            for outpoint, start, end in self._ins:
+                txid = bytes(buf[outpoint:outpoint + 32])[::-1].hex()
+                n = int.from_bytes(buf[outpoint + 32:outpoint + 36], 'little')
+                sequence = int.from_bytes(buf[end:end + 4], 'little')
+
+                if txid == '0' * 64 and n == 0xffffffff:
+                    vin.append({"coinbase": buf[start:end].hex(), "sequence": sequence})
+                else:
+                    vin.append({"txid": txid, "vout": n,
+                                "scriptSig": {"hex": buf[start:end].hex()},
+                                "sequence": sequence})
+            self._vin = vin
+
+        return self._vin
+
+    @property
+    def vout(self) -> list:
+
+        if self._vout is None:
+            to_unit = float(self.network.to_unit)
+            self._vout = [{"value": value / to_unit, "n": n,
+                           "scriptPubKey": script_pubkey(self._buf[start:end], self.network)}
+                          for n, (value, start, end) in enumerate(self._outs)]
+
+        return self._vout
+
+    def __getitem__(self, key: str) -> Any:
+
+        if key in self.meta:
+            return self.meta[key]
+        if key in self.fields:
+            return getattr(self, key)
+        raise KeyError(key)
+
+    def __iter__(self) -> Iterator[str]:
+
+        yield from self.fields
+        yield from (k for k in self.meta if k not in self.fields)
+
+    def __len__(self) -> int:
+
+        return len(set(self.fields) | set(self.meta))
+
+    def __repr__(self) -> str:
+
+        return 'TxView(txid={})'.format(self.txid)
+
+
+class BlockView:
+
+    '''Read-only view of a serialized Peercoin block, deserialized into a list of TxViews
+    which share the buffer of the block. The transactions carry blockhash and blocktime.'''
+
+    def __init__(self, buf: Union[bytes, memoryview], network: Constants=PeercoinMainnet,
+                 meta: dict=None) -> None:
+        '''
+        : buf - serialized block
+        : network - network parameters
+        : meta - additional keys for the transactions, like confirmations
+        '''
+
+        buf = memoryview(buf)
+
+        header = buf[:80]
+        self.hash = sha256(sha256(header).digest()).digest()[::-1].hex()
+        self.version = int.from_bytes(header[:4], 'little')
+        self.previousblockhash = bytes(header[4:36])[::-1].hex()
+        self.time = int.from_bytes(header[68:72], 'little')
+
+        meta = dict(meta or {}, blockhash=self.hash, blocktime=self.time)
+
+        count, pos = read_varint(buf, 80)
+        self.txs = []  # type: List[TxView]
+        for i in range(count):
+            tx = TxView(buf, network, pos, meta)
+            pos += tx.size
+            self.txs.append(tx)
+
+        # rest of the block is the signature of proof-of-stake blocks
+        self.size = len(buf)
+
+
+def decode_raw_transaction(raw: Union[str, bytes], network: Constants=PeercoinMainnet) -> dict:
+    '''decode serialized transaction <raw> (hex string or bytes) locally,
+    see TxView for the structure it returns'''
+
+    if isinstance(raw, str):
+        raw = bytes.fromhex(raw)
+
+    tx = TxView(raw, network)
+    if tx.size != len(raw):
+        raise ValueError('Leftover data after transaction')
+
+    return dict(tx)
+
+
 def calculate_tx_fee(tx_size: int) -> Decimal:
     '''return tx fee from tx size in bytes'''
 
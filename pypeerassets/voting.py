@@ -1,7 +1,8 @@
+from binascii import unhexlify
 import warnings
 from typing import Iterable, List
 
-from pypeerassets.kutil import Kutil
+from pypeerassets.kutil import keycache
 from pypeerassets.protocol import Deck
 from pypeerassets.provider import Provider
 from pypeerassets import pavoteproto_pb2 as pavoteproto
@@ -18,8 +19,7 @@ def deck_vote_tag(deck: Deck) -> str:
         raise Exception("deck.id is required")
 
     deck_vote_tag_privkey = sha256(unhexlify(deck.id) + b"vote_init").hexdigest()
-    deck_vote_tag_address = Kutil(network=deck.network, privkey=bytearray.fromhex(deck_vote_tag_privkey))
-    return deck_vote_tag_address.address
+    return keycache.get(deck.network, bytes.fromhex(deck_vote_tag_privkey)).address
 
 
 class Vote:
@@ -92,8 +92,8 @@ class Vote:
             vote_cast_privkey = sha256(vote_init_txid + bytes(
                                     list(self.choices).index(choice))
                                     ).hexdigest()
-            addresses.append(Kutil(network=self.deck.network,
-                                   privkey=bytearray.fromhex(vote_cast_privkey)).address)
+            addresses.append(keycache.get(self.deck.network,
+                                          bytes.fromhex(vote_cast_privkey)).address)
 
         return addresses
 
@@ -9,5 +9,7 @@ setup(name='pypeerassets',
       author_email='peerchemist@protonmail.ch',
       license='BSD',
       packages=['pypeerassets', 'pypeerassets.provider'],
-      install_requires=['protobuf', 'peerassets-btcpy', 'peercoin_rpc']
+      python_requires='>=3.6',  # asynchronous generators of pypeerassets.aio
+      install_requires=['protobuf', 'peerassets-btcpy', 'peercoin_rpc'],
+      extras_require={'fast': ['coincurve']}
       )
@@ -0,0 +1,446 @@
+'''Synthetic Peercoin testnet chain and a local stand-in for the remote APIs,
+shared by the tests that must not depend on the public block explorers.'''
+
+import json
+import threading
+from decimal import Decimal
+from hashlib import sha256
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from urllib.parse import parse_qs, urlsplit
+
+import pytest
+
+from btcpy.structs.transaction import Locktime, ScriptSig, Sequence, TxIn
+
+from pypeerassets.kutil import Kutil
+from pypeerassets.pa_constants import param_query
+from pypeerassets.protocol import CardTransfer, Deck, IssueMode
+from pypeerassets.provider import Provider, RpcNode
+from pypeerassets.transactions import (make_raw_transaction, nulldata_script,
+                                       p2pkh_script, tx_output)
+
+
+class RpcError(Exception):
+    '''raised by FakeChain methods to make the stand-in node reply with an error'''
+
+
+class FakeChain:
+
+    '''Minimal in-memory blockchain producing real, serializable Peercoin
+    transactions with PeerAssets deck spawns and card transfers.'''
+
+    network = 'peercoin-testnet'
+    genesis_time = 1500000000
+
+    def __init__(self) -> None:
+
+        self.txs = {}  # txid -> Transaction
+        self.tagged = {}  # vout[0] address -> [txid, ...]
+        self.tx_block = {}  # txid -> blockhash
+        self.blocks = []  # list of block dicts, index is height
+        self.mempool = []
+        self.calls = []  # record of (method, key) provider calls
+        self.wallet = {}  # imported address -> label
+        self.p2th = param_query(self.network).P2TH_addr
+        self._nonce = 0
+        self.mine()  # genesis
+
+    def _time(self) -> int:
+
+        self._nonce += 1
+        return self.genesis_time + self._nonce
+
+    def _add(self, ins: list, outs: list) -> str:
+
+        tx = make_raw_transaction(self.network, ins, outs, Locktime(0),
+                                  timestamp=self._time()).to_immutable()
+        self.txs[tx.txid] = tx
+        self.tagged.setdefault(str(tx.outs[0].script_pubkey.address(tx.network)), []).append(tx.txid)
+        self.mempool.append(tx.txid)
+        return tx.txid
+
+    def _txin(self, txid: str, n: int) -> TxIn:
+
+        return TxIn(txid=txid, txout=n, script_sig=ScriptSig.empty(),
+                    sequence=Sequence.max())
+
+    def fund(self, address: str) -> tuple:
+        '''create an output owned by <address>, returns its outpoint'''
+
+        prev = sha256(str(self._time()).encode()).hexdigest()
+        txid = self._add([self._txin(prev, 0)],
+                         [tx_output(self.network, Decimal(100), 0,
+                                    p2pkh_script(self.network, address))])
+        return (txid, 0)
+
+    def deck_spawn(self, issuer: str, name: str='fakedeck',
+                   issue_mode: int=IssueMode.MULTI.value,
+                   number_of_decimals: int=2) -> Deck:
+
+        deck = Deck(name=name, number_of_decimals=number_of_decimals,
+                    issue_mode=issue_mode, network=self.network,
+                    production=True, version=1, issuer=issuer)
+
+        outs = [tx_output(self.network, Decimal('0.01'), 0,
+                          p2pkh_script(self.network, self.p2th)),
+                tx_output(self.network, Decimal(0), 1,
+                          nulldata_script(deck.metainfo_to_protobuf))]
+
+        deck.id = self._add([self._txin(*self.fund(issuer))], outs)
+        return deck
+
+    def card_transfer(self, deck: Deck, sender: str, receiver: list,
+                      amount: list) -> str:
+
+        card = CardTransfer(deck=deck, receiver=receiver, amount=amount)
+
+        outs = [tx_output(self.network, Decimal('0.01'), 0,
+                          p2pkh_script(self.network, deck.p2th_address)),
+                tx_output(self.network, Decimal(0), 1,
+                          nulldata_script(card.metainfo_to_protobuf))]
+        for n, addr in enumerate(receiver):
+            outs.append(tx_output(self.network, Decimal(0), n + 2,
+                                  p2pkh_script(self.network, addr)))
+
+        return self._add([self._txin(*self.fund(sender))], outs)
+
+    def mine(self) -> str:
+        '''put all mempool transactions into a new block'''
+
+        height = len(self.blocks)
+        prev = self.blocks[-1]["hash"] if self.blocks else '00' * 32
+        # commit to the transactions, like a merkle root would
+        blockhash = sha256((prev + str(height) + ''.join(self.mempool)).encode()).hexdigest()
+        block = {"hash": blockhash,
+                 "height": height,
+                 "previousblockhash": prev,
+                 "time": self.genesis_time + height * 600,
+                 "tx": list(self.mempool)}
+        self.blocks.append(block)
+
+        for txid in self.mempool:
+            self.tx_block[txid] = blockhash
+        self.mempool = []
+
+        return blockhash
+
+    def block_by_hash(self, blockhash: str) -> dict:
+
+        return next(b for b in self.blocks if b["hash"] == blockhash)
+
+    # provider like interface
+
+    def getblockcount(self) -> int:
+
+        self.calls.append(('getblockcount', None))
+        return len(self.blocks) - 1
+
+    def getblockhash(self, height: int) -> str:
+
+        self.calls.append(('getblockhash', height))
+        return self.blocks[height]["hash"]
+
+    def getblock(self, blockhash: str, verbose: bool=True) -> dict:
+
+        self.calls.append(('getblock', blockhash))
+        block = dict(self.block_by_hash(blockhash))
+        block["confirmations"] = len(self.blocks) - block["height"]
+        return block
+
+    def getrawtransaction(self, txid: str, verbose: int=1) -> dict:
+
+        self.calls.append(('getrawtransaction', txid))
+        return self.raw(txid, verbose)
+
+    def raw(self, txid: str, verbose: int=1) -> dict:
+        '''decoded transaction, without recording a call'''
+
+        tx = self.txs[txid]
+        if not verbose:
+            return tx.hexlify()
+
+        raw = tx.to_json()
+        raw["time"] = raw.pop("timestamp")
+        for vout in raw["vout"]:
+            vout["value"] = float(vout["value"])
+            spk = vout["scriptPubKey"]
+            if "address" in spk:
+                spk["addresses"] = [spk.pop("address")]
+                spk["type"] = "pubkeyhash"
+                spk["reqSigs"] = 1
+
+        if txid in self.tx_block:
+            block = self.block_by_hash(self.tx_block[txid])
+            raw["blockhash"] = block["hash"]
+            raw["blocktime"] = block["time"]
+            raw["confirmations"] = len(self.blocks) - block["height"]
+        return raw
+
+    def listtransactions(self, address: str) -> list:
+        '''txids paying to <address> in vout[0], oldest first'''
+
+        self.calls.append(('listtransactions', address))
+        return list(self.tagged.get(address, []))
+
+    # wallet, for the P2TH imports
+
+    def importprivkey(self, wif: str, label: str='', rescan: bool=True) -> None:
+
+        self.calls.append(('importprivkey', label))
+        if rescan:
+            self.calls.append(('rescanblockchain', 0))
+        self.wallet[Kutil(network='tppc', from_wif=wif).address] = label
+
+    def validateaddress(self, address: str) -> dict:
+
+        self.calls.append(('validateaddress', address))
+        return {"isvalid": True, "address": address, "ismine": address in self.wallet}
+
+    def rescanblockchain(self, start_height: int=0) -> dict:
+
+        self.calls.append(('rescanblockchain', start_height))
+        return {"start_height": start_height, "stop_height": len(self.blocks) - 1}
+
+    def count(self, method: str) -> int:
+
+        return len([c for c in self.calls if c[0] == method])
+
+
+class FakeProvider(Provider):
+
+    '''Provider serving the FakeChain, for tests which run without network access.'''
+
+    def __init__(self, chain: FakeChain) -> None:
+
+        self.chain = chain
+        self.net = 'tppc'
+
+    def getblockhash(self, blocknum: int) -> str:
+        return self.chain.getblockhash(blocknum)
+
+    def getblockcount(self) -> int:
+        return self.chain.getblockcount()
+
+    def getblock(self, hash: str) -> dict:
+        return self.chain.getblock(hash)
+
+    def getrawtransaction(self, txid: str, decrypt: int=1) -> dict:
+        return self.chain.getrawtransaction(txid, decrypt)
+
+    def listtransactions(self, address: str) -> list:
+        return self.chain.listtransactions(address)
+
+    def _transactions_page(self, address: str, page: int, page_size: int) -> tuple:
+        # newest first, as the explorers list them
+        return list(reversed(self.chain.listtransactions(address))), False
+
+    def getdifficulty(self) -> dict:
+        raise NotImplementedError
+
+    def getbalance(self, address: str) -> Decimal:
+        raise NotImplementedError
+
+    def getreceivedbyaddress(self, address: str) -> Decimal:
+        raise NotImplementedError
+
+    def listunspent(self, address: str) -> list:
+        raise NotImplementedError
+
+    def select_inputs(self, address: str, amount: int) -> dict:
+        raise NotImplementedError
+
+
+def populate(chain: FakeChain, cards: int=6) -> Deck:
+    '''spawn a MULTI deck and issue + transfer some cards over a few blocks'''
+
+    issuer = Kutil(network='tppc', from_string='issuer').address
+    alice = Kutil(network='tppc', from_string='alice').address
+    bob = Kutil(network='tppc', from_string='bob').address
+
+    deck = chain.deck_spawn(issuer)
+    chain.mine()
+
+    chain.card_transfer(deck, issuer, [alice, bob], [1000, 500])
+    chain.mine()
+
+    for i in range(cards):
+        chain.card_transfer(deck, alice, [bob], [10 + i])
+        if i % 2:
+            chain.mine()
+
+    chain.card_transfer(deck, bob, [issuer], [5])  # burn
+    chain.mine()
+
+    return deck
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+
+    '''Serves the FakeChain as peercoind JSON-RPC (POST) and
+    as explorer.peercoin.net REST api (GET).'''
+
+    protocol_version = 'HTTP/1.1'
+    chain = None  # type: FakeChain
+
+    def _reply(self, payload) -> None:
+
+        body = json.dumps(payload).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _rpc(self, method: str, params: list):
+
+        chain = self.chain
+
+        if method == 'getaccount':
+            return params[0]
+
+        if method == 'getinfo':
+            return {"testnet": True}
+
+        if method == 'listtransactions':
+            account = params[0]
+            if account in ('PAPROD', 'PATEST'):
+                account = chain.p2th
+            count = params[1] if len(params) > 1 else 10
+            skip = params[2] if len(params) > 2 else 0
+            chain.calls.append(('listtransactions', account))
+            entries = []
+            for txid in chain.tagged.get(account, []):
+                raw = chain.raw(txid)
+                entries.append({"account": params[0], "address": account,
+                                "category": "receive", "txid": txid,
+                                "blockhash": raw.get("blockhash"),
+                                "blocktime": raw.get("blocktime"),
+                                "confirmations": raw.get("confirmations", 0)})
+            # peercoind returns the <count> most recent entries, oldest first
+            end = len(entries) - skip
+            return entries[max(end - count, 0):max(end, 0)]
+
+        return getattr(chain, method)(*params)
+
+    def do_POST(self) -> None:
+
+        request = json.loads(self.rfile.read(int(self.headers['Content-Length'])).decode())
+        self.chain.calls.append(('POST', None))  # one JSON-RPC round-trip
+
+        if isinstance(request, list):
+            self._reply([self._call(r) for r in request])
+        else:
+            self._reply(self._call(request))
+
+    def _call(self, request: dict) -> dict:
+        '''JSON-RPC reply, RpcError raised by the chain ends up in its error member'''
+
+        try:
+            return {"id": request.get("id"), "error": None,
+                    "result": self._rpc(request["method"], request["params"])}
+        except RpcError as e:
+            return {"id": request.get("id"), "error": e.args[0], "result": None}
+
+    def _blockbook_tx(self, txid: str) -> dict:
+        '''transaction details as blockbook v2 api returns them'''
+
+        raw = self.chain.raw(txid)
+        vin = []
+        for i in raw["vin"]:
+            parent = self.chain.raw(i["txid"])
+            spent = {"txid": i["txid"], "isAddress": True,
+                     "addresses": parent["vout"][i["vout"]]["scriptPubKey"]["addresses"]}
+            if i["vout"]:  # blockbook omits zero values
+                spent["vout"] = i["vout"]
+            vin.append(spent)
+
+        tx = {"txid": txid, "hex": raw["hex"], "vin": vin,
+              "vout": [{"n": v["n"], "hex": v["scriptPubKey"]["hex"],
+                        "addresses": v["scriptPubKey"].get("addresses", [])}
+                       for v in raw["vout"]],
+              "confirmations": raw.get("confirmations", 0)}
+        if "blockhash" in raw:
+            tx["blockHash"] = raw["blockhash"]
+            tx["blockTime"] = raw["blocktime"]
+            tx["blockHeight"] = self.chain.block_by_hash(raw["blockhash"])["height"]
+
+        return tx
+
+    def do_GET(self) -> None:
+
+        url = urlsplit(self.path)
+        query = {k: v[0] for k, v in parse_qs(url.query).items()}
+        command = url.path.split('/')
+
+        if url.path == '/api/getblockcount':
+            return self._reply(self.chain.getblockcount())
+        if url.path == '/api/getblockhash':
+            return self._reply(self.chain.getblockhash(int(query["index"])))
+        if url.path == '/api/getblock':
+            return self._reply(self.chain.getblock(query["hash"]))
+        if url.path == '/api/getrawtransaction':
+            return self._reply(self.chain.getrawtransaction(query["txid"],
+                                                            int(query.get("decrypt", 0))))
+        if command[1:3] == ['ext', 'getaddresstxs']:
+            txids = list(reversed(self.chain.listtransactions(command[3])))
+            start, length = int(command[4]), int(command[5])
+            return self._reply([{"txid": txid} for txid in txids[start:start + length]])
+        if command[1:3] == ['api', 'address'] or command[1:4] == ['api', 'v2', 'address']:
+            # blockbook, the legacy api lists txids only
+            txids = list(reversed(self.chain.listtransactions(command[-1])))
+            page, size = int(query["page"]), int(query["pageSize"])
+            items = txids[(page - 1) * size:page * size]
+            reply = {"page": page, "totalPages": -(-len(txids) // size)}
+            if command[2] != 'v2':
+                reply["transactions"] = items
+            else:
+                reply["txs"] = len(txids)  # empty lists are left out
+                if items and query.get("details") == "txs":
+                    reply["transactions"] = [self._blockbook_tx(txid) for txid in items]
+                elif items:
+                    reply["txids"] = items
+            return self._reply(reply)
+        if command[1:3] == ['api', 'block']:  # blockbook
+            return self._reply(self.chain.getblock(command[3]))
+        if command[1:3] == ['ext', 'getaddress']:
+            txids = self.chain.listtransactions(command[3])
+            return self._reply({"address": command[3],
+                                "last_txs": [{"addresses": txid, "type": "vout"}
+                                             for txid in reversed(txids)]})
+
+        self.send_error(404)
+
+    def log_message(self, *args) -> None:
+        pass
+
+
+def rpc_node(url: str) -> RpcNode:
+    '''RpcNode connected to the stand-in server at <url>'''
+
+    return RpcNode(testnet=True, username='user', password='pass',
+                   ip='127.0.0.1', port=int(url.split(':')[-1]))
+
+
+class ThreadingServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+@pytest.fixture
+def chain():
+
+    return FakeChain()
+
+
+@pytest.fixture
+def stand_in(chain):
+    '''run a stand-in server for <chain>, yields its base url'''
+
+    handler = type('Handler', (StandInHandler,), {"chain": chain})
+    httpd = ThreadingServer(('127.0.0.1', 0), handler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+
+    yield 'http://127.0.0.1:{0}'.format(httpd.server_address[1])
+
+    httpd.shutdown()
+    httpd.server_close()
@@ -0,0 +1,130 @@
+import asyncio
+
+import pytest
+
+import pypeerassets as pa
+from pypeerassets import aio
+from pypeerassets.kutil import Kutil
+from pypeerassets.protocol import CardBundle, IssueMode
+from pypeerassets.provider.aio import AsyncExplorer, AsyncRpcNode
+from pypeerassets.provider.session import AsyncHTTPSession
+
+from .conftest import FakeProvider, populate
+
+
+def run(coro):
+
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coro)
+    finally:
+        loop.close()
+
+
+async def collect(agen) -> list:
+
+    return [i async for i in agen]
+
+
+def async_providers(url: str) -> list:
+
+    port = int(url.split(':')[-1])
+    rpc = AsyncRpcNode(testnet=True, username='user', password='pass',
+                       ip='127.0.0.1', port=port)
+
+    explorer = AsyncExplorer(network='tppc')
+    explorer.testnet_api_url = url + '/api/'
+    explorer.testnet_ext_url = url + '/ext/'
+
+    return [rpc, explorer]
+
+
+@pytest.mark.parametrize("index", [0, 1])
+def test_async_find_all_valid_decks(chain, stand_in, index):
+
+    deck = populate(chain)
+    chain.deck_spawn(deck.issuer, name='second')
+    chain.mine()
+
+    async def scan():
+        provider = async_providers(stand_in)[index]
+        decks = await collect(aio.find_all_valid_decks(provider, 1, True))
+        await provider.close()
+        return decks
+
+    decks = run(scan())
+    expected = list(pa.find_all_valid_decks(FakeProvider(chain), 1, True))
+
+    def key(d):
+        return (d.id, d.name, d.issuer, d.issue_mode, d.issue_time)
+
+    assert sorted(map(key, decks)) == sorted(map(key, expected))
+    assert len(decks) == 2
+
+
+@pytest.mark.parametrize("index", [0, 1])
+def test_async_find_all_valid_cards(chain, stand_in, index):
+
+    populate(chain)
+    deck = next(pa.find_all_valid_decks(FakeProvider(chain), 1, True))
+
+    async def scan():
+        provider = async_providers(stand_in)[index]
+        bundles = await collect(aio.find_card_bundles(provider, deck, max_in_flight=3))
+        cards = await collect(aio.find_all_valid_cards(provider, deck))
+        await provider.close()
+        return bundles, cards
+
+    bundles, cards = run(scan())
+    expected = list(pa.find_all_valid_cards(FakeProvider(chain), deck))
+
+    assert all(isinstance(b, CardBundle) for b in bundles)
+    assert sorted(c.txid + str(c.cardseq) for c in cards) == \
+        sorted(c.txid + str(c.cardseq) for c in expected)
+    assert pa.DeckState(cards).balances == pa.DeckState(expected).balances
+
+
+@pytest.mark.parametrize("index", [0, 1])
+def test_async_cards_in_confirmation_order(chain, stand_in, index):
+    '''issue modes are applied in the order cards were confirmed, as in the sync scan'''
+
+    issuer = Kutil(network='tppc', from_string='issuer').address
+    alice = Kutil(network='tppc', from_string='alice').address
+    deck = chain.deck_spawn(issuer, issue_mode=IssueMode.ONCE.value)
+    chain.mine()
+    for amount in (100, 7):  # only the first issue counts
+        chain.card_transfer(deck, issuer, [alice], [amount])
+        chain.mine()
+    deck = next(pa.find_all_valid_decks(FakeProvider(chain), 1, True))
+
+    async def scan():
+        provider = async_providers(stand_in)[index]
+        cards = await collect(aio.find_all_valid_cards(provider, deck))
+        await provider.close()
+        return cards
+
+    cards = run(scan())
+
+    assert [c.amount for c in cards] == [[100]]
+    assert [c.amount for c in pa.find_all_valid_cards(FakeProvider(chain), deck)] == [[100]]
+
+
+def test_async_session_keeps_requests_in_flight(chain, stand_in):
+
+    populate(chain)
+    txids = list(chain.txs)
+
+    async def fetch():
+        session = AsyncHTTPSession(limit=8)
+        provider = AsyncExplorer(network='tppc', session=session)
+        provider.testnet_api_url = stand_in + '/api/'
+        txs = await asyncio.gather(*[provider.getrawtransaction(i, 1) for i in txids])
+        await provider.close()
+        return txs, session.stats()
+
+    txs, stats = run(fetch())
+
+    assert [tx["txid"] for tx in txs] == txids
+    assert stats["requests"] == len(txids)
+    assert 1 < stats["connections"] <= 8
+    assert stats["reused"] == len(txids) - stats["connections"]
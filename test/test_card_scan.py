@@ -0,0 +1,199 @@
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import time
+
+import pytest
+
+from pypeerassets.__main__ import find_card_bundles
+from pypeerassets.pautils import stream_batches
+from pypeerassets.provider import BlockMetaCache, SenderResolver
+from pypeerassets.provider.pipeline import read_ahead
+
+from .conftest import FakeProvider, populate, rpc_node
+
+
+def scan_node(url: str):
+
+    provider = rpc_node(url)
+    provider.blockmeta = BlockMetaCache()
+    provider.senders = SenderResolver()
+
+    return provider
+
+
+@pytest.mark.parametrize("cards", [2, 12])
+def test_rpc_card_scan_round_trips(chain, stand_in, cards):
+
+    deck = populate(chain, cards)
+    provider = scan_node(stand_in)
+
+    bundles = list(find_card_bundles(provider, deck))
+
+    # getaccount, listtransactions and one batch each for txs, blocks and parents
+    assert chain.count('POST') == 5
+    assert len(bundles) == cards + 2
+
+
+def test_rpc_card_scan_chunked(chain, stand_in):
+
+    deck = populate(chain, 12)
+    expected = [(b.txid, b.blocknum, b.blockseq, b.sender)
+                for b in find_card_bundles(scan_node(stand_in), deck)]
+
+    provider = scan_node(stand_in)
+    batches = []
+    batch = provider.batch
+    provider.batch = lambda reqs: batches.append(reqs) or batch(reqs)
+
+    def card_batches() -> list:
+        cards = set(chain.tagged[deck.p2th_address])
+        return [len(reqs) for reqs in batches if reqs[0][1][0] in cards]
+
+    bundles = find_card_bundles(provider, deck, batch_size=4, max_in_flight=2)
+    next(bundles)
+
+    # results are streamed, the first chunk is parsed before the rest is fetched
+    assert len(card_batches()) <= 3
+
+    rest = list(bundles)
+    assert card_batches() == [4, 4, 4, 2]
+    assert len(rest) == 13
+    assert [expected[0]] + [(b.txid, b.blocknum, b.blockseq, b.sender) for b in rest] == expected
+
+
+def test_stream_batches_in_order(chain, stand_in):
+
+    populate(chain)
+    provider = rpc_node(stand_in)
+    txids = list(chain.txs)
+
+    responses = list(stream_batches(provider, (('getrawtransaction', [txid, 0]) for txid in txids),
+                                    batch_size=3, max_in_flight=3))
+
+    assert [len(r) for r in responses[:-1]] == [3] * (len(responses) - 1)
+    assert [r["result"] for response in responses for r in response] == \
+        [chain.raw(txid, 0) for txid in txids]
+
+
+class Concurrency:
+
+    '''wraps a function, recording how many calls of it run at once'''
+
+    def __init__(self, func, delay: float=0.01) -> None:
+
+        self.func = func
+        self.delay = delay
+        self.running = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, *args):
+
+        with self._lock:
+            self.running += 1
+            self.peak = max(self.peak, self.running)
+        time.sleep(self.delay)
+        try:
+            return self.func(*args)
+        finally:
+            with self._lock:
+                self.running -= 1
+
+
+def test_read_ahead_bounded():
+
+    pulled = []
+
+    def items():
+        for i in range(100):
+            pulled.append(i)
+            yield i
+
+    func = Concurrency(lambda i: i * 2)
+    results = read_ahead(func, items(), window=8, initial=1)
+
+    # window opens up as results are consumed
+    assert [next(results) for i in range(3)] == [0, 2, 4]
+    assert len(pulled) <= 3 + 3
+
+    assert list(results) == [i * 2 for i in range(3, 100)]
+    assert 1 < func.peak <= 8
+
+    # by default every worker has a call from the start
+    pulled.clear()
+    results = read_ahead(func, items(), window=100, max_workers=4)
+    assert next(results) == 0
+    assert len(pulled) >= 4
+    results.close()
+
+    # consumer stopping early leaves nothing behind
+    results = read_ahead(func, range(1000), window=8)
+    next(results)
+    results.close()
+
+
+def test_read_ahead_unordered():
+
+    def func(i):
+        time.sleep(0.3 if i == 0 else 0.01)
+        return i
+
+    # a slow first call does not hold up the ones behind it
+    results = list(read_ahead(func, range(20), window=8, initial=8, ordered=False))
+
+    assert sorted(results) == list(range(20))
+    assert results[0] != 0
+
+    with ThreadPoolExecutor(max_workers=2) as th:
+        func = Concurrency(lambda i: i * 2)
+        assert list(read_ahead(func, range(10), window=8, executor=th)) == \
+            [i * 2 for i in range(10)]
+        assert func.peak <= 2
+
+        # shared executor outlives the scans run in it
+        assert th.submit(lambda: 1).result() == 1
+
+
+def test_card_scan_prefetch(chain):
+
+    deck = populate(chain, 12)
+    expected = [(b.txid, b.blocknum, b.blockseq, b.sender)
+                for b in find_card_bundles(FakeProvider(chain), deck)]
+
+    provider = FakeProvider(chain)
+    provider.blockmeta = BlockMetaCache()
+    provider.senders = SenderResolver()
+    provider.getrawtransaction = Concurrency(provider.getrawtransaction)
+
+    bundles = list(find_card_bundles(provider, deck, prefetch=4))
+
+    # fetches overlap, up to the window plus the parents being resolved
+    assert [(b.txid, b.blocknum, b.blockseq, b.sender) for b in bundles] == expected
+    assert 1 < provider.getrawtransaction.peak <= 4 + provider.senders.max_workers
+
+
+def test_card_scan_shared_executor(chain):
+
+    deck = populate(chain, 12)
+    expected = [(b.txid, b.blocknum, b.blockseq, b.sender)
+                for b in find_card_bundles(FakeProvider(chain), deck)]
+
+    provider = FakeProvider(chain)
+    provider.blockmeta = BlockMetaCache()
+    provider.max_workers = 2
+    provider.getrawtransaction = Concurrency(provider.getrawtransaction)
+
+    with ThreadPoolExecutor(max_workers=3) as th:
+        provider.senders = SenderResolver(executor=th)
+        bundles = list(find_card_bundles(provider, deck, prefetch=8, executor=th, ordered=False))
+        again = list(find_card_bundles(provider, deck, prefetch=8, executor=th))
+
+    key = [(b.txid, b.blocknum, b.blockseq, b.sender) for b in bundles]
+    assert sorted(key) == sorted(expected)
+    assert [(b.txid, b.blocknum, b.blockseq, b.sender) for b in again] == expected
+    assert provider.getrawtransaction.peak <= 3
+
+    # without an executor, scans run provider.max_workers requests at once
+    provider.getrawtransaction = Concurrency(FakeProvider(chain).getrawtransaction)
+    list(provider.iter_raw_transactions(deck.p2th_address, prefetch=8))
+    assert provider.getrawtransaction.peak <= 2
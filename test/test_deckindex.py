@@ -0,0 +1,114 @@
+from concurrent.futures import ProcessPoolExecutor
+from hashlib import sha256
+
+import pypeerassets as pa
+from pypeerassets.kutil import keycache
+from pypeerassets.provider import BlockMetaCache, SenderResolver
+
+from .conftest import FakeProvider, populate
+
+
+def provider_for(chain) -> FakeProvider:
+
+    provider = FakeProvider(chain)
+    provider.blockmeta = BlockMetaCache()
+    provider.senders = SenderResolver()
+
+    return provider
+
+
+def key(deck: pa.Deck) -> tuple:
+
+    return (deck.id, deck.name, deck.issuer, deck.issue_mode, deck.number_of_decimals,
+            deck.asset_specific_data, deck.issue_time, deck.blocknum, deck.network,
+            deck.production)
+
+
+def test_deck_index_update(chain, tmpdir):
+
+    deck = populate(chain)
+    for i in range(12):
+        chain.deck_spawn(deck.issuer, name='old {}'.format(i))
+    chain.mine()
+    chain.deck_spawn(deck.issuer, name='second')
+    chain.mine()
+    height = len(chain.blocks) - 1
+    chain.deck_spawn(deck.issuer, name='unconfirmed')
+    old = ['old {}'.format(i) for i in range(12)]
+
+    path = str(tmpdir.join('decks.db'))
+    index = pa.DeckIndex(path)
+
+    new = index.update(provider_for(chain))
+    expected = list(pa.find_all_valid_decks(FakeProvider(chain), 1, True))
+
+    assert [d.name for d in new] == ['fakedeck'] + old + ['second']
+    assert sorted(map(key, new)) == sorted(key(d) for d in expected if d.name != 'unconfirmed')
+    assert index.cursor('peercoin-testnet') == (height, new[-1].id)
+
+    # refresh costs one page and the newest deck spawns, up to one read ahead
+    # per worker, on a reopened index too
+    chain.calls.clear()
+    index = pa.DeckIndex(path)
+    provider = provider_for(chain)
+    assert index.update(provider) == []
+    assert chain.count('getrawtransaction') <= 1 + provider.max_workers
+    assert sorted(d.name for d in index.decks('peercoin-testnet')) == sorted(d.name for d in new)
+    assert index.decks('peercoin-testnet')[-1].blocknum == height
+
+    chain.deck_spawn(deck.issuer, name='third')
+    chain.mine()
+    chain.calls.clear()
+
+    new = index.update(provider_for(chain))
+    assert sorted(d.name for d in new) == ['third', 'unconfirmed']
+    assert chain.count('getrawtransaction') <= 4 + provider.max_workers
+    assert len(index.decks('peercoin-testnet')) == 16
+    assert key(index.get('peercoin-testnet', new[0].id)) == key(new[0])
+
+    assert index.decks('peercoin-testnet', prod=False) == []
+
+
+def test_deck_index_p2th_keys(chain, tmpdir):
+
+    deck = populate(chain)
+    for i in range(3):
+        chain.deck_spawn(deck.issuer, name='deck {}'.format(i))
+    chain.mine()
+
+    path = str(tmpdir.join('decks.db'))
+    index = pa.DeckIndex(path)
+    with ProcessPoolExecutor(max_workers=2) as pool:
+        new = index.update(provider_for(chain), executor=pool)
+
+    keys = index.p2th_keys('peercoin-testnet')
+    assert list(keys) == [d.id for d in index.decks('peercoin-testnet')]
+    assert len(keys) == len(new) == 4
+    for d in new:
+        key = pa.Kutil(network='tppc', privkey=bytearray.fromhex(d.id))
+        assert keys[d.id] == (key.address, key.wif)
+
+    # reopened index serves the stored keys, nothing is derived again
+    keycache.clear()
+    index = pa.DeckIndex(path)
+    misses = keycache.stats()["misses"]
+    decks = index.decks('peercoin-testnet')
+
+    assert [d.p2th_address for d in decks] == [keys[d.id].address for d in decks]
+    assert [d.p2th_wif for d in decks] == [keys[d.id].wif for d in decks]
+    assert index.p2th_keys('peercoin-testnet', [decks[0].id]) == {decks[0].id: keys[decks[0].id]}
+    assert keycache.stats()["misses"] == misses
+
+
+def test_deck_p2th_keys():
+
+    deck_ids = [sha256(str(i).encode()).hexdigest() for i in range(20)]
+
+    with ProcessPoolExecutor(max_workers=2) as pool:
+        keys = pa.deck_p2th_keys('peercoin', deck_ids, pool)
+
+    assert list(keys) == deck_ids
+    assert keys == pa.deck_p2th_keys('peercoin', deck_ids)
+    for deck_id in deck_ids[:3]:
+        assert keys[deck_id].address == pa.Kutil(network='ppc',
+                                                 privkey=bytearray.fromhex(deck_id)).address
@@ -6,9 +6,10 @@ import time
 from btcpy.structs.transaction import Locktime
 from btcpy.structs.sig import P2pkhSolver
 
-from pypeerassets.kutil import Kutil
+from pypeerassets.kutil import Kutil, KeyCache, backends, keycache
 from pypeerassets.provider import Explorer
 from pypeerassets.networks import net_query
+from pypeerassets.protocol import CardTransfer, Deck
 from pypeerassets.transactions import (
     MutableTransaction,
     Transaction,
@@ -69,6 +70,66 @@ def test_wif_export():
     assert mykey.wif == 'U624wXL6iT7XZ9qeHsrtPGEiU78V1YxDfwq75Mymd61Ch56w47KE'
 
 
+@pytest.mark.parametrize("wif", ["U624wXL6iT7XZ9qeHsrtPGEiU78V1YxDfwq75Mymd61Ch56w47KE",
+                                 "78wAW7sYewQEGSZmhXZ9UFKy4snCLA3zhYTJgxWB7N58BWDUrWe"])
+def test_crypto_backends_match(wif):
+    '''every backend gives the same keys and signatures as btcpy'''
+
+    pytest.importorskip("coincurve")
+
+    reference = Kutil(network='ppc', from_wif=wif, backend='btcpy')
+    digest = bytes.fromhex('9e321f5379c2d1c4327c12227e1226a7c2e08342d88431dcbb0063e1e715a36c')
+
+    for name in backends:
+        key = Kutil(network='ppc', from_wif=wif, backend=name)
+
+        assert (key.privkey, key.pubkey, key.address, key.wif) == \
+            (reference.privkey, reference.pubkey, reference.address, reference.wif)
+        assert key._private_key.sign(digest) == reference._private_key.sign(digest)
+        assert P2pkhSolver(key._private_key).solve(digest)[0].hexlify() == \
+            P2pkhSolver(reference._private_key).solve(digest)[0].hexlify()
+
+
+def test_unknown_crypto_backend():
+
+    with pytest.raises(ValueError):
+        Kutil(network='ppc', backend='openssl')
+
+
+def test_key_cache():
+
+    cache = KeyCache(maxsize=2)
+    privkey = bytes.fromhex('1b19749afd007bf6db0029e0273a46409bc160b9349031752bbc3cd913bbbdd3')
+
+    key = cache.get('ppc', privkey)
+    assert key.address == 'PAprodbYvZqf4vjhef49aThB9rSZRxXsM6'
+    assert key.wif == 'U624wXL6iT7XZ9qeHsrtPGEiU78V1YxDfwq75Mymd61Ch56w47KE'
+
+    assert cache.get('ppc', bytearray(privkey)) is key
+    assert cache.get('tppc', privkey).address != key.address
+    assert cache.stats() == {"hits": 1, "misses": 2, "keys": 2}
+
+    # least recently used key is dropped first
+    cache.get('ppc', urandom(32))
+    cache.get('ppc', privkey)
+    assert cache.stats()["misses"] == 4
+
+
+def test_key_cache_shared_by_cards():
+
+    deck = Deck(name="cached", number_of_decimals=0, issue_mode=4, network='tppc',
+                production=True, version=1, issuer='mthKQHpr7zUbMvLcj8GHs33mVcf91DtN6L',
+                id=urandom(32).hex())
+    receiver = Kutil(network='tppc').address
+
+    misses = keycache.stats()["misses"]
+    cards = [CardTransfer(deck=deck, receiver=[receiver], amount=[i]) for i in range(100)]
+
+    assert keycache.stats()["misses"] == misses + 1
+    assert {c.deck_p2th for c in cards} == {deck.p2th_address}
+    assert deck.p2th_wif == keycache.get('tppc', bytes.fromhex(deck.id)).wif
+
+
 def test_sign_transaction():
 
     network_params = net_query('tppc')
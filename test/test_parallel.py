@@ -0,0 +1,64 @@
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest
+
+import pypeerassets as pa
+from pypeerassets.kutil import Kutil
+from pypeerassets.parallel import compact_vout, parse_card_bundles
+from pypeerassets.__main__ import find_card_bundles
+
+from .conftest import FakeProvider, populate
+
+
+@pytest.fixture(scope="module")
+def parse_pool():
+
+    with ProcessPoolExecutor(max_workers=2) as pool:
+        yield pool
+
+
+def test_parse_pool_decks(chain, parse_pool):
+
+    deck = populate(chain)
+    chain.deck_spawn(deck.issuer, name='second')
+    chain.mine()
+
+    expected = list(pa.find_all_valid_decks(FakeProvider(chain), 1, True))
+    decks = list(pa.find_all_valid_decks(FakeProvider(chain), 1, True, parse_pool=parse_pool))
+
+    assert [d.__dict__ for d in decks] == [d.__dict__ for d in expected]
+    assert len(decks) == 2
+
+
+def test_parse_pool_cards(chain, parse_pool):
+
+    deck = populate(chain, 12)
+    bob = Kutil(network='tppc', from_string='bob').address
+    chain.card_transfer(deck, deck.issuer, [bob, bob], [7, 8])  # same receiver twice
+    chain.mine()
+
+    expected = list(pa.find_all_valid_cards(FakeProvider(chain), deck))
+    cards = list(pa.find_all_valid_cards(FakeProvider(chain), deck, parse_pool=parse_pool))
+
+    assert [c.__dict__ for c in cards] == [c.__dict__ for c in expected]
+    assert [c.cardseq for c in cards[-2:]] == [0, 1]
+
+    # small chunks, results still come back in order
+    bundles = list(find_card_bundles(FakeProvider(chain), deck))
+    serial = [[c.__dict__ for c in pa.pautils.card_bundle_parser(b)]
+              for b in find_card_bundles(FakeProvider(chain), deck)]
+    assert [[c.__dict__ for c in batch] for batch in
+            parse_card_bundles(bundles, parse_pool, chunk=3, window=2)] == serial
+
+
+def test_compact_vout():
+
+    vout = {"value": 0.01, "n": 0,
+            "scriptPubKey": {"asm": "OP_DUP OP_HASH160 ...", "hex": "76a9...",
+                             "reqSigs": 1, "type": "pubkeyhash",
+                             "addresses": ["mj46gUeZgeD9ufU7Z7pJh3m2rTq1uLYsmb"]}}
+
+    assert compact_vout(vout, 0) == {
+        "n": 0, "scriptPubKey": {"addresses": ["mj46gUeZgeD9ufU7Z7pJh3m2rTq1uLYsmb"]}}
+    assert compact_vout({"scriptPubKey": {"asm": "OP_RETURN 0801", "hex": "6a020801"}}, 1) == {
+        "n": 1, "scriptPubKey": {"hex": "6a020801"}}
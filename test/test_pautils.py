@@ -4,6 +4,7 @@ import pytest
 
 from pypeerassets import (
     Deck,
+    find_all_valid_decks,
     find_deck
 )
 from pypeerassets.provider import Cryptoid, Explorer, RpcNode
@@ -13,6 +14,8 @@ from pypeerassets.pautils import *
 from pypeerassets.protocol import IssueMode, CardTransfer
 from pypeerassets.pa_constants import param_query
 
+from .conftest import FakeProvider, RpcError, populate, rpc_node
+
 
 @pytest.mark.xfail
 def test_load_p2th_privkeys_into_local_node():
@@ -84,6 +87,13 @@ def test_read_tx_opreturn():
     assert isinstance(read_tx_opreturn(vout[1]), bytes)
     assert read_tx_opreturn(vout[1]) == b'\x08\x01\x12\x0fsixto_rodriguez\x18\x05 \x04'
 
+    # script bytes are read when there is no asm, as with locally decoded transactions
+    assert read_tx_opreturn({'scriptPubKey': {'hex': vout[1]['scriptPubKey']['hex']}}) == \
+        read_tx_opreturn(vout[1])
+
+    # asm shows short pushes as numbers, script bytes do not
+    assert read_tx_opreturn({'scriptPubKey': {'asm': 'OP_RETURN 5', 'hex': '6a0105'}}) == b'\x05'
+
 
 def generate_dummy_deck():
 
@@ -241,3 +251,68 @@ def test_exponent_to_amount():
 
     assert isinstance(exponent_to_amount(10, 6), float)
     assert exponent_to_amount(10, 3) == 0.01
+
+
+def test_import_deck_p2th_keys(chain, stand_in):
+
+    deck = populate(chain)
+    for i in range(4):
+        chain.deck_spawn(deck.issuer, name='deck {}'.format(i))
+    chain.mine()
+
+    decks = list(find_all_valid_decks(FakeProvider(chain), 1, True))
+    chain.wallet[decks[0].p2th_address] = decks[0].id  # imported before
+
+    provider = rpc_node(stand_in)
+    reports = []
+    chain.calls.clear()
+
+    imported = import_deck_p2th_keys(provider, decks, batch_size=2,
+                                     progress=lambda *args: reports.append(args))
+
+    assert sorted(d.id for d in imported) == sorted(d.id for d in decks[1:])
+    assert all(d.p2th_address in chain.wallet for d in decks)
+    assert chain.count('importprivkey') == 4
+    # a single rescan, from the block of the oldest deck spawn
+    assert [c for c in chain.calls if c[0] == 'rescanblockchain'] == [('rescanblockchain', 1)]
+    assert [r for r in reports if r[0] == 'import'] == [('import', 2, 4), ('import', 4, 4)]
+    assert ('rescan', 1, len(chain.blocks) - 1) in reports
+    assert reports[-1] == ('verify', 4, 4)
+
+    # nothing left to import
+    chain.calls.clear()
+    assert import_deck_p2th_keys(provider, decks) == []
+    assert chain.count('importprivkey') == chain.count('rescanblockchain') == 0
+
+
+def test_import_deck_p2th_keys_verifies(chain, stand_in, monkeypatch):
+
+    deck = populate(chain)
+    monkeypatch.setattr(chain, 'importprivkey', lambda *args: None)
+
+    with pytest.raises(DeckP2THImportError):
+        import_deck_p2th_keys(rpc_node(stand_in), [deck], rescan_from=0)
+
+
+def test_import_deck_p2th_keys_failed_rescan(chain, stand_in, monkeypatch):
+
+    deck = populate(chain)
+
+    def refuse(start_height: int=0) -> dict:
+        raise RpcError({"code": -1, "message": "Rescan is already in progress."})
+
+    monkeypatch.setattr(chain, 'rescanblockchain', refuse)
+
+    with pytest.raises(DeckP2THImportError) as e:
+        import_deck_p2th_keys(rpc_node(stand_in), [deck])
+    assert e.value.args[0]["message"] == "Rescan is already in progress."
+
+
+def test_import_deck_p2th_keys_unconfirmed(chain, stand_in):
+
+    deck = populate(chain)
+    deck.blocknum = None  # spawn not confirmed yet, rescan only the tip
+
+    import_deck_p2th_keys(rpc_node(stand_in), [deck])
+    assert [c for c in chain.calls if c[0] == 'rescanblockchain'] == [
+        ('rescanblockchain', len(chain.blocks) - 1)]
@@ -1,9 +1,13 @@
 import pytest
 import random
+import copy
 import itertools
+import json
+from types import SimpleNamespace
 from pypeerassets import Kutil
 from pypeerassets.protocol import (CardTransfer, Deck, IssueMode,
                                    validate_card_issue_modes, DeckState)
+from pypeerassets.card_parsers import compile_issue_mode, parsers
 from pypeerassets.exceptions import OverSizeOPReturn, InvalidCardIssue
 
 
@@ -25,6 +29,7 @@ def test_deck_object():
                               'issue_mode': IssueMode.MULTI.value,
                               'issue_time': None,
                               'tx_confirmations': None,
+                              'blocknum': None,
                               'issuer': '',
                               'name': 'decky',
                               'network': 'ppc',
@@ -632,3 +637,258 @@ def test_deck_state():
     assert state.balances[receiver_roster[1]] == 10
     assert state.balances[receiver_roster[2]] == 10
     assert state.balances[receiver_roster[3]] == 50
+
+
+def chronological_cards(deck: Deck, n: int) -> list:
+    '''<n> random cards between a few holders, in the order they were confirmed'''
+
+    holders = [deck.issuer] + ['mzsMJgqVABFhrEGrqKH7qURhmxESx4K8Ti',
+                               'mmsiUudS9W5xLoWeA44JmKa28cioFg7Yzx',
+                               'muMpqVjUDq5voY9WnxvFb9sFvZm8wwKihu']
+    cards = []
+
+    for i in range(n):
+        ctype = random.choice(['CardIssue', 'CardTransfer', 'CardTransfer', 'CardBurn'])
+        sender = deck.issuer if ctype == 'CardIssue' else random.choice(holders[1:])
+        receiver = deck.issuer if ctype == 'CardBurn' else random.choice(holders[1:])
+        cards.append(CardTransfer(deck=deck, sender=sender, receiver=[receiver],
+                                  amount=[random.randint(1, 300)],
+                                  blockhash='{:064x}'.format(i // 3),
+                                  blocknum=i // 3, blockseq=i % 3, cardseq=0,
+                                  txid='{:064x}'.format(i), type=ctype))
+
+    return cards
+
+
+@pytest.mark.parametrize("issue_mode", [1, 2, 4, 8, 10, 16, 20, 26, 28, 52])
+def test_deck_state_incremental(issue_mode):
+    '''resumed DeckState validating cards one by one matches a full recompute'''
+
+    deck = Deck(name="decky", number_of_decimals=2, issue_mode=issue_mode,
+                network="tppc", production=True, version=1,
+                issuer='msnHPXDWuJhRBPVNQnwXdKvEMQHLr9z1P5')
+
+    cards = chronological_cards(deck, 30)
+    expected = DeckState(validate_card_issue_modes(issue_mode, copy.deepcopy(cards)))
+
+    split = random.randint(1, 29)
+    state = DeckState(copy.deepcopy(cards[:split]), issue_mode)
+    state = DeckState.from_json(json.loads(json.dumps(state.to_json())))
+
+    shuffled = copy.deepcopy(cards)  # includes cards which were applied already
+    random.shuffle(shuffled)
+    state.apply(shuffled)
+
+    assert state.balances == expected.balances
+    assert (state.total, state.burned) == (expected.total, expected.burned)
+    assert state.processed_issues == expected.processed_issues
+    assert state.processed_transfers == expected.processed_transfers
+    assert state.processed_burns == expected.processed_burns
+    assert state.checksum == expected.checksum
+    assert state.position == (9, 2, 0)
+
+
+class ChainHashes:
+    '''stands in for a provider, only getblockhash is needed by DeckState.rollback'''
+
+    def __init__(self, hashes: dict) -> None:
+        self.hashes = hashes
+        self.calls = 0
+
+    def getblockhash(self, blocknum: int) -> str:
+        self.calls += 1
+        return self.hashes[blocknum]
+
+
+def reorganized(deck: Deck, cards: list, fork: int, salt: str) -> list:
+    '''replace cards from block <fork> on with cards of a competing chain'''
+
+    fresh = chronological_cards(deck, len(cards))
+    for card in fresh:
+        if card.blocknum >= fork:
+            card.blockhash = salt + card.blockhash[len(salt):]
+            card.txid = salt + card.txid[len(salt):]
+
+    return [c for c in cards if c.blocknum < fork] + [c for c in fresh if c.blocknum >= fork]
+
+
+@pytest.mark.parametrize("issue_mode", [4, 2, 20])
+def test_deck_state_rollback(issue_mode):
+    '''rolling back a reorg matches a full recompute over the new chain'''
+
+    deck = Deck(name="decky", number_of_decimals=2, issue_mode=issue_mode,
+                network="tppc", production=True, version=1,
+                issuer='msnHPXDWuJhRBPVNQnwXdKvEMQHLr9z1P5')
+
+    cards = chronological_cards(deck, 90)  # 30 blocks
+    state = DeckState(copy.deepcopy(cards), issue_mode, checkpoint_interval=4, undo_depth=8)
+    state = DeckState.from_json(json.loads(json.dumps(state.to_json())))
+
+    # older checkpoints and undo entries are dropped
+    assert state.checkpoints[0][0] >= 29 - 8 - 4
+    assert min(c["blocknum"] for c in state.undo) > state.checkpoints[0][0]
+
+    chain = ChainHashes({c.blocknum: c.blockhash for c in cards})
+    assert state.rollback(chain) is False
+
+    new_chain = reorganized(deck, cards, 26, 'ff')
+    chain = ChainHashes({c.blocknum: c.blockhash for c in new_chain})
+
+    assert state.rollback(chain) is True
+    assert state.position[0] < 26
+    assert chain.calls < 10
+    state.apply(copy.deepcopy(new_chain))
+
+    expected = DeckState(validate_card_issue_modes(issue_mode, copy.deepcopy(new_chain)))
+    assert state.balances == expected.balances
+    assert (state.total, state.burned) == (expected.total, expected.burned)
+    assert state.processed_transfers == expected.processed_transfers
+
+    # forks below the undo log can not be rolled back
+    chain = ChainHashes({c.blocknum: c.blockhash for c in reorganized(deck, new_chain, 5, 'ee')})
+    with pytest.raises(Exception):
+        state.rollback(chain)
+
+
+def one_card_per_block(n: int) -> list:
+    '''an issue followed by <n> transfers to new holders, each card in a block of its own'''
+
+    cards = []
+    for i in range(n + 1):
+        cards.append(SimpleNamespace(txid='{:064x}'.format(i), blockhash='{:064x}'.format(i),
+                                     blocknum=i, blockseq=0, cardseq=0,
+                                     type='CardTransfer' if i else 'CardIssue',
+                                     sender='issuer' if i else None,
+                                     receiver=['holder{}'.format(i)] if i else ['issuer'],
+                                     amount=[1] if i else [n], number_of_decimals=0))
+    return cards
+
+
+def test_deck_state_linear(monkeypatch):
+    '''checkpoints hold what changed, the work per card does not grow with the history'''
+
+    copied = []
+    snapshot = DeckState._snapshot
+
+    def counting(self, balances: dict) -> dict:
+        copied.append(len(balances))
+        return snapshot(self, balances)
+
+    monkeypatch.setattr(DeckState, '_snapshot', counting)
+
+    for n in (5000, 20000):
+        copied.clear()
+        state = DeckState(one_card_per_block(n), 4)
+        assert state.balances["issuer"] == 0 and state.checksum
+
+        # each checkpoint copies the balances changed in its ten blocks, not all of them,
+        # so the copying grows with the number of cards only
+        assert len(copied) == n // 10 + 1
+        assert max(copied) == 11  # ten holders, the issuer
+
+    # only the base checkpoint holds all the balances
+    assert {len(c[2]["balances"]) for c in state.checkpoints[1:]} == {11}
+    assert len(json.dumps(state.to_json()["checkpoints"])) < 2 * len(json.dumps(state.balances))
+    # the undo log is trimmed as blocks go by
+    assert len(state.undo) <= state.undo_depth + state.checkpoint_interval  # a card per block
+
+
+def test_deck_state_rollback_empty_undo():
+    '''a state rolled back to its base checkpoint still notices deeper reorganizations'''
+
+    cards = one_card_per_block(30)
+    state = DeckState(cards, 4, checkpoint_interval=4, undo_depth=8)
+    hashes = {c.blocknum: c.blockhash for c in cards}
+    base = state.checkpoints[0][0]
+
+    # a fork right past the base checkpoint leaves nothing in the undo log
+    hashes.update({b: 'ff' * 32 for b in range(base + 1, 31)})
+    assert state.rollback(ChainHashes(hashes)) is True
+    assert state.undo == [] and state.position[0] == base
+    assert state.rollback(ChainHashes(hashes)) is False
+
+    # a fork at the base block can not be rolled back, the state is to be recomputed
+    hashes[base] = 'ee' * 32
+    with pytest.raises(Exception, match='recompute'):
+        state.rollback(ChainHashes(hashes))
+
+
+def parsers_in_turn(issue_mode: int, cards: list) -> list:
+    '''validate_card_issue_modes as it was, running the parser of each bit over all the cards'''
+
+    if not issue_mode & 63:
+        return []
+
+    for i in [1 << x for x in range(len(IssueMode))]:
+        if i & issue_mode:
+            try:
+                parser_fn = parsers[IssueMode(i).name]
+            except ValueError:
+                continue
+
+            cards = parser_fn(cards)
+            if not cards:
+                return []
+
+    return cards
+
+
+def random_cards(deck: Deck, n: int) -> list:
+
+    cards = chronological_cards(deck, n)
+    for card in cards:
+        # amounts which do not survive the float round-trip of MONO as they are
+        card.amount = [random.choice([29, 57, 1, 10**18 + 1, random.randint(0, 10**9)])]
+        card.number_of_decimals = random.randint(0, 8)
+
+    return cards
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_compiled_issue_mode_matches_parsers(seed):
+    '''single pass filter gives the same cards (and amounts) as the parsers one by one'''
+
+    random.seed(seed)
+    deck = Deck(name="decky", number_of_decimals=2, issue_mode=4,
+                network="tppc", production=True, version=1,
+                issuer='msnHPXDWuJhRBPVNQnwXdKvEMQHLr9z1P5')
+
+    for issue_mode in list(range(64)) + [IssueMode.SUBSCRIPTION.value, 64, 96, 255]:
+        cards = random_cards(deck, random.randint(0, 40))
+        if random.random() < 0.2:
+            # same card objects listed twice; once_parser would keep a repeated first
+            # CardIssue, the compiled step counts it as another issue
+            cards += [c for c in cards[:3] if c.type != 'CardIssue']
+
+        expected_cards = copy.deepcopy(cards)
+        try:
+            expected = parsers_in_turn(issue_mode, expected_cards)
+        except (StopIteration, IndexError):
+            # ONCE without any CardIssue and MONO without cards fail in the parsers,
+            # the compiled filter keeps everything (or returns nothing) instead
+            continue
+
+        compiled = compile_issue_mode(issue_mode)(cards)
+
+        assert [(c.txid, c.type, c.amount) for c in compiled] == \
+            [(c.txid, c.type, c.amount) for c in expected]
+        # cards are updated in place, like the parsers do
+        assert [c.amount for c in cards] == [c.amount for c in expected_cards]
+
+
+def test_compiled_issue_mode_linear():
+    '''a million cards, ONCE alone would take forever when run by once_parser'''
+
+    class Card:
+        __slots__ = ('type', 'amount', 'number_of_decimals')
+
+        def __init__(self, ctype: str, amount: int) -> None:
+            self.type = ctype
+            self.amount = [amount]
+            self.number_of_decimals = 2
+
+    cards = [Card('CardIssue' if i % 3 == 0 else 'CardTransfer', i) for i in range(10**6)]
+    valid = validate_card_issue_modes(IssueMode.SINGLET.value | IssueMode.UNFLUSHABLE.value, cards)
+
+    assert valid == [cards[0]]
+    assert len(validate_card_issue_modes(IssueMode.ONCE.value, cards)) == 1 + 2 * 10**6 // 3
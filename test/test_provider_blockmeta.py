@@ -0,0 +1,74 @@
+import threading
+import time
+
+import pytest
+
+import pypeerassets as pa
+from pypeerassets.pautils import tx_serialization_order
+from pypeerassets.provider import BlockMetaCache
+
+from .conftest import FakeProvider, populate
+
+
+def test_blockmeta_one_fetch_per_block(chain):
+
+    deck = populate(chain)
+    provider = FakeProvider(chain)
+    provider.blockmeta = BlockMetaCache()
+
+    cards = list(pa.find_all_valid_cards(provider, deck))
+    blocks = {c.blockhash for c in cards}
+
+    assert len(blocks) < len({c.txid for c in cards})
+    assert chain.count('getblock') == len(blocks)
+
+    for card in cards:
+        block = chain.block_by_hash(card.blockhash)
+        assert card.blocknum == block["height"]
+        assert card.blockseq == block["tx"].index(card.txid)
+
+
+def test_blockmeta_concurrent_lookups(chain):
+
+    populate(chain)
+    block = chain.blocks[2]
+
+    class SlowProvider(FakeProvider):
+
+        def getblock(self, hash: str) -> dict:
+            time.sleep(0.1)
+            return super().getblock(hash)
+
+    provider = SlowProvider(chain)
+    cache = BlockMetaCache(maxsize=2)
+    results = []
+
+    threads = [threading.Thread(target=lambda: results.append(cache.get(provider, block["hash"])))
+               for i in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert chain.count('getblock') == 1
+    assert len({id(r) for r in results}) == 1
+    assert results[0].height == 2
+    assert cache.stats() == {"hits": 7, "misses": 1, "blocks": 1}
+
+    # least recently used blocks are dropped
+    for b in chain.blocks[3:6]:
+        cache.get(provider, b["hash"])
+    assert cache.cached(block["hash"]) is None
+    assert cache.stats()["blocks"] == 2
+
+
+def test_tx_serialization_order_missing_tx(chain):
+
+    populate(chain)
+    provider = FakeProvider(chain)
+    block = chain.blocks[2]
+
+    assert tx_serialization_order(provider, block["hash"], block["tx"][0]) == 0
+    with pytest.raises(ValueError):
+        tx_serialization_order(provider, block["hash"], '00' * 32)
+
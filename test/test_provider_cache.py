@@ -0,0 +1,211 @@
+from concurrent.futures import ThreadPoolExecutor
+import sqlite3
+import time
+
+import pypeerassets as pa
+from pypeerassets.provider import CachingProvider, ChainTip
+
+from .conftest import FakeProvider, populate, rpc_node
+
+
+def test_caching_provider_second_scan(chain, tmpdir):
+
+    deck = populate(chain)
+    for i in range(6):
+        chain.mine()  # bury everything deep enough
+
+    path = str(tmpdir.join('cache.db'))
+    provider = CachingProvider(FakeProvider(chain), path=path)
+
+    first = list(pa.find_all_valid_cards(provider, deck))
+    fetched = chain.count('getrawtransaction') + chain.count('getblock')
+    assert provider.stats()["stores"] > 0
+
+    # new instance on the same database, nothing should be re-downloaded
+    provider = CachingProvider(FakeProvider(chain), path=path)
+    second = list(pa.find_all_valid_cards(provider, deck))
+
+    assert chain.count('getrawtransaction') + chain.count('getblock') == fetched
+    assert provider.stats()["misses"] == 0
+    assert [c.__dict__ for c in second] == [c.__dict__ for c in first]
+
+
+def test_caching_provider_skips_shallow(chain):
+
+    deck = populate(chain)
+    provider = CachingProvider(FakeProvider(chain), min_confirmations=3)
+
+    tip_block = chain.blocks[-1]["hash"]
+    provider.getblock(tip_block)
+    provider.getblock(tip_block)
+    provider.getblock(chain.blocks[1]["hash"])
+    provider.getblock(chain.blocks[1]["hash"])
+
+    assert chain.count('getblock') == 3
+    assert provider.stats()["hits"] == 1
+
+    # serialized transactions are immutable, no matter how deep
+    provider.getrawtransaction(chain.blocks[-1]["tx"][0], 0)
+    provider.getrawtransaction(chain.blocks[-1]["tx"][0], 0)
+    assert chain.count('getrawtransaction') == 1
+
+    # unless the provider returns the verbose transaction regardless of decrypt
+    chain.calls.clear()
+    verbose = FakeProvider(chain)
+    verbose.getrawtransaction = lambda txid, decrypt=0: chain.getrawtransaction(txid, 1)
+    provider = CachingProvider(verbose, min_confirmations=3)
+
+    for txid in (chain.blocks[-1]["tx"][0], chain.blocks[1]["tx"][0]):
+        provider.getrawtransaction(txid, 0)
+        provider.getrawtransaction(txid, 0)
+    assert chain.count('getrawtransaction') == 3
+
+
+def test_caching_provider_eviction(chain):
+
+    populate(chain)
+    for i in range(6):
+        chain.mine()
+
+    provider = CachingProvider(FakeProvider(chain), max_size=2000)
+
+    for txid in chain.txs:
+        provider.getrawtransaction(txid, 1)
+
+    stats = provider.stats()
+    assert stats["evictions"] > 0
+    assert stats["size"] <= 2000
+    assert stats["entries"] == stats["stores"] - stats["evictions"]
+
+    # most recently used entries survive
+    last = list(chain.txs)[-1]
+    hits = provider.stats()["hits"]
+    provider.getrawtransaction(last, 1)
+    assert provider.stats()["hits"] == hits + 1
+
+
+def test_caching_provider_rpc_batch(chain, stand_in):
+
+    deck = populate(chain)
+    for i in range(6):
+        chain.mine()
+
+    provider = CachingProvider(rpc_node(stand_in))
+    first = list(pa.find_all_valid_cards(provider, deck))
+    fetched = chain.count('getrawtransaction')
+
+    second = list(pa.find_all_valid_cards(provider, deck))
+
+    assert chain.count('getrawtransaction') == fetched
+    assert [c.__dict__ for c in second] == [c.__dict__ for c in first]
+
+
+def test_caching_provider_reads_do_not_write(chain, tmpdir):
+
+    populate(chain)
+    for i in range(6):
+        chain.mine()
+
+    path = str(tmpdir.join('cache.db'))
+    provider = CachingProvider(FakeProvider(chain), path=path, flush_every=15)
+    txids = list(chain.txs)
+    for txid in txids:
+        provider.getrawtransaction(txid, 1)
+
+    statements = []
+    provider._db.set_trace_callback(lambda s: s.startswith('SELECT') or statements.append(s))
+
+    for txid in txids[:10]:
+        provider.getrawtransaction(txid, 1)
+    assert provider.stats()["hits"] == 10
+    assert statements == []
+
+    # access times are written once enough of them are pending, in one go
+    for txid in txids:
+        provider.getrawtransaction(txid, 1)
+    assert [s.split()[0] for s in statements] == ['BEGIN'] + ['UPDATE'] * 15 + ['COMMIT']
+
+    # pending ones are written on close, eviction order survives a reopen
+    provider.getrawtransaction(txids[0], 1)
+    provider.close()
+    accessed = dict(sqlite3.connect(path).execute('SELECT key, accessed FROM objects'))
+    assert max(accessed, key=accessed.get) == txids[0]
+
+
+def test_caching_provider_rpc_batch_hex(chain, stand_in):
+
+    populate(chain)
+    provider = CachingProvider(rpc_node(stand_in))
+    reqs = [('getrawtransaction', [txid, 0]) for txid in chain.txs]
+
+    first = provider.batch(reqs)
+    fetched = chain.count('getrawtransaction')
+    second = provider.batch(reqs)
+
+    assert chain.count('getrawtransaction') == fetched
+    assert [r["result"] for r in second] == [r["result"] for r in first]
+    assert [r["result"] for r in first] == [chain.raw(txid, 0) for txid in chain.txs]
+
+
+def test_caching_provider_derives_confirmations(chain):
+
+    populate(chain)
+    for i in range(6):
+        chain.mine()
+
+    tip = ChainTip(FakeProvider(chain), interval=3600)
+    provider = CachingProvider(FakeProvider(chain), chaintip=tip)
+
+    txid = chain.blocks[1]["tx"][0]
+    first = provider.getrawtransaction(txid, 1)
+
+    for i in range(3):
+        chain.mine()
+    tip.refresh()
+
+    cached = provider.getrawtransaction(txid, 1)
+    assert provider.stats()["hits"] == 1
+    assert cached["confirmations"] == first["confirmations"] + 3
+    assert cached == chain.raw(txid, 1)
+
+    # tip is polled once per interval, not once per read
+    polls = chain.count('getblockcount')
+    for i in range(5):
+        provider.getrawtransaction(txid, 1)
+        provider.getblock(chain.blocks[1]["hash"])
+    assert chain.count('getblockcount') == polls
+    assert tip.confirmations(None) == 0
+
+
+def test_chain_tip_polls_once(chain):
+
+    populate(chain)
+
+    class SlowProvider(FakeProvider):
+        def getblockcount(self) -> int:
+            time.sleep(0.05)
+            return super().getblockcount()
+
+    tip = ChainTip(SlowProvider(chain), interval=3600)
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        heights = list(pool.map(lambda i: tip.height, range(32)))
+
+    assert heights == [len(chain.blocks) - 1] * 32
+    assert chain.count('getblockcount') == 1
+
+
+def test_deck_confirmations_from_chain_tip(chain):
+
+    deck = populate(chain)
+    tip = ChainTip(FakeProvider(chain), interval=3600)
+
+    found = next(pa.find_all_valid_decks(FakeProvider(chain), 1, True))
+    assert found.blocknum == chain.block_by_hash(chain.tx_block[deck.id])["height"]
+    assert tip.confirmations(found.blocknum) == found.tx_confirmations
+
+    for i in range(3):
+        chain.mine()
+    tip.refresh()
+
+    assert tip.confirmations(found.blocknum) == found.tx_confirmations + 3
+
@@ -0,0 +1,120 @@
+import time
+
+import pytest
+
+import pypeerassets as pa
+from pypeerassets.exceptions import EmptyP2THDirectory
+from pypeerassets.kutil import Kutil
+from pypeerassets.pautils import find_deck_spawns
+from pypeerassets.provider import BlockMetaCache, Blockbook, Explorer, SenderResolver
+from pypeerassets.transactions import decode_raw_transaction
+
+from .conftest import FakeProvider, populate, rpc_node
+
+
+def http_provider(cls, url: str):
+
+    provider = cls(network='tppc')
+    provider.testnet_api_url = url + '/api/'
+    provider.testnet_ext_url = url + '/ext/'
+
+    return provider
+
+
+def providers(url: str) -> dict:
+
+    return {"rpc": rpc_node(url),
+            "explorer": http_provider(Explorer, url),
+            "blockbook": http_provider(Blockbook, url)}
+
+
+@pytest.mark.parametrize("name", ["rpc", "explorer", "blockbook"])
+def test_iter_transactions_pages(chain, stand_in, name):
+
+    deck = populate(chain, 12)
+    provider = providers(stand_in)[name]
+    expected = list(reversed(chain.tagged[deck.p2th_address]))
+
+    txids = provider.iter_transactions(deck.p2th_address, page_size=4)
+    first = [next(txids) for i in range(4)]
+
+    # next page is requested before the first one is consumed
+    for i in range(100):
+        if chain.count('listtransactions') >= 2:
+            break
+        time.sleep(0.01)
+    assert chain.count('listtransactions') == 2
+
+    assert first + list(txids) == expected
+    assert len(expected) == 14 and chain.count('listtransactions') == 4
+
+
+@pytest.mark.parametrize("name", ["explorer", "blockbook"])
+def test_iter_transactions_empty(chain, stand_in, name):
+
+    populate(chain)
+    provider = providers(stand_in)[name]
+
+    with pytest.raises(EmptyP2THDirectory):
+        list(provider.iter_transactions(Kutil(network='tppc').address))
+
+
+@pytest.mark.parametrize("name", ["rpc", "explorer"])
+def test_scans_consume_pages(chain, stand_in, name):
+
+    deck = populate(chain, 12)
+    chain.deck_spawn(deck.issuer, name='second')
+    chain.mine()
+    provider = providers(stand_in)[name]
+
+    assert sorted(find_deck_spawns(provider)) == sorted(chain.tagged[chain.p2th])
+
+    cards = list(pa.find_all_valid_cards(provider, deck))
+    expected = list(pa.find_all_valid_cards(FakeProvider(chain), deck))
+    assert [c.__dict__ for c in cards] == [c.__dict__ for c in expected]
+
+
+def test_blockbook_bulk_details(chain, stand_in):
+
+    deck = populate(chain, 12)
+    provider = http_provider(Blockbook, stand_in)
+    provider.senders = SenderResolver()
+    provider.blockmeta = BlockMetaCache()
+
+    txids = chain.tagged[deck.p2th_address]
+    raw_txs = list(provider.iter_raw_transactions(deck.p2th_address, page_size=5))
+
+    # decoded locally, with the keys pypeerassets reads
+    expected = []
+    for txid in reversed(txids):
+        raw = chain.raw(txid)
+        tx = decode_raw_transaction(raw["hex"], provider.network_properties)
+        tx.update((k, raw[k]) for k in ('hex', 'blockhash', 'blocktime', 'confirmations'))
+        expected.append(tx)
+    assert raw_txs == expected
+
+    decks = list(pa.find_all_valid_decks(provider, 1, True))
+    cards = list(pa.find_all_valid_cards(provider, deck))
+
+    # no transaction was fetched one by one, senders came with the details
+    assert chain.count('getrawtransaction') == 0
+    expected = list(pa.find_all_valid_cards(FakeProvider(chain), deck))
+    assert provider.senders.stats()["fetched"] == 0
+    assert [d.id for d in decks] == [deck.id]
+    assert [c.__dict__ for c in cards] == [c.__dict__ for c in expected]
+
+    # an address without transactions is an empty directory
+    with pytest.raises(EmptyP2THDirectory):
+        list(provider.iter_raw_transactions(Kutil(network='tppc').address))
+
+
+def test_blockbook_bulk_needs_details(chain, stand_in):
+    '''a response without transaction details is an error, not an empty directory'''
+
+    deck = populate(chain)
+    provider = http_provider(Blockbook, stand_in)
+    provider.api_fetch = lambda command: {"page": 1, "totalPages": 1,
+                                          "transactions": chain.tagged[deck.p2th_address]}
+
+    with pytest.raises(Exception, match='details'):
+        list(provider.iter_raw_transactions(deck.p2th_address))
@@ -0,0 +1,54 @@
+import pypeerassets as pa
+from pypeerassets.provider import SenderResolver
+
+from .conftest import FakeProvider, populate, rpc_node
+
+
+def parent_sender(chain, raw_tx: dict) -> str:
+
+    vin = raw_tx["vin"][0]
+    return chain.raw(vin["txid"])["vout"][vin["vout"]]["scriptPubKey"]["addresses"][0]
+
+
+def test_sender_resolver_http(chain):
+
+    deck = populate(chain)
+    provider = FakeProvider(chain)
+    provider.senders = SenderResolver(max_workers=4)
+
+    txs = [chain.raw(txid) for txid in chain.tagged[deck.p2th_address]]
+    senders = provider.senders.resolve(provider, txs)
+
+    assert senders == [parent_sender(chain, tx) for tx in txs]
+    assert chain.count('getrawtransaction') == len({tx["vin"][0]["txid"] for tx in txs})
+
+    # every card bundle sender is known now, scanning costs no parent fetches
+    fetched = chain.count('getrawtransaction')
+    cards = list(pa.find_all_valid_cards(provider, deck))
+    assert chain.count('getrawtransaction') == fetched + len(txs)
+    assert provider.senders.stats()["fetched"] == len({tx["vin"][0]["txid"] for tx in txs})
+    assert {c.sender for c in cards} == set(senders)
+
+
+def test_sender_resolver_rpc_batch(chain, stand_in):
+
+    deck = populate(chain)
+    provider = rpc_node(stand_in)
+    provider.senders = SenderResolver()
+
+    batches = []
+    batch = provider.batch
+    provider.batch = lambda reqs: batches.append(len(reqs)) or batch(reqs)
+
+    txs = [chain.raw(txid) for txid in chain.tagged[deck.p2th_address]]
+    assert provider.senders.resolve(provider, txs) == [parent_sender(chain, tx) for tx in txs]
+    assert batches == [len({tx["vin"][0]["txid"] for tx in txs})]
+
+    # other outputs of already fetched parents are known too
+    parent = chain.raw(txs[0]["vin"][0]["txid"])
+    for n, vout in enumerate(parent["vout"]):
+        if vout["scriptPubKey"].get("addresses"):
+            assert provider.senders.cached(parent["txid"], n) == vout["scriptPubKey"]["addresses"][0]
+
+    provider.senders.resolve(provider, txs)
+    assert len(batches) == 1
@@ -0,0 +1,153 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+
+import pytest
+
+from pypeerassets.provider import Explorer, HTTPSession, Provider
+from pypeerassets.provider.session import default_session
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'
+    connections = 0
+
+    def setup(self):
+        StandInHandler.connections += 1
+        super().setup()
+
+    def do_GET(self):
+        if self.path.startswith('/moved/'):
+            self.send_response(301)
+            self.send_header('Location', '/' + self.path[len('/moved/'):])
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        reply = {"path": self.path}
+        if 'Proxy-Authorization' in self.headers:
+            reply["proxy_auth"] = self.headers['Proxy-Authorization']
+        body = json.dumps(reply).encode()
+        if self.path.endswith('getblockcount'):
+            body = b'424242'
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class ThreadingServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+@pytest.fixture
+def server():
+
+    StandInHandler.connections = 0
+    httpd = ThreadingServer(('127.0.0.1', 0), StandInHandler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    yield 'http://127.0.0.1:{0}/'.format(httpd.server_address[1])
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_session_reuses_connections(server):
+
+    session = HTTPSession(maxsize=2)
+
+    for i in range(10):
+        response = session.get(server + 'tx/{0}'.format(i))
+        assert response.status == 200
+        assert json.loads(response.body.decode()) == {"path": "/tx/{0}".format(i)}
+
+    stats = session.stats()
+    assert stats["requests"] == 10
+    assert stats["connections"] == 1
+    assert stats["reused"] == 9
+    assert StandInHandler.connections == 1
+
+    session.close()
+    assert session.stats()["idle"] == {}
+
+
+def test_session_bounded_pool(server):
+
+    session = HTTPSession(maxsize=2)
+    barrier = threading.Barrier(4)
+
+    def worker():
+        barrier.wait()
+        session.get(server)
+
+    threads = [threading.Thread(target=worker) for i in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    stats = session.stats()
+    assert sum(stats["idle"].values()) <= 2
+    assert stats["connections"] - stats["discarded"] <= 2
+
+
+def test_session_retries_stale_connection(server):
+
+    session = HTTPSession()
+    session.get(server)
+
+    # simulate server side keep-alive timeout
+    conn = session._pools[('http', '127.0.0.1', int(server.split(':')[-1].strip('/')))].queue[0]
+    conn.sock.close()
+
+    assert session.get(server).status == 200
+    assert session.stats()["retries"] == 1
+
+
+def test_explorer_uses_session(server):
+
+    session = HTTPSession()
+    provider = Explorer(network='ppc', session=session)
+    provider.api_url = server
+
+    assert provider.getblockcount() == 424242
+    assert provider.getblock('00ff') == {"path": "/getblock?hash=00ff"}
+    assert session.stats()["connections"] == 1
+
+
+def test_session_follows_redirects(server):
+
+    session = HTTPSession()
+    response = session.get(server + 'moved/tx/1')
+
+    assert response.status == 200
+    assert json.loads(response.body.decode()) == {"path": "/tx/1"}
+    assert session.stats()["requests"] == 2
+
+    with pytest.raises(ConnectionError):
+        HTTPSession(max_redirects=0).get(server + 'moved/tx/1')
+
+
+def test_session_proxies(server):
+
+    proxy = server.replace('http://', 'http://user:secret@')
+    session = HTTPSession(proxies={"http": proxy})
+    response = session.get('http://explorer.invalid/tx/1')
+
+    # forward proxy gets the absolute url and the credentials
+    assert json.loads(response.body.decode()) == {
+        "path": "http://explorer.invalid/tx/1",
+        "proxy_auth": "Basic dXNlcjpzZWNyZXQ="}
+
+    # hosts in no_proxy are reached directly
+    session = HTTPSession(proxies={"http": "http://127.0.0.1:9", "no": "127.0.0.1"})
+    assert json.loads(session.get(server + 'tx/1').body.decode()) == {"path": "/tx/1"}
+
+
+def test_default_session_fits_provider_workers():
+
+    assert default_session.maxsize >= Provider.max_workers
@@ -0,0 +1,196 @@
+from hashlib import sha256
+
+from btcpy.lib.parsing import Parser
+
+import pypeerassets as pa
+from pypeerassets.kutil import Kutil
+from pypeerassets.__main__ import find_card_bundles
+from pypeerassets.networks import PeercoinTestnet
+from pypeerassets.protocol import CardBundle, Deck
+from pypeerassets.provider import BlockMetaCache, SenderResolver
+from pypeerassets.pautils import card_bundle_parser
+from pypeerassets.scanner import BlockFileSource, ProviderBlockSource
+from pypeerassets.transactions import TxView
+
+from .conftest import FakeProvider, populate, rpc_node
+
+
+def provider_for(chain) -> FakeProvider:
+
+    provider = FakeProvider(chain)
+    provider.blockmeta = BlockMetaCache()
+    provider.senders = SenderResolver()
+
+    return provider
+
+
+def bundle_key(bundle: CardBundle) -> tuple:
+
+    return (bundle.deck.id, bundle.txid, bundle.blocknum, bundle.blockseq, bundle.sender)
+
+
+def scan_chain(chain) -> tuple:
+
+    first = populate(chain)
+    second = chain.deck_spawn(first.issuer, name='second')
+    chain.mine()
+    for i in range(3):
+        chain.card_transfer(second, first.issuer, [first.issuer], [100 + i])
+    chain.mine()
+
+    expected = [b for deck in pa.find_all_valid_decks(FakeProvider(chain), 1, True)
+                for b in find_card_bundles(FakeProvider(chain), deck)]
+
+    return sorted(map(bundle_key, expected), key=lambda k: (k[2], k[3]))
+
+
+def test_block_scanner_single_pass(chain):
+
+    expected = scan_chain(chain)
+    chain.calls.clear()
+
+    scanner = pa.BlockScanner(provider_for(chain))
+    found = list(scanner.scan(0))
+
+    decks = [i for i in found if isinstance(i, Deck)]
+    bundles = [i for i in found if isinstance(i, CardBundle)]
+
+    assert [d.name for d in decks] == ['fakedeck', 'second']
+    assert [bundle_key(b) for b in bundles] == expected
+    assert set(scanner.decks) == {d.p2th_address for d in decks}
+
+    # no directory listings, every block and transaction is fetched once
+    assert chain.count('listtransactions') == 0
+    assert chain.count('getblock') == len(chain.blocks)
+
+    # cards of decks known up front are found in a partial range too
+    scanner = pa.BlockScanner(provider_for(chain), decks=decks[:1])
+    bundles = list(scanner.scan(3, 5))
+    assert [bundle_key(b) for b in bundles] == [k for k in expected if 3 <= k[2] <= 5]
+
+
+def test_block_scanner_rpc_node(chain, stand_in):
+
+    expected = scan_chain(chain)
+    chain.calls.clear()
+
+    found = list(pa.BlockScanner(rpc_node(stand_in)).scan(0))
+
+    assert [bundle_key(b) for b in found if isinstance(b, CardBundle)] == expected
+    assert chain.count('listtransactions') == 0
+
+
+def test_block_scanner_cards_in_spawn_block(chain):
+    '''cards confirmed in the block of their deck spawn, before or after it, are found'''
+
+    issuer = Kutil(network='tppc', from_string='issuer').address
+    alice = Kutil(network='tppc', from_string='alice').address
+    deck = chain.deck_spawn(issuer)
+    issue = chain.card_transfer(deck, issuer, [alice], [100])
+    early = chain.card_transfer(deck, issuer, [alice], [7])
+    chain.mempool.remove(early)
+    chain.mempool.insert(0, early)  # ahead of the deck spawn
+    chain.mine()
+    height = len(chain.blocks) - 1
+
+    found = list(pa.BlockScanner(provider_for(chain)).scan(0))
+
+    assert [type(i) for i in found] == [CardBundle, Deck, CardBundle]
+    assert [found[0].txid, found[1].id, found[2].txid] == [early, deck.id, issue]
+    assert {i.blocknum for i in found if isinstance(i, CardBundle)} == {height}
+    assert [c.amount for b in found if isinstance(b, CardBundle)
+            for c in card_bundle_parser(b)] == [[7], [100]]
+
+
+def common(tx: dict, other: dict) -> dict:
+    '''<tx> limited to the keys <other> has too, as locally decoded transactions
+    carry only a part of the verbose JSON. Block hashes of the blk files differ,
+    btcpy reports sequence as a string where peercoind uses a number.'''
+
+    def pick(value, reference):
+        if isinstance(value, dict):
+            return {k: pick(v, reference[k]) for k, v in value.items()
+                    if k in reference and k != "sequence"}
+        if isinstance(value, list):
+            return [pick(v, r) for v, r in zip(value, reference)]
+        return value
+
+    return pick({k: v for k, v in tx.items() if k != "blockhash"}, other)
+
+
+def test_block_scanner_raw_hex(chain, stand_in):
+
+    expected = scan_chain(chain)
+    chain.calls.clear()
+
+    provider = rpc_node(stand_in)
+    provider.senders = SenderResolver(raw=True)
+    source = ProviderBlockSource(provider, raw=True)
+    found = list(pa.BlockScanner(provider, source=source).scan(0))
+
+    assert [bundle_key(b) for b in found if isinstance(b, CardBundle)] == expected
+    assert [d.name for d in found if isinstance(d, Deck)] == ['fakedeck', 'second']
+
+    # same cards as from verbose transactions
+    cards = [c for b in found if isinstance(b, CardBundle) for c in card_bundle_parser(b)]
+    verbose = [c for deck in pa.find_all_valid_decks(FakeProvider(chain), 1, True)
+               for b in find_card_bundles(FakeProvider(chain), deck)
+               for c in card_bundle_parser(b)]
+    assert sorted((c.txid, c.cardseq, c.receiver, c.amount, c.sender) for c in cards) == \
+        sorted((c.txid, c.cardseq, c.receiver, c.amount, c.sender) for c in verbose)
+
+
+def write_blk_files(chain, path) -> None:
+    '''store the FakeChain blocks the way peercoind does, out of order, with a
+    stale block and the zero padding of a preallocated file'''
+
+    records = []
+    prev = bytes(32)
+    for block in chain.blocks:
+        header = (b'\x01\x00\x00\x00' + prev + bytes(32) +
+                  block["time"].to_bytes(4, 'little') + b'\xff\xff\x00\x1d' +
+                  block["height"].to_bytes(4, 'little'))
+        body = Parser.to_varint(len(block["tx"])) + b''.join(
+            chain.txs[txid].serialize() for txid in block["tx"])
+        records.append(header + body + b'\x00')  # empty block signature
+        prev = sha256(sha256(header).digest()).digest()
+
+    stale = records[2][:76] + b'\xff\xff\xff\xff' + b'\x00\x00'
+    records[3], records[4] = records[4], records[3]
+
+    def record(data: bytes) -> bytes:
+        return PeercoinTestnet.netmagic + len(data).to_bytes(4, 'little') + data
+
+    with open(str(path.join('blk00000.dat')), 'wb') as f:
+        f.write(b''.join(record(r) for r in records[:5]) + record(stale) + bytes(1000))
+    with open(str(path.join('blk00001.dat')), 'wb') as f:
+        f.write(b''.join(record(r) for r in records[5:]) + bytes(1000))
+
+
+def test_block_scanner_blk_files(chain, tmpdir):
+
+    expected = scan_chain(chain)
+    blocks = tmpdir.mkdir('blocks')
+    write_blk_files(chain, blocks)
+    chain.calls.clear()
+
+    source = BlockFileSource(str(tmpdir), network='tppc')
+    assert source.height == len(chain.blocks) - 1
+
+    height, blockhash, txs = next(source.blocks(2, 2))
+    assert [tx["txid"] for tx in txs] == chain.blocks[2]["tx"]
+    assert all(isinstance(tx, TxView) and tx["blockhash"] == blockhash for tx in txs)
+    for tx in txs:
+        expected_tx = chain.raw(tx["txid"])
+        assert common(tx, expected_tx) == common(expected_tx, tx)
+
+    scanner = pa.BlockScanner(provider_for(chain), source=source)
+    found = list(scanner.scan(0))
+    source.close()
+
+    assert [bundle_key(b) for b in found if isinstance(b, CardBundle)] == expected
+    assert [d.name for d in found if isinstance(d, Deck)] == ['fakedeck', 'second']
+
+    # only the parents of the matched transactions, for their senders
+    assert chain.count('getblock') == 0
+    assert chain.count('getrawtransaction') == len(expected) + 2
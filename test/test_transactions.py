@@ -20,7 +20,10 @@ from pypeerassets.transactions import (
     MutableTransaction,
     Transaction,
     calculate_tx_fee,
+    TxView,
+    decode_raw_transaction,
     make_raw_transaction,
+    read_nulldata,
     p2pkh_script,
     tx_output,
     sign_transaction
@@ -70,6 +73,61 @@ def test_peercoin_tx_unhexilify():
     Transaction.unhexlify(raw, network=PeercoinTestnet)
 
 
+def test_decode_raw_transaction():
+
+    raw = '01000000f7ae3b5b01b3a00d828f5a9a8e908fb59353b4a87132a75a6d939c6e9338e3727631a65028010000006c493046022100e3a72a3a9f53eab66186da5354a58a6fb4b4fc96c5836445bce0b3755840653f022100f7013eb0c3bbd901a8e9c4935edefa9765fa5dd2f1f3a276634d248a4e17c59801210207c75090d56b94a9f638b8b9abaa346c053db265f4aa752170b86c32cdec7efbffffffff0260d3e815000000001976a914c8ec65800888c2c4f831826ba7e10603b3692db188ac00e1f505000000001976a914ba96e0c304ad07afb115d7019b9e54db96668f9988ac00000000'
+
+    tx = decode_raw_transaction(raw, PeercoinTestnet)
+    expected = Transaction.unhexlify(raw, network=PeercoinTestnet)
+
+    assert tx["txid"] == 'c418f3bded92ebc035cfefc93f54dc8a501702e6ad4e6a26a07aab87f4cfb653'
+    assert tx["txid"] == expected.txid
+    assert tx["time"] == expected.timestamp
+    assert tx["vin"][0]["txid"] == expected.ins[0].txid
+    assert tx["vin"][0]["vout"] == expected.ins[0].txout
+    assert [v["value"] for v in tx["vout"]] == [float(o.value) / 10**6 for o in expected.outs]
+    assert [v["scriptPubKey"]["addresses"] for v in tx["vout"]] == \
+        [[str(o.script_pubkey.address(PeercoinTestnet))] for o in expected.outs]
+    assert decode_raw_transaction(bytes.fromhex(raw), PeercoinTestnet) == tx
+
+    with pytest.raises(ValueError):
+        decode_raw_transaction(raw + '00', PeercoinTestnet)
+
+
+def test_tx_view():
+
+    raw = bytes.fromhex('01000000f7ae3b5b01b3a00d828f5a9a8e908fb59353b4a87132a75a6d939c6e9338e3727631a65028010000006c493046022100e3a72a3a9f53eab66186da5354a58a6fb4b4fc96c5836445bce0b3755840653f022100f7013eb0c3bbd901a8e9c4935edefa9765fa5dd2f1f3a276634d248a4e17c59801210207c75090d56b94a9f638b8b9abaa346c053db265f4aa752170b86c32cdec7efbffffffff0260d3e815000000001976a914c8ec65800888c2c4f831826ba7e10603b3692db188ac00e1f505000000001976a914ba96e0c304ad07afb115d7019b9e54db96668f9988ac00000000')
+    buf = bytearray(b'junk') + raw + bytearray(b'more')
+
+    tx = TxView(buf, PeercoinTestnet, offset=4, meta={"confirmations": 3})
+    assert tx.size == len(raw)
+
+    # scripts are views into the buffer, decoded only when asked for
+    assert tx.script(0).obj is buf
+    assert tx.p2th == 'myqLdY2moQ2ExfXfAfyxkFCi6TyuMLwK2G'
+    assert tx._vout is None and tx._vin is None
+
+    assert tx["confirmations"] == 3
+    assert dict(tx) == dict(decode_raw_transaction(raw, PeercoinTestnet), confirmations=3)
+    assert tx["vout"][0]["scriptPubKey"]["addresses"] == [tx.p2th]
+
+    with pytest.raises(KeyError):
+        tx["blockhash"]
+
+
+@pytest.mark.parametrize("script, data", [
+    ('6a', b''),
+    ('6a03010203', b'\x01\x02\x03'),
+    ('6a4c03010203', b'\x01\x02\x03'),
+    ('6a4d0300010203', b'\x01\x02\x03'),
+    ('6a4e03000000010203', b'\x01\x02\x03'),
+    ('6a51', b''),
+])
+def test_read_nulldata(script, data):
+
+    assert read_nulldata(bytes.fromhex(script)) == data
+
+
 @pytest.mark.parametrize("tx_size", [181, 311])
 def test_calculate_transaction_fee(tx_size):
 